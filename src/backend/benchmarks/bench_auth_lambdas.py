@@ -0,0 +1,432 @@
+"""
+Offline benchmark for the auth Lambdas, cognito_custom_auth_lambda and
+cf_turnstile_lambda.
+
+Replays Cognito custom-auth sign-ins (PreSignUp_SignUp for new users, then
+DefineAuthChallenge -> CreateAuthChallenge -> VerifyAuthChallengeResponse ->
+DefineAuthChallenge, with a share of wrong first answers) and Turnstile
+verifications (single tokens, replayed tokens and batches) against fake_ses,
+an in-process SQS queue and the local siteverify stand-in. Reports per trigger
+p50/p99 latency, CPU and peak allocation per call, and the cold start of each
+module in a fresh interpreter.
+
+    python benchmarks/bench_auth_lambdas.py
+    python benchmarks/bench_auth_lambdas.py --ses-latency lognormal:0.03,0.5 --turnstile-latency fixed:0.05
+    python benchmarks/bench_auth_lambdas.py --repeat 3 --save-baseline benchmarks/baseline_auth_lambdas.json
+    python benchmarks/bench_auth_lambdas.py --repeat 3 --baseline benchmarks/baseline_auth_lambdas.json
+
+CPU is process time, so queue consumer figures include its send threads and
+Turnstile figures include the stand-in's share of each request. Allocations
+are measured in a separate, shorter pass under tracemalloc so they do not
+slow the timed one.
+
+With --baseline the exit code is 1 when any p99, CPU, allocation or cold start
+figure is more than --tolerance worse than the stored baseline. A baseline
+records the machine and the run parameters it was taken with; the check exits
+with 2 when this run's parameters differ, and warns when the machine does.
+The committed baseline_auth_lambdas.json was taken from src/backend with
+--repeat 3 and otherwise default flags, on the machine named in it; re-record
+it before relying on it anywhere else.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from bench_emotional_signals import patched, percentile
+from fake_openai import parse_latency
+from fake_ses import FakeSes
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "website", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+os.environ.setdefault("TURNSTILE_SECRET_KEY", "benchmark")  # only ever sent to the stand-in
+
+import cf_turnstile_lambda as cft  # noqa: E402
+import cognito_custom_auth_lambda as cog  # noqa: E402
+import otp_email_queue  # noqa: E402
+from otp_rate_limiter import LocalBucketStore, RateLimiter  # noqa: E402
+from turnstile_client import KeepAliveClient  # noqa: E402
+from turnstile_stand_in import TurnstileStandIn  # noqa: E402
+from turnstile_verdicts import LocalVerdictBackend, VerdictCache  # noqa: E402
+
+# Module -> expression timed after the import, for work a cold container does on its first call.
+COLD_STARTS = {
+    "cognito_custom_auth_lambda": "cognito_custom_auth_lambda.get_ses_client()",
+    "cf_turnstile_lambda": None,
+}
+COLD_START_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+import {module}
+report = {{"init_ms": (time.perf_counter() - started) * 1000}}
+if {first_call!r}:
+    started = time.perf_counter()
+    {first_call}
+    report["first_call_ms"] = (time.perf_counter() - started) * 1000
+print(json.dumps(report))
+"""
+
+METRICS = ("p99_ms", "cpu_ms", "alloc_kb", "init_ms", "first_call_ms")
+# Differences below these are noise on any machine, whatever the tolerance.
+NOISE_FLOOR = {"p99_ms": 1.0, "cpu_ms": 0.1, "alloc_kb": 4.0, "init_ms": 10.0, "first_call_ms": 10.0}
+
+
+@contextlib.contextmanager
+def discarded_logs():
+    """Keeps log formatting in the measurement but drops the lines (and the consumer's metric prints)."""
+    with open(os.devnull, "w") as devnull:
+        handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.StreamHandler)]
+        streams = [h.setStream(devnull) for h in handlers]
+        try:
+            with contextlib.redirect_stdout(devnull):
+                yield
+        finally:
+            for handler, stream in zip(handlers, streams):
+                handler.setStream(stream)
+
+
+class Recorder:
+    """Calls handlers by trigger name and keeps wall time, CPU time and (when tracing) peak allocation growth."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.samples = {}
+
+    def call(self, name, handler, event):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = handler(event, None)
+        sample = {"wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+        if self.trace_memory:
+            sample["alloc"] = tracemalloc.get_traced_memory()[1] - base
+        self.samples.setdefault(name, []).append(sample)
+        return result
+
+
+# ────────────────────────────  Cognito sign-ins  ──────────────────────────── #
+
+
+def cognito_event(trigger, email, ip, **request):
+    """A custom-auth trigger event shaped like the ones Cognito sends."""
+    return {
+        "version": "1",
+        "region": "us-west-2",
+        "userPoolId": "us-west-2_benchmark",
+        "userName": email,
+        "callerContext": {"awsSdkVersion": "aws-sdk-unknown-unknown", "clientId": "benchmark"},
+        "triggerSource": trigger,
+        "request": {
+            "userAttributes": {"email": email, "custom:tos_accepted": "true"},
+            "userContextData": {"sourceIp": [ip]},
+            **request,
+        },
+        "response": {},
+    }
+
+
+def sign_in(recorder, prefix, email, ip, new_user, wrong_first_answer):
+    """One sign-in, driven the way Cognito drives it; returns True when tokens were issued."""
+    if new_user:
+        recorder.call(f"{prefix}/PreSignUp_SignUp", cog.lambda_handler, cognito_event("PreSignUp_SignUp", email, ip))
+
+    session = []
+    while True:
+        defined = recorder.call(
+            f"{prefix}/DefineAuthChallenge_Authentication",
+            cog.lambda_handler,
+            cognito_event("DefineAuthChallenge_Authentication", email, ip, session=list(session)),
+        )["response"]
+        if defined.get("issueTokens") or defined.get("failAuthentication"):
+            return bool(defined.get("issueTokens"))
+
+        created = recorder.call(
+            f"{prefix}/CreateAuthChallenge_Authentication",
+            cog.lambda_handler,
+            cognito_event("CreateAuthChallenge_Authentication", email, ip,
+                          challengeName="CUSTOM_CHALLENGE", session=list(session)),
+        )["response"]
+        answer = created["privateChallengeParameters"]["answer"]
+        if wrong_first_answer and not session:
+            answer = "000000" if answer != "000000" else "111111"
+
+        verified = recorder.call(
+            f"{prefix}/VerifyAuthChallengeResponse_Authentication",
+            cog.lambda_handler,
+            cognito_event("VerifyAuthChallengeResponse_Authentication", email, ip,
+                          privateChallengeParameters=created["privateChallengeParameters"],
+                          challengeAnswer=answer),
+        )["response"]
+        session.append({"challengeName": "CUSTOM_CHALLENGE", "challengeResult": verified["answerCorrect"]})
+
+
+def run_cognito(recorder, dispatch, sequences, ses, new_user_rate=0.3, wrong_answer_rate=0.1, seed=0):
+    """Replays `sequences` sign-ins in one warm container; in queue mode the consumer drains every 10 sign-ins."""
+    rng = random.Random(seed)
+    queue = otp_email_queue.LocalQueue()
+    limiter = RateLimiter(cog.OTP_RATE_LIMITER.policies, store=LocalBucketStore())
+    prefix = f"cognito/{dispatch}"
+
+    def consume(event, context):
+        return recorder.call("otp-consumer/batch", otp_email_queue.lambda_handler, event)
+
+    signed_in = 0
+    with patched(cog, get_ses_client=lambda: ses, OTP_DISPATCH=dispatch, OTP_RATE_LIMITER=limiter), \
+            patched(otp_email_queue, get_sqs_client=lambda: queue):
+        for i in range(sequences):
+            signed_in += sign_in(recorder, prefix, f"user{i}@example.com", f"198.51.100.{i % 250 + 1}",
+                                 rng.random() < new_user_rate, rng.random() < wrong_answer_rate)
+            if dispatch == "queue" and (i + 1) % 10 == 0:
+                queue.drain(consume)
+        queue.drain(consume)
+    return signed_in
+
+
+# ────────────────────────────  Turnstile requests  ────────────────────────── #
+
+
+def turnstile_event(token, ip="203.0.113.10"):
+    return {
+        "routeKey": "POST /verify",
+        "body": json.dumps({"token": token}),
+        "requestContext": {"http": {"method": "POST", "path": "/verify", "sourceIp": ip}},
+    }
+
+
+def turnstile_batch_event(tokens):
+    return {
+        "routeKey": cft.BATCH_ROUTE,
+        "body": json.dumps({"tokens": [{"token": t, "remote_ip": "203.0.113.10"} for t in tokens]}),
+        "requestContext": {"http": {"method": "POST", "path": "/verify/batch", "sourceIp": "10.0.0.1"}},
+    }
+
+
+def run_turnstile(recorder, requests, latency, replay_rate=0.1, failure_rate=0.05, batches=5, batch_size=16, seed=0):
+    """Replays single verifications (some of them replays) and batches in one warm container."""
+    rng, server_rng = random.Random(seed), random.Random(seed + 1)
+    spec = parse_latency(latency) if isinstance(latency, str) else latency
+    issued = []
+
+    def new_token():
+        token = f"{'fail' if rng.random() < failure_rate else 'bench'}-{len(issued)}"
+        issued.append(token)
+        return token
+
+    with TurnstileStandIn(secret=cft.TURNSTILE_SECRET_KEY, latency=lambda: spec(server_rng)) as server:
+        client = KeepAliveClient(server.url, pool_size=cft.BATCH_CONCURRENCY)
+        cache = VerdictCache(shared=LocalVerdictBackend())
+        with patched(cft, TURNSTILE_CLIENT=client, VERDICT_CACHE=cache):
+            for _ in range(requests):
+                if issued and rng.random() < replay_rate:
+                    recorder.call("turnstile/replay", cft.lambda_handler, turnstile_event(rng.choice(issued)))
+                else:
+                    recorder.call("turnstile/verify", cft.lambda_handler, turnstile_event(new_token()))
+            for _ in range(batches):
+                tokens = [new_token() for _ in range(batch_size)]
+                recorder.call("turnstile/batch", cft.lambda_handler, turnstile_batch_event(tokens))
+        client.close()
+    return server.requests
+
+
+# ────────────────────────────  Cold starts  ───────────────────────────────── #
+
+
+def measure_cold_start(module, runs=5):
+    """Times the import (and first_call, if any) of `module` in `runs` fresh interpreters."""
+    first_call = COLD_STARTS.get(module)
+    env = {k: v for k, v in os.environ.items() if k != "TURNSTILE_PREWARM"}
+    env.setdefault("TURNSTILE_SECRET_KEY", "benchmark")
+    code = COLD_START_SCRIPT.format(module=module, first_call=first_call)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code, LAMBDA_DIR], env=env, capture_output=True, text=True,
+                             check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    report = {"name": f"cold-start/{module}", "calls": runs,
+              "init_ms": round(statistics.median(s["init_ms"] for s in samples), 2),
+              "init_max_ms": round(max(s["init_ms"] for s in samples), 2)}
+    if first_call:
+        report["first_call_ms"] = round(statistics.median(s["first_call_ms"] for s in samples), 2)
+    return report
+
+
+# ────────────────────────────  Suite  ─────────────────────────────────────── #
+
+
+def run_pass(trace_memory, dispatches, sequences, requests, ses_latency, turnstile_latency, new_user_rate,
+             wrong_answer_rate, replay_rate, batches, batch_size, seed):
+    recorder = Recorder(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with discarded_logs():
+            for dispatch in dispatches:
+                run_cognito(recorder, dispatch, sequences, FakeSes(ses_latency, seed=seed), new_user_rate,
+                            wrong_answer_rate, seed)
+            run_turnstile(recorder, requests, turnstile_latency, replay_rate, batches=batches,
+                          batch_size=batch_size, seed=seed)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return recorder
+
+
+def summarize(timed, traced=None):
+    reports = []
+    for name, samples in timed.samples.items():
+        walls = [s["wall"] for s in samples]
+        report = {
+            "name": name,
+            "calls": len(samples),
+            "p50_ms": round(percentile(walls, 50) * 1000, 3),
+            "p99_ms": round(percentile(walls, 99) * 1000, 3),
+            "cpu_ms": round(statistics.mean(s["cpu"] for s in samples) * 1000, 3),
+        }
+        if traced is not None and name in traced.samples:
+            report["alloc_kb"] = round(statistics.mean(s["alloc"] for s in traced.samples[name]) / 1024, 1)
+        reports.append(report)
+    return reports
+
+
+def run_suite(sequences=200, requests=200, dispatches=("sync", "queue"), ses_latency="fixed:0.01",
+              turnstile_latency="fixed:0.01", new_user_rate=0.3, wrong_answer_rate=0.1, replay_rate=0.1,
+              batches=5, batch_size=16, alloc_sequences=20, cold_starts=5, seed=0):
+    reports = [measure_cold_start(module, cold_starts) for module in COLD_STARTS] if cold_starts else []
+    workload = (ses_latency, turnstile_latency, new_user_rate, wrong_answer_rate, replay_rate, batches, batch_size,
+                seed)
+    timed = run_pass(False, dispatches, sequences, requests, *workload)
+    traced = run_pass(True, dispatches, alloc_sequences, alloc_sequences, *workload) if alloc_sequences else None
+    return reports + summarize(timed, traced)
+
+
+def median_of_runs(runs):
+    """One report per name, each figure the median across runs, so a single noisy run neither sets nor fails a baseline."""
+    merged = {}
+    for report in runs[0]:
+        same = [r for run in runs for r in run if r["name"] == report["name"]]
+        merged[report["name"]] = {
+            key: value if key == "name" else round(statistics.median(r[key] for r in same), 3)
+            for key, value in report.items()
+        }
+    return list(merged.values())
+
+
+def find_regressions(reports, baseline, tolerance):
+    """Figures more than tolerance (a fraction) above the baseline, ignoring differences within NOISE_FLOOR."""
+    previous = {r["name"]: r for r in baseline}
+    regressions = []
+    for report in reports:
+        before = previous.get(report["name"])
+        if not before:
+            continue
+        for metric in METRICS:
+            if metric not in report or metric not in before:
+                continue
+            now, then = report[metric], before[metric]
+            if now > then * (1 + tolerance) and now - then > NOISE_FLOOR[metric]:
+                regressions.append(f"{report['name']}: {metric} {now} vs baseline {then}")
+    return regressions
+
+
+# Flags that change what is measured; baselines only compare runs with the same values.
+RUN_PARAMETERS = ("sequences", "requests", "dispatch", "ses_latency", "turnstile_latency", "new_user_rate",
+                  "wrong_answer_rate", "replay_rate", "batches", "batch_size", "alloc_sequences", "cold_starts", "seed",
+                  "repeat")
+
+
+def recorded_with(args):
+    return {
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPU, {platform.system()} {platform.release()}",
+        "python": platform.python_version(),
+        "parameters": {name: getattr(args, name) for name in RUN_PARAMETERS},
+    }
+
+
+def load_baseline(path):
+    """(reports, recorded_with) from a --save-baseline file; recorded_with is None for a bare list of reports."""
+    with open(path) as f:
+        baseline = json.load(f)
+    if isinstance(baseline, list):
+        return baseline, None
+    return baseline["reports"], baseline["recorded_with"]
+
+
+def parameter_mismatches(recorded, current):
+    return [
+        f"--{name.replace('_', '-')}: baseline {value!r}, this run {current['parameters'].get(name)!r}"
+        for name, value in recorded["parameters"].items()
+        if current["parameters"].get(name) != value
+    ]
+
+
+def print_table(reports):
+    print(f"{'trigger':<58}{'calls':>7}{'p50':>9}{'p99':>9}{'cpu':>8}{'alloc kb':>10}{'init':>9}{'first':>8}")
+    for r in reports:
+        cells = [r.get(k, "-") for k in ("calls", "p50_ms", "p99_ms", "cpu_ms", "alloc_kb", "init_ms", "first_call_ms")]
+        print(f"{r['name']:<58}" + "".join(f"{c:>{w}}" for c, w in zip(cells, (7, 9, 9, 8, 10, 9, 8))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Cognito and Turnstile Lambdas against local stand-ins.")
+    parser.add_argument("--sequences", type=int, default=200, help="Cognito sign-ins per dispatch mode")
+    parser.add_argument("--requests", type=int, default=200, help="Single-token Turnstile requests")
+    parser.add_argument("--dispatch", nargs="+", choices=["sync", "queue"], default=["sync", "queue"])
+    parser.add_argument("--ses-latency", default="fixed:0.01", help="fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--turnstile-latency", default="fixed:0.01", help="Same specs as --ses-latency")
+    parser.add_argument("--new-user-rate", type=float, default=0.3, help="Share of sign-ins that start with sign-up")
+    parser.add_argument("--wrong-answer-rate", type=float, default=0.1, help="Share of sign-ins with a wrong first code")
+    parser.add_argument("--replay-rate", type=float, default=0.1, help="Share of Turnstile requests reusing a token")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--alloc-sequences", type=int, default=20, help="Sign-ins and requests in the traced pass")
+    parser.add_argument("--cold-starts", type=int, default=5, help="Fresh interpreters per module (0 to skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Run the suite this many times and report medians")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON instead of a table")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail when figures regress against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    reports = median_of_runs([
+        run_suite(args.sequences, args.requests, args.dispatch, args.ses_latency, args.turnstile_latency,
+                  args.new_user_rate, args.wrong_answer_rate, args.replay_rate, args.batches, args.batch_size,
+                  args.alloc_sequences, args.cold_starts, args.seed)
+        for _ in range(args.repeat)
+    ])
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_table(reports)
+
+    current = recorded_with(args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"recorded_with": current, "reports": reports}, f, indent=2)
+    if args.baseline:
+        baseline, recorded = load_baseline(args.baseline)
+        if recorded:
+            mismatches = parameter_mismatches(recorded, current)
+            for mismatch in mismatches:
+                print(f"PARAMETER MISMATCH {mismatch}", file=sys.stderr)
+            if mismatches:
+                sys.exit(2)
+            if (recorded["machine"], recorded["python"]) != (current["machine"], current["python"]):
+                print(f"WARNING baseline recorded on {recorded['machine']}, Python {recorded['python']}; "
+                      f"this run is on {current['machine']}, Python {current['python']}", file=sys.stderr)
+        regressions = find_regressions(reports, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,203 @@
+"""
+Offline benchmark for emotional_signal_processing.lambda_handler.
+
+Drives the handler against fake_openai at a range of fan-out concurrency
+levels (executor size / MAX_CONCURRENCY), message sizes and execution modes,
+and reports p50/p95/p99 request latency, peak thread count, peak calls in
+flight and memory. The result cache is disabled so every request fans out.
+
+    python benchmarks/bench_emotional_signals.py
+    python benchmarks/bench_emotional_signals.py --concurrency 2 5 10 --latency uniform:0.02,0.2 --error-rate 0.05
+    python benchmarks/bench_emotional_signals.py --save-baseline benchmarks/baseline_emotional_signals.json
+    python benchmarks/bench_emotional_signals.py --baseline benchmarks/baseline_emotional_signals.json
+
+With --baseline the exit code is 1 when any level's p95 is more than
+--tolerance slower than the stored baseline (run it before deploying).
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from fake_openai import FakeAsyncOpenAI, FakeCompletionsModel, FakeOpenAI
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # never used, the clients are replaced
+
+import emotional_signal_processing as esp  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+WORDS = ("i", "feel", "like", "nobody", "really", "listens", "when", "talk", "about", "work",
+         "and", "it", "makes", "me", "wonder", "if", "should", "even", "try", "anymore")
+
+
+def make_message(size, rng):
+    """Roughly size characters of post-like text."""
+    words, length = [], 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+class ThreadSampler:
+    """Samples threading.active_count() in the background and keeps the peak."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak -= 1  # the sampler itself
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """Temporarily replaces module globals."""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def run_level(execution, concurrency, message_size, requests, model, seed=0, trace_memory=False):
+    """Runs `requests` sequential handler invocations (one warm container) and returns a report dict."""
+    rng = random.Random(seed)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+    latencies, statuses, prompt_errors = [], {}, 0
+
+    if trace_memory:
+        tracemalloc.start()
+    with patched(esp, client=FakeOpenAI(model), async_client=FakeAsyncOpenAI(model), executor=executor,
+                 MAX_CONCURRENCY=concurrency, EXECUTION_MODE=execution, result_cache=ResultCache(max_entries=0)):
+        with ThreadSampler() as threads:
+            for i in range(requests):
+                event = {"body": json.dumps({"message_text": f"{i} " + make_message(message_size, rng)})}
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(None):  # the handler logs every prompt
+                    response = esp.lambda_handler(event, None)
+                latencies.append(time.perf_counter() - started)
+                statuses[response["statusCode"]] = statuses.get(response["statusCode"], 0) + 1
+                if response["statusCode"] == 200:
+                    prompt_errors += sum(1 for r in json.loads(response["body"]).values() if "error" in r)
+    executor.shutdown(wait=True)
+
+    report = {
+        "execution": execution,
+        "concurrency": concurrency,
+        "message_size": message_size,
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "requests_per_second": round(requests / sum(latencies), 2),
+        "statuses": statuses,
+        "prompt_errors": prompt_errors,
+        "peak_threads": threads.peak,
+        "max_calls_in_flight": model.max_in_flight,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if trace_memory:
+        report["peak_traced_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return report
+
+
+def level_key(report):
+    return f"{report['execution']}/c{report['concurrency']}/m{report['message_size']}"
+
+
+def run_suite(executions, concurrency_levels, message_sizes, requests, latency, error_rate=0.0,
+              malformed_rate=0.0, seed=0, trace_memory=False):
+    reports = []
+    for execution in executions:
+        for concurrency in concurrency_levels:
+            for message_size in message_sizes:
+                model = FakeCompletionsModel(latency, error_rate, malformed_rate, seed=seed)
+                reports.append(run_level(execution, concurrency, message_size, requests, model, seed, trace_memory))
+    return reports
+
+
+def find_regressions(reports, baseline, tolerance):
+    """Levels whose p95 exceeds the baseline p95 by more than tolerance (a fraction)."""
+    previous = {level_key(r): r for r in baseline}
+    regressions = []
+    for report in reports:
+        before = previous.get(level_key(report))
+        if before and report["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{level_key(report)}: p95 {report['p95_ms']}ms vs baseline {before['p95_ms']}ms")
+    return regressions
+
+
+def print_table(reports):
+    print(f"{'level':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>8}{'threads':>9}{'in-flight':>10}{'errors':>8}")
+    for r in reports:
+        print(f"{level_key(r):<22}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['requests_per_second']:>8}"
+              f"{r['peak_threads']:>9}{r['max_calls_in_flight']:>10}{r['prompt_errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the emotional signal fan-out against a fake OpenAI.")
+    parser.add_argument("--execution", nargs="+", choices=["threads", "async"], default=["threads", "async"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("--message-sizes", nargs="+", type=int, default=[200, 2000])
+    parser.add_argument("--requests", type=int, default=10, help="Handler invocations per level")
+    parser.add_argument("--latency", default="lognormal:0.08,0.5", help="fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="Report tracemalloc peaks (slows the run)")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON instead of a table")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail when p95 regresses against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown, as a fraction")
+    args = parser.parse_args()
+
+    reports = run_suite(args.execution, args.concurrency, args.message_sizes, args.requests, args.latency,
+                        args.error_rate, args.malformed_rate, args.seed, args.trace_memory)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_table(reports)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(reports, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(reports, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,125 @@
+"""
+Offline stand-in for the OpenAI client used by the benchmarks.
+
+FakeOpenAI and FakeAsyncOpenAI expose chat.completions.create() with a
+configurable latency distribution, error rate and malformed-JSON rate, so the
+fan-out path can be measured without network access or API keys.
+
+Latency specs:
+    fixed:0.05              always 50 ms
+    uniform:0.02,0.2        uniform between 20 and 200 ms
+    lognormal:0.08,0.5      median 80 ms, sigma 0.5 (long right tail, like real APIs)
+"""
+
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+
+def parse_latency(spec):
+    """Returns a function rng -> seconds for a latency spec string."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _status_error(error_class, status_code, headers=None):
+    response = SimpleNamespace(request=None, status_code=status_code, headers=headers or {})
+    return error_class(f"Fake {status_code}", response=response, body=None)
+
+
+class FakeCompletionsModel:
+    """Decides latency and outcome per call; shared by the sync and async fakes."""
+
+    def __init__(self, latency="lognormal:0.08,0.5", error_rate=0.0, malformed_rate=0.0,
+                 rate_limit_share=0.5, seed=None):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rate_limit_share = rate_limit_share  # share of errors that are 429s, the rest are 500s
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def begin(self):
+        """Returns (delay, outcome) where outcome is "ok", "malformed", "rate_limit" or "server_error"."""
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+            if roll < self.error_rate:
+                outcome = "rate_limit" if self.rng.random() < self.rate_limit_share else "server_error"
+            elif roll < self.error_rate + self.malformed_rate:
+                outcome = "malformed"
+            else:
+                outcome = "ok"
+            score = round(self.rng.random(), 2)
+        return delay, outcome, score
+
+    def end(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def result(outcome, score):
+        if outcome == "rate_limit":
+            raise _status_error(openai.RateLimitError, 429, {"retry-after": "0.05"})
+        if outcome == "server_error":
+            raise _status_error(openai.InternalServerError, 500)
+        content = '{"score": 0.4, "confid' if outcome == "malformed" else json.dumps(
+            {"score": score, "confidence": 0.8}
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class _SyncCompletions:
+    def __init__(self, model):
+        self.model = model
+
+    def create(self, **kwargs):
+        delay, outcome, score = self.model.begin()
+        try:
+            time.sleep(delay)
+            return self.model.result(outcome, score)
+        finally:
+            self.model.end()
+
+
+class _AsyncCompletions:
+    def __init__(self, model):
+        self.model = model
+
+    async def create(self, **kwargs):
+        delay, outcome, score = self.model.begin()
+        try:
+            await asyncio.sleep(delay)
+            return self.model.result(outcome, score)
+        finally:
+            self.model.end()
+
+
+class FakeOpenAI:
+    def __init__(self, model):
+        self.chat = SimpleNamespace(completions=_SyncCompletions(model))
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, model):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(model))
@@ -0,0 +1,49 @@
+"""
+Offline stand-in for the SES client used by the auth benchmarks.
+
+FakeSes answers send_email, send_templated_email and send_bulk_templated_email
+after a configurable latency (the specs of fake_openai.parse_latency), and
+throttles a share of calls with the ClientError SES raises, so the OTP email
+path can be measured without AWS credentials.
+"""
+
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from fake_openai import parse_latency
+
+
+class FakeSes:
+    def __init__(self, latency="fixed:0.01", throttle_rate=0.0, seed=None):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.emails = 0
+
+    def _call(self, operation, recipients):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency(self.rng)
+            throttled = self.rng.random() < self.throttle_rate
+        time.sleep(delay)
+        if throttled:
+            raise ClientError({"Error": {"Code": "Throttling", "Message": "Maximum sending rate exceeded."}},
+                              operation)
+        with self.lock:
+            self.emails += recipients
+        return {"MessageId": f"fake-{self.calls}"}
+
+    def send_email(self, **kwargs):
+        return self._call("SendEmail", 1)
+
+    def send_templated_email(self, **kwargs):
+        return self._call("SendTemplatedEmail", 1)
+
+    def send_bulk_templated_email(self, Destinations, **kwargs):
+        self._call("SendBulkTemplatedEmail", len(Destinations))
+        return {"Status": [{"Status": "Success", "MessageId": f"fake-{i}"} for i in range(len(Destinations))]}
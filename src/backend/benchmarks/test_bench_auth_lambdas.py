@@ -0,0 +1,112 @@
+import argparse
+import json
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+import bench_auth_lambdas as bench
+from fake_ses import FakeSes
+
+
+def test_fake_ses_latency_throttling_and_bulk_status():
+    ses = FakeSes("fixed:0", throttle_rate=0.3, seed=2)
+    throttled = 0
+    for _ in range(300):
+        try:
+            ses.send_email(Source="a", Destination={}, Message={})
+        except ClientError as exc:
+            assert exc.response["Error"]["Code"] == "Throttling"
+            throttled += 1
+    assert 60 <= throttled <= 120
+
+    bulk = FakeSes("fixed:0").send_bulk_templated_email(Destinations=[{}, {}, {}])
+    assert [s["Status"] for s in bulk["Status"]] == ["Success"] * 3
+
+
+def test_sign_in_replays_the_whole_trigger_sequence():
+    recorder, ses = bench.Recorder(), FakeSes("fixed:0")
+    signed_in = bench.run_cognito(recorder, "sync", 4, ses, new_user_rate=1.0, wrong_answer_rate=1.0)
+
+    assert signed_in == 4
+    calls = {name: len(samples) for name, samples in recorder.samples.items()}
+    assert calls == {
+        "cognito/sync/PreSignUp_SignUp": 4,
+        "cognito/sync/DefineAuthChallenge_Authentication": 12,  # issue, reissue after the wrong code, tokens
+        "cognito/sync/CreateAuthChallenge_Authentication": 8,
+        "cognito/sync/VerifyAuthChallengeResponse_Authentication": 8,
+    }
+    assert ses.emails == 8
+
+
+def test_queue_dispatch_is_drained_by_the_consumer():
+    recorder, ses = bench.Recorder(), FakeSes("fixed:0")
+    original = bench.cog.get_ses_client
+    bench.run_cognito(recorder, "queue", 12, ses, new_user_rate=0.0, wrong_answer_rate=0.0)
+
+    assert len(recorder.samples["otp-consumer/batch"]) == 2
+    assert ses.emails == 12
+    assert bench.cog.OTP_DISPATCH == "sync" and bench.cog.get_ses_client is original
+
+
+def test_turnstile_replays_are_answered_without_the_stand_in():
+    recorder = bench.Recorder()
+    stand_in_requests = bench.run_turnstile(recorder, 30, "fixed:0", replay_rate=0.5, batches=2, batch_size=5)
+
+    replays = len(recorder.samples["turnstile/replay"])
+    assert replays > 0
+    assert len(recorder.samples["turnstile/verify"]) + replays == 30
+    assert stand_in_requests == 30 - replays + 10
+
+
+def test_run_suite_reports_latency_cpu_and_allocations():
+    reports = bench.run_suite(sequences=3, requests=5, dispatches=["sync"], ses_latency="fixed:0",
+                              turnstile_latency="fixed:0", batches=1, batch_size=3, alloc_sequences=2, cold_starts=0)
+
+    by_name = {r["name"]: r for r in reports}
+    assert "turnstile/batch" in by_name and "cognito/sync/CreateAuthChallenge_Authentication" in by_name
+    for report in reports:
+        assert report["p50_ms"] <= report["p99_ms"]
+        assert report["cpu_ms"] >= 0
+    assert by_name["turnstile/batch"]["alloc_kb"] > 0
+
+
+@pytest.mark.parametrize("module", list(bench.COLD_STARTS))
+def test_measure_cold_start(module):
+    report = bench.measure_cold_start(module, runs=1)
+    assert report["name"] == f"cold-start/{module}"
+    assert report["init_ms"] > 0
+    assert ("first_call_ms" in report) == bool(bench.COLD_STARTS[module])
+
+
+def test_find_regressions():
+    baseline = [{"name": "turnstile/verify", "p99_ms": 20.0, "cpu_ms": 1.0, "alloc_kb": 10.0}]
+    slower = [dict(baseline[0], p99_ms=30.0, cpu_ms=1.05)]
+    assert bench.find_regressions(slower, baseline, tolerance=0.2) == ["turnstile/verify: p99_ms 30.0 vs baseline 20.0"]
+    assert bench.find_regressions(slower, baseline, tolerance=0.6) == []
+    # within the noise floor, however large the ratio
+    assert bench.find_regressions([{"name": "turnstile/verify", "cpu_ms": 0.05}],
+                                  [{"name": "turnstile/verify", "cpu_ms": 0.01}], tolerance=0.2) == []
+
+
+def test_baseline_records_machine_and_parameters(tmp_path):
+    args = argparse.Namespace(**dict.fromkeys(bench.RUN_PARAMETERS, 1))
+    recorded = bench.recorded_with(args)
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"recorded_with": recorded, "reports": [{"name": "turnstile/verify"}]}))
+
+    reports, loaded = bench.load_baseline(path)
+    assert reports == [{"name": "turnstile/verify"}] and loaded == recorded
+    assert bench.parameter_mismatches(loaded, recorded) == []
+    args.seed = 2
+    assert bench.parameter_mismatches(loaded, bench.recorded_with(args)) == ["--seed: baseline 1, this run 2"]
+
+
+def test_committed_baseline_covers_every_default_parameter():
+    reports, recorded = bench.load_baseline(Path(bench.__file__).with_name("baseline_auth_lambdas.json"))
+    assert reports and set(recorded["parameters"]) == set(bench.RUN_PARAMETERS)
+
+
+def test_median_of_runs():
+    runs = [[{"name": "turnstile/verify", "calls": 10, "p99_ms": p99}] for p99 in (5.0, 50.0, 6.0)]
+    assert bench.median_of_runs(runs) == [{"name": "turnstile/verify", "calls": 10, "p99_ms": 6.0}]
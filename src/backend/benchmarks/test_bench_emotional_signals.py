@@ -0,0 +1,60 @@
+import json
+import random
+
+import pytest
+
+import bench_emotional_signals as bench
+from fake_openai import FakeCompletionsModel, FakeOpenAI, parse_latency
+
+
+def test_parse_latency():
+    rng = random.Random(1)
+    assert parse_latency("fixed:0.05")(rng) == 0.05
+    assert 0.02 <= parse_latency("uniform:0.02,0.2")(rng) <= 0.2
+    assert parse_latency("lognormal:0.08,0.5")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+def test_fake_client_error_and_malformed_rates():
+    model = FakeCompletionsModel("fixed:0", error_rate=0.2, malformed_rate=0.3, seed=3)
+    completions = FakeOpenAI(model).chat.completions
+    outcomes = {"ok": 0, "malformed": 0, "error": 0}
+    for _ in range(500):
+        try:
+            content = completions.create(messages=[])
+        except Exception:
+            outcomes["error"] += 1
+            continue
+        try:
+            json.loads(content.choices[0].message.content)
+            outcomes["ok"] += 1
+        except json.JSONDecodeError:
+            outcomes["malformed"] += 1
+
+    assert 70 <= outcomes["error"] <= 130
+    assert 110 <= outcomes["malformed"] <= 190
+
+
+def test_run_suite_reports_latency_threads_and_restores_handler():
+    original_client = bench.esp.client
+    reports = bench.run_suite(["threads", "async"], [2], [50], requests=3, latency="fixed:0.002",
+                              malformed_rate=0.1, trace_memory=True)
+
+    assert [bench.level_key(r) for r in reports] == ["threads/c2/m50", "async/c2/m50"]
+    for report in reports:
+        assert report["statuses"] == {200: 3}
+        assert report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"]
+        assert report["max_calls_in_flight"] == 2
+        assert report["peak_traced_kb"] > 0
+    assert reports[0]["peak_threads"] >= 2
+    assert bench.esp.client is original_client
+
+
+def test_find_regressions():
+    baseline = [{"execution": "threads", "concurrency": 5, "message_size": 200, "p95_ms": 100.0}]
+    slower = [dict(baseline[0], p95_ms=130.0)]
+    assert bench.find_regressions(slower, baseline, tolerance=0.2) == [
+        "threads/c5/m200: p95 130.0ms vs baseline 100.0ms"
+    ]
+    assert bench.find_regressions(slower, baseline, tolerance=0.5) == []
@@ -25,7 +25,10 @@ resource "aws_iam_policy" "lambda_logging_policy" {
         "logs:CreateLogStream",
         "logs:PutLogEvents"
       ],
-      Resource = "arn:aws:logs:*:*:log-group:/aws/lambda/${aws_lambda_function.vulnerability_lambda.function_name}:*"
+      Resource = [
+        "arn:aws:logs:*:*:log-group:/aws/lambda/${aws_lambda_function.vulnerability_lambda.function_name}:*",
+        "arn:aws:logs:*:*:log-group:/aws/lambda/${aws_lambda_function.vulnerability_stream_lambda.function_name}:*"
+      ]
     }]
   })
 }
@@ -35,12 +38,73 @@ resource "aws_iam_role_policy_attachment" "lambda_logging_attach" {
   policy_arn = aws_iam_policy.lambda_logging_policy.arn
 }
 
+# Shared result cache (see result_cache.py); items expire through DynamoDB TTL
+resource "aws_dynamodb_table" "emotional_signal_cache" {
+  name         = "${var.environment}-emotional-signal-cache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "CacheKey"
+
+  attribute {
+    name = "CacheKey"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ExpiresAt"
+    enabled        = true
+  }
+}
+
+resource "aws_iam_policy" "lambda_cache_policy" {
+  name = "vulnerability_lambda_cache_policy"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect = "Allow",
+      Action = [
+        "dynamodb:BatchGetItem",
+        "dynamodb:BatchWriteItem"
+      ],
+      Resource = aws_dynamodb_table.emotional_signal_cache.arn
+    }]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "lambda_cache_attach" {
+  role       = aws_iam_role.lambda_role.name
+  policy_arn = aws_iam_policy.lambda_cache_policy.arn
+}
+
 # Zip up the Lambda function code
 data "archive_file" "lambda_zip" {
   type        = "zip"
   source_dir  = "../lambda"
   #  source_dir  = "./terraform/lambda"
   output_path = "vulnerability_lambda.zip"
+  # Tests never ship: every test_*.py is excluded without having to list it here
+  excludes    = concat(tolist(fileset("../lambda", "test_*.py")), ["conftest.py", "__pycache__"])
+}
+
+locals {
+  # Shared by the API Gateway function and the streaming function below
+  emotional_signal_environment = {
+    OPENAI_API_KEY = "YOUR_OPENAI_API_KEY" # Replace with your actual key or use a secure method
+    EXECUTION_MODE            = "async" # "threads" or "async"
+    MAX_CONCURRENCY           = "10"
+    PROMPT_TIMEOUT_SECONDS    = "20"
+    RESPONSE_DEADLINE_SECONDS = "45" # keep below the function timeout
+    PARTIAL_RESULTS           = "allow" # "allow" or "reject"
+    MAX_BATCH_MESSAGES        = "20" # inline messages per batch request
+    RESULT_CACHE_SIZE         = "1024" # in-memory entries per container
+    RESULT_CACHE_TABLE        = aws_dynamodb_table.emotional_signal_cache.name
+    RESULT_CACHE_TTL_SECONDS  = "86400"
+    MAX_RETRIES               = "2" # jittered retries on 429/5xx/timeouts
+    HEDGE_REQUESTS            = "1" # duplicate a prompt once it runs past its p95
+    BREAKER_THRESHOLD         = "5" # consecutive failures before failing fast
+    BREAKER_RESET_SECONDS     = "30"
+    COLD_START_PROFILE        = "0" # "1" logs import and client construction timings
+  }
 }
 
 # Create the Lambda function
@@ -55,9 +119,7 @@ resource "aws_lambda_function" "vulnerability_lambda" {
   timeout = 60
 
   environment {
-    variables = {
-      OPENAI_API_KEY = "YOUR_OPENAI_API_KEY" # Replace with your actual key or use a secure method
-    }
+    variables = local.emotional_signal_environment
   }
 
   # Use your arn from uploading (see comment below)
@@ -71,6 +133,55 @@ resource "aws_cloudwatch_log_group" "lambda_log_group" {
   retention_in_days = 3 # Set to 3 days
 }
 
+# Streaming variant: stream_server.py behind the AWS Lambda Web Adapter, which runs run.sh
+# and forwards each function URL request to PORT. RESPONSE_STREAM sends every NDJSON line
+# to the caller as soon as its prompt finishes, instead of one buffered body.
+resource "aws_lambda_function" "vulnerability_stream_lambda" {
+  function_name    = "vulnerability_mvp_stream_lambda"
+  runtime          = "python3.11"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "run.sh"
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  filename         = data.archive_file.lambda_zip.output_path
+
+  timeout = 60
+
+  environment {
+    variables = merge(local.emotional_signal_environment, {
+      AWS_LAMBDA_EXEC_WRAPPER = "/opt/bootstrap"
+      AWS_LWA_INVOKE_MODE     = "response_stream"
+      PORT                    = "8080"
+    })
+  }
+
+  layers = [
+    "arn:aws:lambda:us-west-2:916175830325:layer:openai-python311:4",
+    "arn:aws:lambda:us-west-2:753240598075:layer:LambdaAdapterLayerX86:24" # AWS Lambda Web Adapter
+  ]
+}
+
+resource "aws_lambda_function_url" "vulnerability_stream_url" {
+  function_name      = aws_lambda_function.vulnerability_stream_lambda.function_name
+  authorization_type = "NONE"
+  invoke_mode        = "RESPONSE_STREAM"
+
+  cors {
+    allow_origins = ["*"]
+    allow_methods = ["POST"]
+    allow_headers = ["content-type"]
+  }
+}
+
+resource "aws_cloudwatch_log_group" "stream_lambda_log_group" {
+  name              = "/aws/lambda/${aws_lambda_function.vulnerability_stream_lambda.function_name}"
+  retention_in_days = 3
+}
+
+output "stream_url" {
+  description = "Function URL that streams emotional signal results as NDJSON"
+  value       = aws_lambda_function_url.vulnerability_stream_url.function_url
+}
+
 # # Run these commands to build and upload a recent OpenAI Lambda Layer:
 # docker run --rm -it -v $PWD/layer:/var/task \
 #   public.ecr.aws/sam/build-python3.11:latest \
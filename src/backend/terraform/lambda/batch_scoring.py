@@ -0,0 +1,271 @@
+"""
+Batch scoring for backfills: scores many messages against every prompt.
+
+The message x prompt matrix runs on a bounded thread pool. Messages are read
+lazily and only a small window of calls is in flight, so memory stays flat no
+matter how large the input is. Each message is written out as one NDJSON line
+({"id", "results"}) as soon as all of its prompts finish.
+
+Rate limits (429) pause every worker until the limit should have reset
+(Retry-After, or exponential backoff with jitter); timeouts, connection errors
+and 5xx responses are retried with backoff on the failing call only.
+
+Offline usage (files and s3:// paths are read and written with your own AWS
+credentials; the Lambda's batch mode only takes a small inline "messages" list):
+    python batch_scoring.py messages.ndjson > results.ndjson
+    python batch_scoring.py s3://bucket/messages.ndjson --output s3://bucket/results.ndjson
+
+Input lines are JSON objects with "message_text" (and optionally "id") or plain JSON strings.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import openai
+
+from call_policy import RETRYABLE_ERRORS, retry_after
+from prompt_registry import validate
+from result_cache import cache_key
+
+
+def split_s3_path(path):
+    bucket, _, key = path[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def _read_lines(path, s3_client=None):
+    if path.startswith("s3://"):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client("s3")
+        bucket, key = split_s3_path(path)
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+        for line in body.iter_lines():  # streamed, the object is never loaded whole
+            yield line.decode("utf-8")
+    else:
+        with open(path, "r") as f:
+            yield from f
+
+
+def iter_messages(source, s3_client=None):
+    """
+    Yields (id, message_text, error) from a list of messages, a local NDJSON file
+    or an s3://bucket/key NDJSON object. Bad entries yield an error instead of
+    stopping the batch; ids default to the entry's position.
+    """
+    if isinstance(source, str):
+        entries = (line for line in _read_lines(source, s3_client) if line.strip())
+        parse = True
+    else:
+        entries, parse = source, False
+
+    for index, entry in enumerate(entries):
+        try:
+            if parse:
+                entry = json.loads(entry)
+            if isinstance(entry, str):
+                yield index, entry, None
+            elif isinstance(entry, dict) and isinstance(entry.get("message_text"), str):
+                yield entry.get("id", index), entry["message_text"], None
+            else:
+                yield (entry.get("id", index) if isinstance(entry, dict) else index), None, "Missing message_text"
+        except json.JSONDecodeError as e:
+            yield index, None, f"Invalid JSON line: {e}"
+
+
+class Backoff:
+    """Exponential backoff with full jitter, plus a shared pause that every worker honours."""
+
+    def __init__(self, base=0.5, cap=30.0):
+        self.base = base
+        self.cap = cap
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        remaining = self._resume_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+def parse_content(content):
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON response from OpenAI", "raw_response": content}
+
+
+class BatchScorer:
+    """Scores messages against templates (PromptTemplate objects) with a bounded pool of workers."""
+
+    def __init__(self, templates, client, model, concurrency=10, max_retries=5, timeout=20,
+                 cache=None, backoff=None):
+        self.templates = templates
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = cache
+        self.backoff = backoff or Backoff()
+        self.stats = {"messages": 0, "calls": 0, "cache_hits": 0, "retries": 0, "rate_limited": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _score(self, template, message_text):
+        system_prompt, user_prompt = template.render(message_text)
+        for attempt in range(self.max_retries + 1):
+            self.backoff.wait()
+            self._count("calls")
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    temperature=0,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    timeout=self.timeout
+                )
+                return parse_content(response.choices[0].message.content)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    return {"error": f"Gave up after {attempt + 1} attempts: {e}"}
+                self._count("retries")
+                delay = self.backoff.delay(attempt)
+                if isinstance(e, openai.RateLimitError):
+                    self._count("rate_limited")
+                    self.backoff.pause(max(delay, retry_after(e) or 0))
+                else:
+                    time.sleep(delay)
+            except Exception as e:
+                return {"error": str(e)}
+
+    def _cacheable(self, template, result):
+        return (isinstance(result, dict) and "error" not in result
+                and (template.schema is None or not validate(result, template.schema)))
+
+    def run(self, messages, write):
+        """
+        Scores (id, message_text, error) tuples from iter_messages(). write(line) is
+        called with one NDJSON line per message, in completion order. Returns stats.
+        """
+        window = max(1, self.concurrency * 2)  # calls in flight, bounds memory on huge inputs
+        in_flight = {}  # future -> (message state, template)
+
+        def finish(state):
+            write(json.dumps({"id": state["id"], "results": state["results"]}) + "\n")
+
+        def drain(block_until_below):
+            while len(in_flight) >= block_until_below:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    state, template = in_flight.pop(future)
+                    result = future.result()
+                    state["results"][template.filename] = result
+                    if isinstance(result, dict) and "error" in result:
+                        self._count("errors")
+                    elif self.cache is not None and self._cacheable(template, result):
+                        self.cache.store({state["keys"][template.filename]: result})
+                    state["remaining"] -= 1
+                    if state["remaining"] == 0:
+                        finish(state)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for message_id, message_text, error in messages:
+                self._count("messages")
+                if error:
+                    self._count("errors")
+                    write(json.dumps({"id": message_id, "error": error}) + "\n")
+                    continue
+
+                state = {"id": message_id, "results": {}, "keys": {}, "remaining": 0}
+                pending = self.templates
+                if self.cache is not None:
+                    state["keys"] = {t.filename: cache_key(t.content_hash, self.model, message_text)
+                                     for t in self.templates}
+                    cached, counts = self.cache.lookup(list(state["keys"].values()))
+                    self._count("cache_hits", counts["memory_hits"] + counts["shared_hits"])
+                    for t in self.templates:
+                        if state["keys"][t.filename] in cached:
+                            state["results"][t.filename] = cached[state["keys"][t.filename]]
+                    pending = [t for t in self.templates if t.filename not in state["results"]]
+
+                if not pending:
+                    finish(state)
+                    continue
+                state["remaining"] = len(pending)
+                for template in pending:
+                    drain(window)
+                    in_flight[pool.submit(self._score, template, message_text)] = (state, template)
+            drain(1)
+        return dict(self.stats)
+
+
+def open_output(path, s3_client=None):
+    """Returns (write, close) for stdout, a local file or an s3:// object (uploaded on close)."""
+    if path in (None, "-"):
+        return sys.stdout.write, sys.stdout.flush
+    if not path.startswith("s3://"):
+        f = open(path, "w")
+        return f.write, f.close
+
+    import tempfile
+    f = tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False)  # /tmp in Lambda
+
+    def close():
+        f.close()
+        client = s3_client
+        if client is None:
+            import boto3
+            client = boto3.client("s3")
+        try:
+            client.upload_file(f.name, *split_s3_path(path))
+        finally:
+            os.unlink(f.name)
+    return f.write, close
+
+
+if __name__ == "__main__":
+    from prompt_registry import PromptRegistry
+    from result_cache import ResultCache
+
+    parser = argparse.ArgumentParser(description="Score an NDJSON file of messages against every prompt.")
+    parser.add_argument("source", help="Local NDJSON path or s3://bucket/key")
+    parser.add_argument("--output", default="-", help="Local path or s3://bucket/key (default stdout)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--signals", nargs="*", help="Prompt names without .txt (default all)")
+    args = parser.parse_args()
+
+    registry = PromptRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+    templates = [t for t in registry.templates() if not args.signals or t.signal in args.signals]
+    # retries are handled by BatchScorer, so the SDK's own retries are turned off
+    client = openai.OpenAI(max_retries=0)
+    scorer = BatchScorer(templates, client, args.model, concurrency=args.concurrency,
+                         max_retries=args.max_retries, cache=ResultCache())
+
+    write, close = open_output(args.output)
+    try:
+        stats = scorer.run(iter_messages(args.source), write)
+    finally:
+        close()
+    print(json.dumps(stats), file=sys.stderr)
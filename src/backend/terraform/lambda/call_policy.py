@@ -0,0 +1,278 @@
+"""
+Call policy around the OpenAI client: retries, hedging and a circuit breaker.
+
+- Retryable errors (429, 5xx, timeouts, connection errors) are retried with
+  jittered exponential backoff, honouring Retry-After up to max_delay.
+- Once a prompt has enough latency samples, a call still running after that
+  prompt's p95 gets a duplicate (hedged) request; the first response wins.
+  Sync requests run on a hedge pool sized for the caller's executor (a primary
+  and a hedge per worker). A losing sync request cannot be cancelled and keeps
+  its thread until it ends, so when the pool has no free thread the call runs
+  inline or skips its hedge instead of queueing behind it.
+- Each model has a circuit breaker. After breaker_threshold consecutive
+  failures it opens and calls fail fast for breaker_reset seconds, then one
+  trial call decides whether it closes again.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+
+import openai
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # for metrics
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header, if the error response carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    def __init__(self, name, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError instead of letting a call through to a failing upstream."""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state, self._trial_in_flight = HALF_OPEN, False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial_in_flight):
+                raise CircuitOpenError(f"Circuit open for {self.name}; failing fast")
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial_in_flight = CLOSED, 0, False
+
+    def record_failure(self):
+        """Returns True when this failure opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                opened = self.state != OPEN
+                self.state, self.opened_at, self._trial_in_flight = OPEN, self.clock(), False
+                return opened
+            return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per key."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def p95(self, key):
+        """None until min_samples latencies have been seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+class CallPolicy:
+    def __init__(self, max_retries=2, base_delay=0.2, max_delay=2.0, hedge=True, hedge_min_delay=0.05,
+                 breaker_threshold=5, breaker_reset=30.0, latency=None, hedge_workers=20):
+        # hedge_workers: threads for sync requests, normally 2x the caller's executor max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.latency = latency or LatencyTracker()
+        self._breakers = {}
+        self._hedge_pool = None
+        self._hedge_workers = hedge_workers
+        self._hedge_slots = threading.BoundedSemaphore(hedge_workers)
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    # ────────────────────────────  Shared pieces  ────────────────────────────── #
+
+    def breaker(self, model):
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(model, self.breaker_threshold, self.breaker_reset)
+            return self._breakers[model]
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _retry_delay(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return min(self.max_delay, max(delay, retry_after(error) or 0))
+
+    def _hedge_delay(self, key):
+        p95 = self.latency.p95(key) if self.hedge else None
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _failed(self, breaker, error):
+        if breaker.record_failure():
+            self._count("breaker_opened")
+            print(f"Circuit for {breaker.name} opened after {breaker.failures} consecutive failures: {error}")
+
+    def drain_metrics(self):
+        """Counts since the last drain, plus the current breaker state per model (0 closed, 1 half open, 2 open)."""
+        with self._lock:
+            counts, self._counts = dict(self._counts), collections.Counter()
+            breakers = list(self._breakers.values())
+        for name in ("retries", "hedges", "hedge_wins", "hedges_skipped", "breaker_rejections", "breaker_opened"):
+            counts.setdefault(name, 0)
+        for breaker in breakers:
+            counts[f"breaker_state.{breaker.name}"] = STATE_CODES[breaker.state]
+        return counts
+
+    # ────────────────────────────  Sync calls  ───────────────────────────────── #
+
+    def _submit(self, fn):
+        """Runs fn on the hedge pool if one of its threads is free, else returns None."""
+        if not self._hedge_slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self._hedge_workers)
+        future = self._hedge_pool.submit(fn)
+        future.add_done_callback(lambda _: self._hedge_slots.release())
+        return future
+
+    def _hedged(self, fn, key):
+        delay = self._hedge_delay(key)
+        primary = None if delay is None else self._submit(fn)
+        if primary is None:
+            return fn()
+        done, _ = concurrent.futures.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = self._submit(fn)
+        if hedge is None:
+            self._count("hedges_skipped")
+            return primary.result()
+        self._count("hedges")
+        futures = [primary, hedge]
+        error = None
+        # the slower request keeps running; a sync HTTP call cannot be cancelled
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if future is hedge:
+                self._count("hedge_wins")
+            return result
+        raise error
+
+    def call(self, fn, key, model):
+        """Runs fn() (one API request) under the policy; key identifies the prompt for latency tracking."""
+        breaker = self.breaker(model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self._count("breaker_rejections")
+                raise
+            started = time.monotonic()
+            try:
+                result = self._hedged(fn, key)
+            except RETRYABLE_ERRORS as e:
+                self._failed(breaker, e)
+                if attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt, e))
+                continue
+            except Exception:
+                breaker.record_success()  # upstream answered (e.g. a 400), so it is not failing
+                raise
+            breaker.record_success()
+            self.latency.observe(key, time.monotonic() - started)
+            return result
+
+    # ────────────────────────────  Async calls  ──────────────────────────────── #
+
+    async def _hedged_async(self, make_call, key):
+        delay = self._hedge_delay(key)
+        if delay is None:
+            return await make_call()
+        tasks = [asyncio.ensure_future(make_call())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            self._count("hedges")
+            tasks.append(asyncio.ensure_future(make_call()))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:  # the losing request, or both when the caller gives up
+                if not task.done():
+                    task.cancel()
+
+    async def call_async(self, make_call, key, model):
+        """Async variant of call(); make_call() returns a new awaitable request each time."""
+        breaker = self.breaker(model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self._count("breaker_rejections")
+                raise
+            started = time.monotonic()
+            try:
+                result = await self._hedged_async(make_call, key)
+            except RETRYABLE_ERRORS as e:
+                self._failed(breaker, e)
+                if attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._retry_delay(attempt, e))
+                continue
+            except Exception:
+                breaker.record_success()  # upstream answered (e.g. a 400), so it is not failing
+                raise
+            breaker.record_success()
+            self.latency.observe(key, time.monotonic() - started)
+            return result
@@ -0,0 +1,69 @@
+"""
+Cold-start profiling, enabled with COLD_START_PROFILE=1 (off by default, no overhead).
+
+Import this module before anything else. While enabled it times every module
+that this function's own files import for the first time (each timing includes
+that module's own imports), and phase() times other one-off work such as client
+construction. report() logs timings not logged before, so clients created lazily
+on a later invocation still show up once. The website module's Cognito Lambda
+packages this same file (its lambda/cold_start.py is a symlink to it).
+"""
+
+import builtins
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("COLD_START_PROFILE") == "1"
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+timings = {}  # "import openai", "client OpenAI", ... -> milliseconds
+_reported = set()
+_original_import = builtins.__import__
+
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    importer = (globals or {}).get("__file__") or ""
+    if level or name in sys.modules or not importer.startswith(ROOT):
+        return _original_import(name, globals, locals, fromlist, level)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        timings.setdefault(f"import {name}", round((time.perf_counter() - started) * 1000, 2))
+
+
+if ENABLED:
+    builtins.__import__ = _profiled_import
+
+
+@contextmanager
+def phase(name):
+    """Times a block of one-off initialisation work under name."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def report(log=None):
+    """
+    Logs timings recorded since the last report and returns them. They are printed
+    as one JSON line unless log is given, e.g. to send them through a structured logger.
+    """
+    if not ENABLED:
+        return {}
+    new = {name: ms for name, ms in timings.items() if name not in _reported}
+    if new:
+        _reported.update(new)
+        if log is None:
+            print(json.dumps({"cold_start_ms": new}))
+        else:
+            log(new)
+    return new
@@ -0,0 +1,60 @@
+import hashlib
+import json
+
+from prompt_registry import validate
+
+COMBINED_HEADER = """You are a clinical-psychology-informed text analyst.
+Score every signal listed below for a single user post. Each signal section has its own
+rubric and JSON schema; score each signal independently using only its own rubric.
+Return **only** one valid JSON object whose keys are exactly these signal names:
+{names}
+The value for each key must match that signal's schema. Do **not** add any other keys or commentary."""
+
+
+def build_combined_prompt(templates, message_text):
+    """Builds one (system_prompt, user_prompt) pair scoring every template's signal."""
+    names = [t.signal for t in templates]
+    sections = [f"# === SIGNAL: {t.signal} ===\n{t.system_prompt}" for t in templates]
+    system_prompt = COMBINED_HEADER.format(names=json.dumps(names)) + "\n\n" + "\n\n".join(sections)
+    user_prompt = f"Score this post for each signal: {', '.join(names)}.\n\n{message_text}"
+    return system_prompt, user_prompt
+
+
+def combined_content_hash(templates):
+    """
+    Hash of everything a combined-mode result depends on: the combined header and every
+    selected prompt file (their system prompts go into the combined prompt, and any of them
+    may be re-run on its own as a fallback).
+    """
+    digest = hashlib.sha256(COMBINED_HEADER.encode("utf-8"))
+    for template in templates:
+        digest.update(b"\0" + template.content_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def split_combined_result(templates, combined):
+    """
+    Splits the combined JSON object into per-signal results keyed by prompt filename.
+
+    Returns (results, failed_templates); a signal fails when its value is missing or
+    does not match the schema from its prompt file.
+    """
+    results, failed = {}, []
+    if not isinstance(combined, dict):
+        return results, list(templates)
+
+    for template in templates:
+        value = combined.get(template.signal)
+        if value is None:
+            errors = ["missing from combined response"]
+        elif template.schema is not None:
+            errors = validate(value, template.schema)
+        else:
+            errors = [] if isinstance(value, dict) else ["expected an object"]
+
+        if errors:
+            print(f"Combined result for {template.signal} failed validation: {errors}")
+            failed.append(template)
+        else:
+            results[template.filename] = value
+    return results, failed
@@ -0,0 +1,46 @@
+"""Fixtures and OpenAI stand-ins shared by the emotional signal tests."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeAsyncCompletions:
+    """Stands in for AsyncOpenAI().chat.completions with per-prompt delays."""
+
+    def __init__(self, delays=None, content='{"score": 0.5, "confidence": 0.9}'):
+        self.delays = delays or {}
+        self.content = content
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, messages, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = next((d for marker, d in self.delays.items() if marker in messages[1]["content"]), 0)
+            await asyncio.sleep(delay)
+            return _completion(self.content)
+        finally:
+            self.in_flight -= 1
+
+
+def _fake_async_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+@pytest.fixture
+def esp(mocker):
+    mocker.patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"})
+    import emotional_signal_processing
+    from call_policy import CallPolicy
+    from result_cache import ResultCache
+    # a fresh cache and call policy per test, so results and breaker state never leak between tests
+    mocker.patch.object(emotional_signal_processing, "result_cache", ResultCache())
+    mocker.patch.object(emotional_signal_processing, "call_policy", CallPolicy())
+    yield emotional_signal_processing
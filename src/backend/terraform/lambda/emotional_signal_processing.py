@@ -1,51 +1,117 @@
+import cold_start  # first, so COLD_START_PROFILE=1 can time every import below
+import asyncio
 import json
 import os
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI, OpenAI
 import concurrent.futures
+from batch_scoring import BatchScorer, iter_messages
+from call_policy import CallPolicy
+from combined_scoring import build_combined_prompt, combined_content_hash, split_combined_result
+from prompt_registry import PLACEHOLDER, PromptRegistry, split_prompt_template, validate
+from result_cache import DynamoDbBackend, ResultCache, cache_key, metrics_record
 
-# Initialize the OpenAI client
+# The OpenAI clients are created on first use (see get_client / get_async_client)
 openai_api_key = os.environ.get("OPENAI_API_KEY")
 if not openai_api_key:
      # In a real scenario, raise an exception or return an error response
      print("Error: OPENAI_API_KEY environment variable not set.")
      # For this demo, we'll proceed, but calls to OpenAI will fail
 
-client = OpenAI(api_key=openai_api_key)
+# Execution settings
+# EXECUTION_MODE: "threads" (sync client on a thread pool) or "async" (AsyncOpenAI on one event loop).
+# A request can override it with "execution" in the body.
+EXECUTION_MODE = os.environ.get("EXECUTION_MODE", "threads")
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "10"))           # prompts in flight at once
+PROMPT_TIMEOUT_SECONDS = float(os.environ.get("PROMPT_TIMEOUT_SECONDS", "20"))
+RESPONSE_DEADLINE_SECONDS = float(os.environ.get("RESPONSE_DEADLINE_SECONDS", "45"))
+# PARTIAL_RESULTS: "allow" returns whatever finished before the deadline (unfinished prompts get an
+# error entry); "reject" turns a missed deadline into a 504.
+PARTIAL_RESULTS = os.environ.get("PARTIAL_RESULTS", "allow")
+# Batch requests score at most this many inline messages; larger backfills use the batch_scoring.py CLI
+MAX_BATCH_MESSAGES = int(os.environ.get("MAX_BATCH_MESSAGES", "20"))
+MODEL = "gpt-4o-mini" # fast & cheap; bump up if needed
 
-def extract_prompt_parts(prompt_template, user_message_text, placeholder="$$USER_MESSAGE$$"):
+# Call policy: jittered retries on 429/5xx/timeouts, a hedged duplicate request once a prompt
+# runs past its p95 latency, and a per-model circuit breaker that fails fast while open.
+call_policy = CallPolicy(
+    max_retries=int(os.environ.get("MAX_RETRIES", "2")),
+    hedge=os.environ.get("HEDGE_REQUESTS", "1") == "1",
+    breaker_threshold=int(os.environ.get("BREAKER_THRESHOLD", "5")),
+    breaker_reset=float(os.environ.get("BREAKER_RESET_SECONDS", "30")),
+    hedge_workers=2 * MAX_CONCURRENCY,  # a primary and a hedge for each executor worker
+)
+
+# Created once per container and reused across warm invocations, so connections stay pooled
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+event_loop = None
+client = None
+async_client = None
+
+def get_client():
+    """Sync client, created on first use and reused by every warm invocation."""
+    global client
+    if client is None:
+        with cold_start.phase("client OpenAI"):
+            # Retries are done by call_policy, so the SDK's own retries are turned off
+            client = OpenAI(api_key=openai_api_key, max_retries=0)
+    return client
+
+def get_event_loop():
+    """One event loop per container; the async client's connection pool is bound to it."""
+    global event_loop
+    if event_loop is None or event_loop.is_closed():
+        event_loop = asyncio.new_event_loop()
+    return event_loop
+
+def get_async_client():
+    global async_client
+    if async_client is None:
+        with cold_start.phase("client AsyncOpenAI"):
+            async_client = AsyncOpenAI(api_key=openai_api_key, max_retries=0)
+    return async_client
+
+# Prompt files are read and pre-split once per container (cold start), not per request.
+# Set PROMPT_RELOAD=1 locally to pick up edited prompt files without restarting.
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "prompts")
+prompt_registry = PromptRegistry(PROMPTS_DIR, reload=os.environ.get("PROMPT_RELOAD") == "1")
+
+# Results are cached by hash(prompt file, model, message_text): an LRU in the warm container,
+# shared across containers through DynamoDB when RESULT_CACHE_TABLE is set.
+# RESULT_CACHE_SIZE=0 and no table disables caching.
+RESULT_CACHE_TABLE = os.environ.get("RESULT_CACHE_TABLE")
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "1024")),
+    ttl_seconds=int(os.environ.get("RESULT_CACHE_TTL_SECONDS", str(24 * 60 * 60))),
+    shared=DynamoDbBackend(RESULT_CACHE_TABLE) if RESULT_CACHE_TABLE else None,
+)
+
+def extract_prompt_parts(prompt_template, user_message_text, placeholder=PLACEHOLDER):
     """
     Extracts the system and user message parts from a prompt template
     and replaces the placeholder in the user message part.
     Assumes sections are delimited by '--- SYSTEM MESSAGE ---' and '--- USER MESSAGE ---'.
     """
-    system_marker = "# --- SYSTEM MESSAGE ---"
-    user_marker = "# --- USER MESSAGE ---"
+    system_prompt, user_prompt_template = split_prompt_template(prompt_template)
+    return system_prompt, user_prompt_template.replace(placeholder, user_message_text)
 
-    system_prompt = ""
-    user_prompt_template = ""
-    current_section = None
+def build_messages(system_prompt, user_prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
-    # Split the template by lines
-    lines = prompt_template.splitlines()
-
-    for line in lines:
-        if system_marker in line:
-            current_section = "system"
-            continue # Skip the marker line
-        elif user_marker in line:
-            current_section = "user_template"
-            continue # Skip the marker line
-
-        if current_section == "system":
-            system_prompt += line + "\n"
-        elif current_section == "user_template":
-            user_prompt_template += line + "\n"
-
-    # Remove leading/trailing whitespace and replace placeholder
-    system_prompt = system_prompt.strip()
-    user_prompt = user_prompt_template.strip().replace(placeholder, user_message_text)
-
-    return system_prompt, user_prompt
+def parse_result(filename, result_content):
+    """Parses the model's JSON response into {filename: result}."""
+    try:
+        result_json = json.loads(result_content)
+        return {filename: result_json}
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON response for {filename}: {result_content}")
+        return {filename: {"error": "Invalid JSON response from OpenAI", "raw_response": result_content}}
+    except Exception as json_parse_error:
+        print(f"Unexpected error parsing JSON for {filename}: {json_parse_error}")
+        return {filename: {"error": f"Unexpected JSON parse error: {json_parse_error}", "raw_response": result_content}}
 
 def process_single_prompt(system_prompt, user_prompt, filename, client):
     """Helper function to process a single prompt with OpenAI."""
@@ -54,38 +120,344 @@ def process_single_prompt(system_prompt, user_prompt, filename, client):
         # print(f"System Prompt:\n{system_prompt}") # Uncomment for debugging
         # print(f"User Prompt:\n{user_prompt}")     # Uncomment for debugging
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # fast & cheap; bump up if needed
-            temperature=0,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={"type": "json_object"} # leverages structured outputs
+        response = call_policy.call(
+            lambda: client.chat.completions.create(
+                model=MODEL,
+                temperature=0,
+                messages=build_messages(system_prompt, user_prompt),
+                response_format={"type": "json_object"}, # leverages structured outputs
+                timeout=PROMPT_TIMEOUT_SECONDS
+            ),
+            filename,
+            MODEL
         )
-        result_content = response.choices[0].message.content
-
-        # Attempt to parse the JSON response
-        try:
-            result_json = json.loads(result_content)
-            return {filename: result_json}
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON response for {filename}: {result_content}")
-            return {filename: {"error": "Invalid JSON response from OpenAI", "raw_response": result_content}}
-        except Exception as json_parse_error:
-            print(f"Unexpected error parsing JSON for {filename}: {json_parse_error}")
-            return {filename: {"error": f"Unexpected JSON parse error: {json_parse_error}", "raw_response": result_content}}
+        return parse_result(filename, response.choices[0].message.content)
 
     except Exception as e:
         print(f"Error processing prompt {filename} with OpenAI: {e}")
         return {filename: {"error": str(e)}} # Return error message on API call failure
 
+async def process_single_prompt_async(system_prompt, user_prompt, filename, client, semaphore, timeout):
+    """Async variant of process_single_prompt, bounded by semaphore and a per-prompt timeout."""
+    async with semaphore:
+        try:
+            print(f"Processing prompt (async): {filename}")
+            response = await asyncio.wait_for(
+                call_policy.call_async(
+                    lambda: client.chat.completions.create(
+                        model=MODEL,
+                        temperature=0,
+                        messages=build_messages(system_prompt, user_prompt),
+                        response_format={"type": "json_object"}
+                    ),
+                    filename,
+                    MODEL
+                ),
+                timeout
+            )
+            return parse_result(filename, response.choices[0].message.content)
+        except asyncio.TimeoutError:
+            print(f"Prompt {filename} timed out after {timeout}s")
+            return {filename: {"error": f"Timed out after {timeout}s"}}
+        except Exception as e:
+            print(f"Error processing prompt {filename} with OpenAI: {e}")
+            return {filename: {"error": str(e)}}
+
+def run_prompts_threaded(prepared_prompts, deadline=RESPONSE_DEADLINE_SECONDS):
+    """
+    Runs prompts on the shared thread pool. Returns (results, unfinished filenames).
+    Prompts still running at the deadline keep going in the background but are not waited for.
+    """
+    results = {}
+    future_to_filename = {
+        executor.submit(process_single_prompt, system_prompt, user_prompt, filename, get_client()): filename
+        for filename, system_prompt, user_prompt in prepared_prompts
+    }
+    done, not_done = concurrent.futures.wait(future_to_filename, timeout=deadline)
+    for future in done:
+        results.update(future.result())
+    return results, [future_to_filename[f] for f in not_done]
+
+async def run_prompts_async(prepared_prompts, client, concurrency=MAX_CONCURRENCY,
+                            timeout=PROMPT_TIMEOUT_SECONDS, deadline=RESPONSE_DEADLINE_SECONDS):
+    """Runs prompts concurrently on the event loop. Returns (results, unfinished filenames)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    task_to_filename = {
+        asyncio.ensure_future(
+            process_single_prompt_async(system_prompt, user_prompt, filename, client, semaphore, timeout)
+        ): filename
+        for filename, system_prompt, user_prompt in prepared_prompts
+    }
+    if not task_to_filename:
+        return {}, []
+    done, pending = await asyncio.wait(task_to_filename, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for task in done:
+        results.update(task.result())
+    return results, [task_to_filename[t] for t in pending]
+
+def iter_prompts_threaded(prepared_prompts, deadline=RESPONSE_DEADLINE_SECONDS):
+    """
+    Yields (filename, result) as each prompt finishes on the shared thread pool.
+    Prompts still running at the deadline are yielded last with a result of None.
+    """
+    future_to_filename = {
+        executor.submit(process_single_prompt, system_prompt, user_prompt, filename, get_client()): filename
+        for filename, system_prompt, user_prompt in prepared_prompts
+    }
+    finished = set()
+    try:
+        for future in concurrent.futures.as_completed(future_to_filename, timeout=deadline):
+            finished.add(future)
+            filename = future_to_filename[future]
+            yield filename, future.result()[filename]
+    except concurrent.futures.TimeoutError:
+        pass
+    for future, filename in future_to_filename.items():
+        if future not in finished:
+            yield filename, None
+
+async def iter_prompts_async(prepared_prompts, client, concurrency=MAX_CONCURRENCY,
+                             timeout=PROMPT_TIMEOUT_SECONDS, deadline=RESPONSE_DEADLINE_SECONDS):
+    """Async generator variant of iter_prompts_threaded; unfinished prompts are cancelled at the deadline."""
+    semaphore = asyncio.Semaphore(concurrency)
+    task_to_filename = {
+        asyncio.ensure_future(
+            process_single_prompt_async(system_prompt, user_prompt, filename, client, semaphore, timeout)
+        ): filename
+        for filename, system_prompt, user_prompt in prepared_prompts
+    }
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + deadline
+    pending = set(task_to_filename)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0, give_up_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                filename = task_to_filename[task]
+                yield filename, task.result()[filename]
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    for task in pending:
+        yield task_to_filename[task], None
+
+def iter_prompts(prepared_prompts, execution):
+    """Yields (filename, result) in completion order with either runner; result is None past the deadline."""
+    if execution != "async":
+        yield from iter_prompts_threaded(prepared_prompts, RESPONSE_DEADLINE_SECONDS)
+        return
+
+    loop = get_event_loop()
+    results = iter_prompts_async(prepared_prompts, get_async_client(), MAX_CONCURRENCY,
+                                 PROMPT_TIMEOUT_SECONDS, RESPONSE_DEADLINE_SECONDS)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+
+def run_prompts(prepared_prompts, execution):
+    """Dispatches prepared prompts to the async or threaded runner. Returns (results, unfinished filenames)."""
+    # Settings are read at call time (not as defaults) so they can be tuned without a reimport
+    if execution == "async":
+        return get_event_loop().run_until_complete(
+            run_prompts_async(prepared_prompts, get_async_client(), MAX_CONCURRENCY,
+                              PROMPT_TIMEOUT_SECONDS, RESPONSE_DEADLINE_SECONDS)
+        )
+    return run_prompts_threaded(prepared_prompts, RESPONSE_DEADLINE_SECONDS)
+
+def run_combined(templates, message_text, execution):
+    """
+    Scores every signal with one request, then re-runs only the signals whose
+    sub-score is missing or fails its schema as individual prompts.
+    Returns (results, unfinished filenames).
+    """
+    system_prompt, user_prompt = build_combined_prompt(templates, message_text)
+    combined, unfinished = run_prompts([("combined", system_prompt, user_prompt)], execution)
+    if unfinished:
+        return {}, [t.filename for t in templates]
+
+    results, failed = split_combined_result(templates, combined.get("combined"))
+    if failed:
+        print(f"Falling back to per-signal prompts for: {[t.signal for t in failed]}")
+        fallback, unfinished = run_prompts([(t.filename, *t.render(message_text)) for t in failed], execution)
+        results.update(fallback)
+    return results, unfinished
+
+
+def select_templates(signals):
+    """All loaded templates, or the subset named in signals. Returns (templates, unknown signal names)."""
+    templates = prompt_registry.templates()
+    if signals is None:
+        return templates, []
+    unknown = sorted(set(signals) - {t.signal for t in templates})
+    return [t for t in templates if t.signal in signals], unknown
+
+def request_templates(request_body):
+    """Templates selected by the request. Returns (templates, None) or (None, error response)."""
+    # Optional subset of signals, by prompt name without ".txt"
+    signals = request_body.get("signals")
+    if signals is not None and not (isinstance(signals, list) and all(isinstance(s, str) for s in signals)):
+        return None, {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "signals must be a list of prompt names"})
+        }
+    templates, unknown = select_templates(signals)
+    if unknown:
+        return None, {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": f"Unknown signals: {unknown}"})
+        }
+
+    if not templates and not prompt_registry.errors:
+        return None, {
+            "statusCode": 500, # Internal Server Error
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "No prompt files found in the 'prompts' directory."})
+        }
+    return templates, None
+
+def cache_keys(templates, message_text, mode=None):
+    """
+    Cache key by filename. A combined-mode result comes from the combined prompt, not the
+    signal's own prompt, so it is keyed on the combined prompt's hash and the signal name.
+    """
+    if mode == "combined":
+        content_hash = combined_content_hash(templates)
+        return {t.filename: cache_key(f"{content_hash}:{t.signal}", MODEL, message_text) for t in templates}
+    return {t.filename: cache_key(t.content_hash, MODEL, message_text) for t in templates}
+
+def lookup_cached(templates, message_text, mode=None):
+    """Returns (cached results by filename, templates that still need a call)."""
+    keys = cache_keys(templates, message_text, mode)
+    found, cache_counts = result_cache.lookup(list(keys.values()))
+    print(metrics_record(cache_counts))
+    cached = {filename: found[key] for filename, key in keys.items() if key in found}
+    return cached, [t for t in templates if t.filename not in cached]
+
+def store_results(templates, message_text, results, mode=None):
+    """
+    Caches results that match their prompt's schema, never errors. templates are the ones
+    that were actually run, so combined-mode keys match the combined prompt that was sent.
+    """
+    keys = cache_keys(templates, message_text, mode)
+    result_cache.store({
+        keys[t.filename]: results[t.filename]
+        for t in templates
+        if isinstance(results.get(t.filename), dict) and "error" not in results[t.filename]
+        and (t.schema is None or not validate(results[t.filename], t.schema))
+    })
+
+def stream_results(templates, message_text, execution, mode=None):
+    """
+    Yields NDJSON lines, one {filename: result} per signal as soon as it is known:
+    load errors and cache hits first, then each prompt as it completes. The last
+    line is {"done": true, "unfinished": [...], "elapsed_ms": ...}.
+    """
+    started = time.monotonic()
+    for filename, error in prompt_registry.errors.items():
+        yield json.dumps({filename: {"error": f"Error preparing prompt: {error}"}}) + "\n"
+
+    cached, templates = lookup_cached(templates, message_text, mode)
+    for filename, result in cached.items():
+        yield json.dumps({filename: result}) + "\n"
+
+    results, unfinished = {}, []
+    if templates and mode == "combined":
+        combined, unfinished = run_combined(templates, message_text, execution)
+        for filename, result in combined.items():
+            results[filename] = result
+            yield json.dumps({filename: result}) + "\n"
+    elif templates:
+        prepared_prompts = [(t.filename, *t.render(message_text)) for t in templates]
+        for filename, result in iter_prompts(prepared_prompts, execution):
+            if result is None:
+                unfinished.append(filename)
+                continue
+            results[filename] = result
+            yield json.dumps({filename: result}) + "\n"
+    store_results(templates, message_text, results, mode)
+
+    if unfinished:
+        print(f"Response deadline of {RESPONSE_DEADLINE_SECONDS}s reached; unfinished prompts: {unfinished}")
+        for filename in unfinished:
+            yield json.dumps({filename: {"error": "Not finished before the response deadline"}}) + "\n"
+    print(metrics_record(call_policy.drain_metrics(), prefix="CallPolicy"))
+    elapsed_ms = round((time.monotonic() - started) * 1000)
+    yield json.dumps({"done": True, "unfinished": unfinished, "elapsed_ms": elapsed_ms}) + "\n"
+
+def handle_batch(request_body):
+    """
+    Batch mode: "messages" is a list of at most MAX_BATCH_MESSAGES strings or
+    {"id", "message_text"} objects. Results are returned as NDJSON, one line per message.
+    Files and s3:// paths are only read and written by the offline batch_scoring.py CLI.
+    """
+    if "source" in request_body or "output" in request_body:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "source and output are only supported by the batch_scoring.py CLI"})
+        }
+    messages = request_body.get("messages")
+    if not isinstance(messages, list) or len(messages) > MAX_BATCH_MESSAGES:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": f"messages must be a list of at most {MAX_BATCH_MESSAGES} entries"})
+        }
+
+    templates, error_response = request_templates(request_body)
+    if error_response:
+        return error_response
+    if not templates:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "No prompts selected"})
+        }
+
+    scorer = BatchScorer(templates, get_client(), MODEL, concurrency=MAX_CONCURRENCY,
+                         timeout=PROMPT_TIMEOUT_SECONDS, cache=result_cache)
+    lines = []
+    stats = scorer.run(iter_messages(messages), lines.append)
+    print(f"Batch finished: {json.dumps(stats)}")
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/x-ndjson", "Access-Control-Allow-Origin": "*"},
+        "body": "".join(lines)
+    }
+
 
 def lambda_handler(event, context):
+    try:
+        return handle_request(event, context)
+    finally:
+        cold_start.report()  # no-op unless COLD_START_PROFILE=1
+
+def handle_request(event, context):
     # Assuming event is a valid POST request with a body containing message_text
     try:
         request_body = json.loads(event['body'])
-        message_text = request_body['message_text'] # Will raise KeyError if message_text is missing
+        batch = any(key in request_body for key in ("messages", "source", "output"))
+        if not batch:
+            message_text = request_body['message_text'] # Will raise KeyError if message_text is missing
     except (KeyError, json.JSONDecodeError) as e:
         # Basic error handling for expected POST input issues for the demo
         return {
@@ -102,46 +474,48 @@ def lambda_handler(event, context):
             "body": json.dumps({"message": f"An unexpected error occurred: {e}"})
         }
 
+    if batch:
+        return handle_batch(request_body)
 
-    prompts_dir = os.path.join(os.path.dirname(__file__), "prompts")
-    placeholder = "$$USER_MESSAGE$$"
-    prompt_files = [f for f in os.listdir(prompts_dir) if f.endswith(".txt")]
-
-    if not prompt_files:
-         return {
-            "statusCode": 500, # Internal Server Error
-            "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
-            "body": json.dumps({"message": "No prompt files found in the 'prompts' directory."})
-        }
+    templates, error_response = request_templates(request_body)
+    if error_response:
+        return error_response
 
+    execution = request_body.get("execution", EXECUTION_MODE)
+    # Streaming responses come from stream_server.py behind the streaming function URL;
+    # API Gateway would buffer them into one body anyway.
     all_results = {} # Store results from all prompts
+    for filename, error in prompt_registry.errors.items():
+        all_results[filename] = {"error": f"Error preparing prompt: {error}"}
 
-    # Process prompts in parallel
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_filename = {}
-        for filename in prompt_files:
-            filepath = os.path.join(prompts_dir, filename)
-            try:
-                with open(filepath, 'r') as f:
-                    prompt_template = f.read()
-
-                # Extract system and user parts and replace placeholder
-                system_prompt, user_prompt = extract_prompt_parts(prompt_template, message_text, placeholder)
-
-                # Submit the task to the thread pool
-                future = executor.submit(process_single_prompt, system_prompt, user_prompt, filename, client)
-                future_to_filename[future] = filename # Map future back to filename
-            except Exception as e:
-                print(f"Error preparing prompt {filename}: {e}")
-                all_results[filename] = {"error": f"Error preparing prompt: {e}"}
+    # Cached results skip their model calls entirely
+    mode = request_body.get("mode")
+    cached, templates = lookup_cached(templates, message_text, mode)
+    all_results.update(cached)
 
+    results, unfinished = {}, []
+    if templates and mode == "combined":
+        # One request for all signals; per-signal prompts only for sub-scores that fail validation
+        results, unfinished = run_combined(templates, message_text, execution)
+    elif templates:
+        # Fill the message into the pre-split templates and process prompts in parallel
+        prepared_prompts = [(t.filename, *t.render(message_text)) for t in templates]
+        results, unfinished = run_prompts(prepared_prompts, execution)
+    all_results.update(results)
+    store_results(templates, message_text, results, mode)
 
-        # Collect results as they complete
-        for future in concurrent.futures.as_completed(future_to_filename):
-            filename = future_to_filename[future]
-            result_dict = future.result()
-            all_results.update(result_dict)
+    if unfinished:
+        print(f"Response deadline of {RESPONSE_DEADLINE_SECONDS}s reached; unfinished prompts: {unfinished}")
+        if PARTIAL_RESULTS == "reject":
+            return {
+                "statusCode": 504,
+                "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+                "body": json.dumps({"message": "Timed out waiting for prompt results", "unfinished": unfinished})
+            }
+        for filename in unfinished:
+            all_results[filename] = {"error": "Not finished before the response deadline"}
 
+    print(metrics_record(call_policy.drain_metrics(), prefix="CallPolicy"))
 
     # Return the combined results
     return {
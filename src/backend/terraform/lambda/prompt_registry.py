@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+
+SYSTEM_MARKER = "# --- SYSTEM MESSAGE ---"
+USER_MARKER = "# --- USER MESSAGE ---"
+PLACEHOLDER = "$$USER_MESSAGE$$"
+SCHEMA_MARKER = "Schema (use exactly):"
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def split_prompt_template(prompt_template):
+    """
+    Splits a prompt file into its system prompt and user message template.
+    Sections are delimited by '# --- SYSTEM MESSAGE ---' and '# --- USER MESSAGE ---';
+    anything before the first marker is ignored.
+    """
+    sections = {"system": [], "user_template": []}
+    current_section = None
+
+    for line in prompt_template.splitlines():
+        if SYSTEM_MARKER in line:
+            current_section = "system"
+            continue # Skip the marker line
+        elif USER_MARKER in line:
+            current_section = "user_template"
+            continue # Skip the marker line
+
+        if current_section:
+            sections[current_section].append(line)
+
+    return "\n".join(sections["system"]).strip(), "\n".join(sections["user_template"]).strip()
+
+
+def extract_schema(system_prompt):
+    """Returns the JSON schema that follows 'Schema (use exactly):' in a system prompt, or None."""
+    marker = system_prompt.find(SCHEMA_MARKER)
+    start = system_prompt.find("{", marker) if marker != -1 else -1
+    if start == -1:
+        return None
+    try:
+        schema, _ = json.JSONDecoder().raw_decode(system_prompt, start)
+        return schema
+    except json.JSONDecodeError:
+        return None
+
+
+def validate(value, schema, path="$"):
+    """
+    Checks value against the small JSON schema subset used by the prompt files
+    (type, properties, required, additionalProperties, minimum, maximum, enum).
+    Returns a list of error messages; empty means valid.
+    """
+    expected = schema.get("type")
+    if expected:
+        python_type = _JSON_TYPES.get(expected)
+        is_bool = isinstance(value, bool)
+        if python_type is None or not isinstance(value, python_type) or (is_bool and expected in ("number", "integer")):
+            return [f"{path}: expected {expected}"]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: not one of {schema['enum']}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: below minimum {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: above maximum {schema['maximum']}")
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}.{key}: required")
+        for key, item in value.items():
+            if key in properties:
+                errors.extend(validate(item, properties[key], f"{path}.{key}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{key}: not allowed")
+    return errors
+
+
+class PromptTemplate:
+    """A prompt file, parsed once. The user template is pre-split on the placeholder."""
+
+    def __init__(self, filename, content, mtime=None, placeholder=PLACEHOLDER):
+        self.filename = filename
+        self.signal = os.path.splitext(filename)[0]
+        self.mtime = mtime
+        self.content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self.system_prompt, user_template = split_prompt_template(content)
+        self.user_parts = user_template.split(placeholder)
+        self.schema = extract_schema(self.system_prompt)
+
+    def render(self, message_text):
+        """Returns (system_prompt, user_prompt) with the message substituted in a single join."""
+        return self.system_prompt, message_text.join(self.user_parts)
+
+
+class PromptRegistry:
+    """
+    Loads every .txt prompt in a directory once (at cold start) and keeps it in memory.
+
+    With reload=True (local development) files are re-read when their mtime changes
+    or prompts are added/removed; in Lambda the files never change, so no
+    filesystem calls are made after the first load.
+    """
+
+    def __init__(self, prompts_dir, placeholder=PLACEHOLDER, reload=False):
+        self.prompts_dir = prompts_dir
+        self.placeholder = placeholder
+        self.reload = reload
+        self._templates = {}
+        self.errors = {}  # filename -> error message for files that could not be loaded
+        self.load()
+
+    def _load_file(self, filename, mtime=None):
+        filepath = os.path.join(self.prompts_dir, filename)
+        try:
+            with open(filepath, 'r') as f:
+                self._templates[filename] = PromptTemplate(filename, f.read(), mtime, self.placeholder)
+            self.errors.pop(filename, None)
+        except Exception as e:
+            print(f"Error loading prompt {filename}: {e}")
+            self._templates.pop(filename, None)
+            self.errors[filename] = str(e)
+
+    def _scan(self):
+        try:
+            return {
+                entry.name: entry.stat().st_mtime
+                for entry in os.scandir(self.prompts_dir)
+                if entry.name.endswith(".txt")
+            }
+        except FileNotFoundError:
+            return {}
+
+    def load(self):
+        """(Re)loads every prompt file."""
+        self._templates, self.errors = {}, {}
+        for filename, mtime in sorted(self._scan().items()):
+            self._load_file(filename, mtime)
+
+    def refresh(self):
+        """Re-reads added or modified files and drops deleted ones."""
+        current = self._scan()
+        for filename in set(self._templates) | set(self.errors):
+            if filename not in current:
+                self._templates.pop(filename, None)
+                self.errors.pop(filename, None)
+        for filename, mtime in current.items():
+            template = self._templates.get(filename)
+            if template is None or template.mtime != mtime:
+                self._load_file(filename, mtime)
+
+    def templates(self):
+        """All loaded prompts, sorted by filename."""
+        if self.reload:
+            self.refresh()
+        return [self._templates[name] for name in sorted(self._templates)]
+
+    def get(self, filename):
+        if self.reload:
+            self.refresh()
+        return self._templates.get(filename)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DYNAMODB_BATCH_GET_LIMIT = 100
+DYNAMODB_BATCH_WRITE_LIMIT = 25
+
+
+def cache_key(content_hash, model, message_text):
+    """Content-addressed key: a result only depends on the prompt file, the model and the message."""
+    digest = hashlib.sha256()
+    for part in (content_hash, model, message_text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LocalBackend:
+    """In-process stand-in for the shared DynamoDB layer, for tests and offline runs."""
+
+    def __init__(self):
+        self.items = {}  # key -> (expires_at, result)
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        for key in keys:
+            item = self.items.get(key)
+            if item and item[0] > now:
+                found[key] = item[1]
+        return found
+
+    def put_many(self, items, expires_at):
+        for key, result in items.items():
+            self.items[key] = (expires_at, result)
+
+
+class DynamoDbBackend:
+    """
+    Shared layer in a DynamoDB table with hash key CacheKey and a TTL attribute ExpiresAt.
+    Items past ExpiresAt are ignored on read, since DynamoDB deletes expired items lazily.
+    """
+
+    def __init__(self, table_name, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self.client = client
+
+    def get_many(self, keys):
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), DYNAMODB_BATCH_GET_LIMIT):
+            request = {self.table_name: {
+                "Keys": [{"CacheKey": {"S": key}} for key in keys[start:start + DYNAMODB_BATCH_GET_LIMIT]],
+                "ProjectionExpression": "CacheKey, #r, ExpiresAt",
+                "ExpressionAttributeNames": {"#r": "Result"},
+            }}
+            for _ in range(3):  # unprocessed keys are retried a couple of times, then treated as misses
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self.table_name, []):
+                    if float(item["ExpiresAt"]["N"]) > now:
+                        found[item["CacheKey"]["S"]] = json.loads(item["Result"]["S"])
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+        return found
+
+    def put_many(self, items, expires_at):
+        requests = [
+            {"PutRequest": {"Item": {
+                "CacheKey": {"S": key},
+                "Result": {"S": json.dumps(result)},
+                "ExpiresAt": {"N": str(int(expires_at))},
+            }}}
+            for key, result in items.items()
+        ]
+        for start in range(0, len(requests), DYNAMODB_BATCH_WRITE_LIMIT):
+            request = {self.table_name: requests[start:start + DYNAMODB_BATCH_WRITE_LIMIT]}
+            for _ in range(3):
+                request = self.client.batch_write_item(RequestItems=request).get("UnprocessedItems")
+                if not request:
+                    break
+
+
+class ResultCache:
+    """
+    Two-layer result cache: an LRU dict in the warm container, backed by an optional
+    shared layer (DynamoDB, or LocalBackend offline). Shared-layer failures are logged
+    and treated as misses, so the cache can never fail a request.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=DEFAULT_TTL_SECONDS, shared=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._memory = OrderedDict()  # key -> (expires_at, result), least recently used first
+        self.stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+
+    def _remember(self, key, result, expires_at):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, keys):
+        """Returns (found results by key, counts for this lookup)."""
+        now = time.time()
+        found, missing = {}, []
+        for key in keys:
+            item = self._memory.get(key)
+            if item and item[0] > now:
+                self._memory.move_to_end(key)
+                found[key] = item[1]
+            else:
+                self._memory.pop(key, None)
+                missing.append(key)
+        counts = {"memory_hits": len(found), "shared_hits": 0, "misses": 0, "shared_errors": 0}
+
+        if missing and self.shared is not None:
+            try:
+                shared = self.shared.get_many(missing)
+            except Exception as e:
+                print(f"Result cache shared lookup failed: {e}")
+                shared = {}
+                counts["shared_errors"] += 1
+            for key, result in shared.items():
+                self._remember(key, result, now + self.ttl_seconds)
+            found.update(shared)
+            counts["shared_hits"] = len(shared)
+
+        counts["misses"] = len(keys) - len(found)
+        for name, value in counts.items():
+            self.stats[name] += value
+        return found, counts
+
+    def store(self, items):
+        """Caches results by key in both layers."""
+        if not items:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        for key, result in items.items():
+            self._remember(key, result, expires_at)
+        if self.shared is not None:
+            try:
+                self.shared.put_many(items, expires_at)
+            except Exception as e:
+                print(f"Result cache shared write failed: {e}")
+                self.stats["shared_errors"] += 1
+
+
+def metrics_record(counts, prefix="ResultCache", namespace="EmotionalSignals"):
+    """Counts as a CloudWatch Embedded Metric Format record; printing it publishes the metrics."""
+    return json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [[]],
+                "Metrics": [{"Name": f"{prefix}.{name}", "Unit": "Count"} for name in counts],
+            }],
+        },
+        **{f"{prefix}.{name}": value for name, value in counts.items()},
+    })
@@ -0,0 +1,5 @@
+#!/bin/sh
+# Entry point of the streaming function (handler "run.sh"): the Lambda Web Adapter
+# runs it and forwards requests to stream_server.py on PORT.
+export PYTHONPATH="/opt/python:/opt/python/lib/python3.11/site-packages:$PYTHONPATH"
+exec python3 stream_server.py
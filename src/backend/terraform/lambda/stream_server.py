@@ -0,0 +1,74 @@
+"""
+Streams emotional signal results as chunked NDJSON over plain HTTP.
+
+The Python Lambda runtime cannot stream a response itself, so lambda_handler
+only returns complete results. This server writes each line as its own HTTP
+chunk the moment a prompt finishes, so a caller sees the first signals long
+before the slowest prompt is done. Run it locally, or in Lambda behind the AWS
+Lambda Web Adapter: vulnerability_mvp_stream_lambda in dev/lambda.tf starts it
+through run.sh and serves it from a RESPONSE_STREAM function URL (the adapter
+forwards requests to PORT, 8080 by default).
+
+    python stream_server.py
+    curl -N -d '{"message_text": "hello"}' localhost:8080
+"""
+
+import json
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import emotional_signal_processing as esp
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # chunked transfer encoding needs 1.1
+
+    def end_headers(self):
+        # The server handles one connection at a time, so never hold one open between requests
+        self.send_header("Connection", "close")
+        super().end_headers()
+
+    def _send_json(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        try:
+            request_body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            message_text = request_body["message_text"]
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            self._send_json(400, json.dumps({"message": f"Invalid request body: {e}"}))
+            return
+
+        templates, error_response = esp.request_templates(request_body)
+        if error_response:
+            self._send_json(error_response["statusCode"], error_response["body"])
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        execution = request_body.get("execution", esp.EXECUTION_MODE)
+        for line in esp.stream_results(templates, message_text, execution, request_body.get("mode")):
+            data = line.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def make_server(host="0.0.0.0", port=None):
+    # One request at a time: the async runner's event loop is shared per process, like in Lambda
+    return HTTPServer((host, port if port is not None else int(os.environ.get("PORT", "8080"))), StreamHandler)
+
+
+if __name__ == "__main__":
+    server = make_server()
+    print(f"Streaming results on port {server.server_address[1]}")
+    server.serve_forever()
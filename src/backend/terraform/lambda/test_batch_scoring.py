@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+import batch_scoring
+from prompt_registry import PromptTemplate
+from result_cache import ResultCache
+from conftest import _completion
+
+PROMPT = "# --- SYSTEM MESSAGE ---\nScore {name}.\n# --- USER MESSAGE ---\n{name}: $$USER_MESSAGE$$"
+
+
+def _templates(n):
+    return [PromptTemplate(f"s{i}.txt", PROMPT.format(name=f"s{i}")) for i in range(n)]
+
+
+def _rate_limit_error(retry_after="0.05"):
+    response = SimpleNamespace(request=None, status_code=429, headers={"retry-after": retry_after})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FakeCompletions:
+    """Thread-safe stand-in for OpenAI().chat.completions; errors maps a user prompt to exceptions to raise first."""
+
+    def __init__(self, errors=None, delay=0.0):
+        self.errors = errors or {}
+        self.delay = delay
+        self.calls = []
+        self.raised_at = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def create(self, messages, **kwargs):
+        user = messages[1]["content"]
+        with self.lock:
+            self.calls.append((time.monotonic(), user))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            pending = self.errors.get(user)
+            error = pending.pop(0) if pending else None
+        try:
+            time.sleep(self.delay)
+            if error:
+                self.raised_at.append(time.monotonic())
+                raise error
+            return _completion(json.dumps({"score": 0.5, "confidence": 0.5, "prompt": user}))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def _scorer(completions, templates, **kwargs):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return batch_scoring.BatchScorer(templates, client, "test-model", **kwargs)
+
+
+def _run(scorer, messages):
+    lines = []
+    stats = scorer.run(batch_scoring.iter_messages(messages), lines.append)
+    return [json.loads(line) for line in lines], stats
+
+
+def test_iter_messages_from_ndjson_file(tmp_path):
+    path = tmp_path / "messages.ndjson"
+    path.write_text('{"id": "a", "message_text": "hi"}\n"plain"\n\n{"id": "c"}\nnot json\n')
+
+    assert list(batch_scoring.iter_messages(str(path))) == [
+        ("a", "hi", None),
+        (1, "plain", None),
+        ("c", None, "Missing message_text"),
+        (3, None, "Invalid JSON line: Expecting value: line 1 column 1 (char 0)"),
+    ]
+
+
+def test_batch_scores_every_message_prompt_pair_with_bounded_concurrency():
+    completions = FakeCompletions(delay=0.005)
+    results, stats = _run(_scorer(completions, _templates(3), concurrency=4), [f"m{i}" for i in range(10)])
+
+    assert sorted(r["id"] for r in results) == list(range(10))
+    for line in results:
+        assert set(line["results"]) == {"s0.txt", "s1.txt", "s2.txt"}
+        assert line["results"]["s1.txt"]["prompt"] == f"s1: m{line['id']}"
+    assert stats["calls"] == 30
+    assert completions.max_in_flight <= 4
+
+
+def test_rate_limit_pauses_all_workers_and_retries():
+    completions = FakeCompletions(errors={"s0: m0": [_rate_limit_error("0.1")]})
+    scorer = _scorer(completions, _templates(2), concurrency=2, backoff=batch_scoring.Backoff(base=0.001))
+    results, stats = _run(scorer, ["m0", "m1"])
+
+    assert all("error" not in r for line in results for r in line["results"].values())
+    assert stats["rate_limited"] == 1 and stats["calls"] == 5
+    # nothing starts while paused (allowing for a call already past wait() when the 429 came back)
+    limited_at = completions.raised_at[0]
+    assert not [t for t, _ in completions.calls if limited_at + 0.005 < t < limited_at + 0.09]
+    retried_at = [t for t, user in completions.calls if user == "s0: m0"][1]
+    assert retried_at - limited_at >= 0.09
+
+
+def test_gives_up_after_max_retries():
+    errors = [openai.APITimeoutError(request=None) for _ in range(3)]
+    completions = FakeCompletions(errors={"s0: m0": errors})
+    scorer = _scorer(completions, _templates(1), max_retries=2, backoff=batch_scoring.Backoff(base=0.001))
+    results, stats = _run(scorer, ["m0"])
+
+    assert results[0]["results"]["s0.txt"]["error"].startswith("Gave up after 3 attempts")
+    assert stats["errors"] == 1
+
+
+def test_batch_uses_result_cache():
+    cache = ResultCache()
+    completions = FakeCompletions()
+    _run(_scorer(completions, _templates(2), cache=cache), ["same", "same", "other"])
+    calls = len(completions.calls)
+    results, stats = _run(_scorer(completions, _templates(2), cache=cache), ["same"])
+
+    assert calls <= 6 and len(completions.calls) == calls
+    assert stats["cache_hits"] == 2
+    assert results[0]["results"]["s0.txt"]["prompt"] == "s0: same"
+
+
+def test_lambda_handler_batch_mode_returns_ndjson(esp, mocker):
+    mocker.patch.object(esp.get_client().chat.completions, "create", return_value=_completion('{"score": 0.1, "confidence": 1}'))
+    event = {"body": json.dumps({
+        "messages": ["one", {"id": "x", "message_text": "two"}],
+        "signals": ["authenticity", "shame_cues"],
+    })}
+    response = esp.lambda_handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert response["headers"]["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response["body"].splitlines()]
+    assert sorted(str(line["id"]) for line in lines) == ["0", "x"]
+    assert set(lines[0]["results"]) == {"authenticity.txt", "shame_cues.txt"}
+
+
+def test_lambda_handler_batch_mode_rejects_paths_and_oversized_batches(esp, mocker, tmp_path):
+    create = mocker.patch.object(esp.get_client().chat.completions, "create")
+    source = tmp_path / "in.ndjson"
+    source.write_text('"one"\n')
+    for body in ({"source": str(source)}, {"messages": ["one"], "output": str(tmp_path / "out.ndjson")},
+                 {"messages": ["one"] * (esp.MAX_BATCH_MESSAGES + 1)}, {"messages": "one"}):
+        assert esp.lambda_handler({"body": json.dumps(body)}, None)["statusCode"] == 400
+    assert create.call_count == 0
+    assert not (tmp_path / "out.ndjson").exists()
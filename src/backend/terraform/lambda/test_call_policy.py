@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from call_policy import CLOSED, HALF_OPEN, OPEN, CallPolicy, CircuitBreaker, CircuitOpenError, LatencyTracker
+
+
+def _server_error():
+    return openai.InternalServerError("boom", response=SimpleNamespace(request=None, status_code=500, headers={}),
+                                      body=None)
+
+
+def _rate_limit_error(retry_after):
+    response = SimpleNamespace(request=None, status_code=429, headers={"retry-after": retry_after})
+    return openai.RateLimitError("slow down", response=response, body=None)
+
+
+class Flaky:
+    """Raises the given errors in order, then returns "ok"."""
+
+    def __init__(self, *errors, delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        time.sleep(self.delay)
+        if error:
+            raise error
+        return "ok"
+
+
+def _warm_latency(policy, key, seconds, n=20):
+    for _ in range(n):
+        policy.latency.observe(key, seconds)
+
+
+def test_retries_retryable_errors_with_retry_after():
+    policy = CallPolicy(max_retries=2, base_delay=0.001)
+    fn = Flaky(_server_error(), _rate_limit_error("0.05"))
+
+    started = time.monotonic()
+    assert policy.call(fn, "p.txt", "m") == "ok"
+    assert fn.calls == 3
+    assert time.monotonic() - started >= 0.05
+    assert policy.drain_metrics()["retries"] == 2
+
+
+def test_gives_up_after_max_retries_and_does_not_retry_other_errors():
+    policy = CallPolicy(max_retries=1, base_delay=0.001)
+    with pytest.raises(openai.InternalServerError):
+        policy.call(Flaky(_server_error(), _server_error(), _server_error()), "p.txt", "m")
+
+    fn = Flaky(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        policy.call(fn, "p.txt", "m")
+    assert fn.calls == 1
+
+
+def test_circuit_breaker_opens_fails_fast_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker("m", threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.record_failure() is True and breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 10
+    breaker.before_call()  # the one trial call
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_policy_breaker_rejects_calls_and_reports_state():
+    policy = CallPolicy(max_retries=0, breaker_threshold=2)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            policy.call(Flaky(_server_error()), "p.txt", "gpt")
+    fn = Flaky()
+    with pytest.raises(CircuitOpenError):
+        policy.call(fn, "p.txt", "gpt")
+
+    assert fn.calls == 0
+    metrics = policy.drain_metrics()
+    assert metrics["breaker_opened"] == 1
+    assert metrics["breaker_rejections"] == 1
+    assert metrics["breaker_state.gpt"] == 2
+    assert policy.drain_metrics()["breaker_rejections"] == 0
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(min_samples=3)
+    tracker.observe("a", 1.0)
+    tracker.observe("a", 2.0)
+    assert tracker.p95("a") is None
+    tracker.observe("a", 3.0)
+    assert tracker.p95("a") == 3.0
+
+
+def test_sync_hedge_wins_when_primary_is_slow():
+    policy = CallPolicy(hedge_min_delay=0.01)
+    _warm_latency(policy, "p.txt", 0.02)
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        time.sleep(1 if len(calls) == 1 else 0)
+        return len(calls)
+
+    started = time.monotonic()
+    assert policy.call(fn, "p.txt", "m") == 2
+    assert time.monotonic() - started < 0.5
+    metrics = policy.drain_metrics()
+    assert metrics["hedges"] == 1 and metrics["hedge_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    policy = CallPolicy(hedge_min_delay=0.05)
+    _warm_latency(policy, "p.txt", 0.05)
+    fn = Flaky()
+    assert policy.call(fn, "p.txt", "m") == "ok"
+    assert fn.calls == 1 and policy.drain_metrics()["hedges"] == 0
+
+
+def test_sync_hedges_never_queue_behind_busy_threads():
+    policy = CallPolicy(hedge_min_delay=0.01, hedge_workers=1)
+    _warm_latency(policy, "p.txt", 0.02)
+    release = threading.Event()
+    threads = []
+
+    def fn():
+        threads.append(threading.current_thread())
+        release.wait(0.3)
+        return "ok"
+
+    caller = threading.current_thread()
+    assert policy.call(fn, "p.txt", "m") == "ok"  # the only pool thread runs the primary, so no hedge
+    assert len(threads) == 1 and threads[0] is not caller
+    assert policy.drain_metrics()["hedges_skipped"] == 1
+
+    stuck = policy._submit(release.wait)  # a losing request still holding the pool thread
+    assert policy.call(fn, "p.txt", "m") == "ok"
+    assert threads[1] is caller  # ran inline instead of waiting for the pool
+    release.set()
+    stuck.result()
+
+
+def test_async_hedge_cancels_the_loser():
+    policy = CallPolicy(hedge_min_delay=0.01)
+    _warm_latency(policy, "p.txt", 0.02)
+    started, cancelled = [], []
+
+    async def make_call():
+        started.append(1)
+        try:
+            await asyncio.sleep(1 if len(started) == 1 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return len(started)
+
+    assert asyncio.run(policy.call_async(make_call, "p.txt", "m")) == 2
+    assert cancelled == [1]
+
+
+def test_async_retries():
+    policy = CallPolicy(max_retries=2, base_delay=0.001)
+    errors = [_server_error()]
+
+    async def make_call():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert asyncio.run(policy.call_async(make_call, "p.txt", "m")) == "ok"
+    assert policy.drain_metrics()["retries"] == 1
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPT = """
+import json
+import emotional_signal_processing as esp
+assert esp.client is None and esp.async_client is None
+esp.get_client()
+esp.get_client()
+print("REPORT " + json.dumps(esp.cold_start.report()))
+print("AGAIN " + json.dumps(esp.cold_start.report()))
+"""
+
+
+def _run(profile):
+    env = dict(os.environ, OPENAI_API_KEY="test-key", COLD_START_PROFILE=profile)
+    output = subprocess.run([sys.executable, "-c", SCRIPT], cwd=LAMBDA_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return {line.split(" ", 1)[0]: json.loads(line.split(" ", 1)[1])
+            for line in output.splitlines() if line.startswith(("REPORT", "AGAIN"))}
+
+
+def test_profile_records_imports_and_lazy_client_construction():
+    reports = _run("1")
+    timings = reports["REPORT"]
+    assert timings["import openai"] > 0
+    assert "import prompt_registry" in timings
+    assert "client OpenAI" in timings
+    assert "client AsyncOpenAI" not in timings  # never used, never built
+    assert reports["AGAIN"] == {}
+
+
+def test_profile_is_off_by_default():
+    assert _run("0") == {"REPORT": {}, "AGAIN": {}}
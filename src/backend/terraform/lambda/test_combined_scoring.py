@@ -0,0 +1,82 @@
+import json
+
+from conftest import _completion
+
+
+def test_build_combined_prompt_includes_every_signal_once(esp):
+    templates = esp.prompt_registry.templates()
+    system_prompt, user_prompt = esp.build_combined_prompt(templates, "hello there")
+
+    for template in templates:
+        assert f"SIGNAL: {template.signal} ===" in system_prompt
+    assert user_prompt.count("hello there") == 1
+
+
+def test_split_combined_result_flags_invalid_and_missing(esp):
+    templates = esp.prompt_registry.templates()[:3]
+    a, b, c = (t.signal for t in templates)
+    results, failed = esp.split_combined_result(templates, {
+        a: {"score": 0.2, "confidence": 0.8},
+        b: {"score": 2, "confidence": 0.8},
+    })
+
+    assert results == {f"{a}.txt": {"score": 0.2, "confidence": 0.8}}
+    assert [t.signal for t in failed] == [b, c]
+
+
+def test_lambda_handler_combined_mode_falls_back_for_failed_signals(esp, mocker):
+    def create(messages, **kwargs):
+        if "SIGNAL: authenticity" in messages[0]["content"]:
+            return _completion(json.dumps({
+                "authenticity": {"score": 0.4, "confidence": 0.9},
+                "shame_cues": {"score": "high"},
+            }))
+        return _completion('{"score": 0.7, "confidence": 0.6}')
+
+    mock_create = mocker.patch.object(esp.get_client().chat.completions, "create", side_effect=create)
+    event = {"body": json.dumps({
+        "message_text": "hello",
+        "mode": "combined",
+        "signals": ["authenticity", "shame_cues", "meaning_making"],
+    })}
+    response = esp.lambda_handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {
+        "authenticity.txt": {"score": 0.4, "confidence": 0.9},
+        "meaning_making.txt": {"score": 0.7, "confidence": 0.6},
+        "shame_cues.txt": {"score": 0.7, "confidence": 0.6},
+    }
+    assert mock_create.call_count == 3  # one combined call, two fallbacks
+
+
+def test_combined_results_are_cached_apart_from_per_signal_results(esp, mocker):
+    def create(messages, **kwargs):
+        if "SIGNAL: authenticity" in messages[0]["content"]:
+            return _completion(json.dumps({"authenticity": {"score": 0.4, "confidence": 0.9}}))
+        return _completion('{"score": 0.7, "confidence": 0.6}')
+
+    mock_create = mocker.patch.object(esp.get_client().chat.completions, "create", side_effect=create)
+    combined = {"body": json.dumps({"message_text": "hello", "mode": "combined", "signals": ["authenticity"]})}
+    single = {"body": json.dumps({"message_text": "hello", "signals": ["authenticity"]})}
+
+    assert json.loads(esp.lambda_handler(combined, None)["body"]) == {"authenticity.txt": {"score": 0.4, "confidence": 0.9}}
+    # the combined answer is not served for the signal's own prompt, and vice versa
+    assert json.loads(esp.lambda_handler(single, None)["body"]) == {"authenticity.txt": {"score": 0.7, "confidence": 0.6}}
+    assert mock_create.call_count == 2
+    assert json.loads(esp.lambda_handler(combined, None)["body"]) == {"authenticity.txt": {"score": 0.4, "confidence": 0.9}}
+    assert json.loads(esp.lambda_handler(single, None)["body"]) == {"authenticity.txt": {"score": 0.7, "confidence": 0.6}}
+    assert mock_create.call_count == 2
+
+
+def test_lambda_handler_rejects_unknown_signals(esp):
+    event = {"body": json.dumps({"message_text": "hello", "signals": ["nope"]})}
+    assert esp.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_lambda_handler_rejects_signals_that_are_not_a_list_of_names(esp):
+    for signals in (5, "authenticity", [1], {"authenticity": True}):
+        for body in ({"message_text": "hello", "signals": signals}, {"messages": ["hello"], "signals": signals}):
+            response = esp.lambda_handler({"body": json.dumps(body)}, None)
+            assert response["statusCode"] == 400
+            assert json.loads(response["body"])["message"] == "signals must be a list of prompt names"
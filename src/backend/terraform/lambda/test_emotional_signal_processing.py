@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from conftest import FakeAsyncCompletions, _completion, _fake_async_client
+
+
+def _prompts(n):
+    return [(f"p{i}.txt", "system", f"user {i}") for i in range(n)]
+
+
+def test_run_prompts_async_limits_concurrency(esp):
+    completions = FakeAsyncCompletions(delays={"user": 0.01})
+    results, unfinished = asyncio.run(
+        esp.run_prompts_async(_prompts(8), _fake_async_client(completions), concurrency=3)
+    )
+
+    assert unfinished == []
+    assert set(results) == {f"p{i}.txt" for i in range(8)}
+    assert results["p0.txt"] == {"score": 0.5, "confidence": 0.9}
+    assert completions.max_in_flight == 3
+
+
+def test_run_prompts_async_per_prompt_timeout(esp):
+    completions = FakeAsyncCompletions(delays={"user 1": 1})
+    results, unfinished = asyncio.run(
+        esp.run_prompts_async(_prompts(2), _fake_async_client(completions), timeout=0.05)
+    )
+
+    assert unfinished == []
+    assert results["p0.txt"]["score"] == 0.5
+    assert results["p1.txt"] == {"error": "Timed out after 0.05s"}
+
+
+def test_run_prompts_async_deadline_returns_partial_results(esp):
+    completions = FakeAsyncCompletions(delays={"user 2": 5})
+    results, unfinished = asyncio.run(
+        esp.run_prompts_async(_prompts(3), _fake_async_client(completions), timeout=10, deadline=0.1)
+    )
+
+    assert set(results) == {"p0.txt", "p1.txt"}
+    assert unfinished == ["p2.txt"]
+
+
+def test_run_prompts_async_invalid_json(esp):
+    completions = FakeAsyncCompletions(content="not json")
+    results, _ = asyncio.run(esp.run_prompts_async(_prompts(1), _fake_async_client(completions)))
+    assert results["p0.txt"]["error"] == "Invalid JSON response from OpenAI"
+
+
+def test_lambda_handler_async_mode_reuses_client_and_loop(esp, mocker):
+    completions = FakeAsyncCompletions()
+    mocker.patch.object(esp, "async_client", _fake_async_client(completions))
+    event = {"body": json.dumps({"message_text": "hello", "execution": "async"})}
+
+    first = esp.lambda_handler(event, None)
+    loop = esp.event_loop
+    second = esp.lambda_handler(event, None)
+
+    assert first["statusCode"] == second["statusCode"] == 200
+    assert esp.event_loop is loop
+    body = json.loads(first["body"])
+    assert "authenticity.txt" in body
+    assert body["authenticity.txt"] == {"score": 0.5, "confidence": 0.9}
+
+
+def test_lambda_handler_threaded_mode(esp, mocker):
+    create = mocker.patch.object(esp.get_client().chat.completions, "create", return_value=_completion('{"score": 1}'))
+    response = esp.lambda_handler({"body": json.dumps({"message_text": "hello"})}, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["shame_cues.txt"] == {"score": 1}
+    assert create.call_count == len(json.loads(response["body"]))
+
+
+def test_lambda_handler_missing_message_text(esp):
+    response = esp.lambda_handler({"body": "{}"}, None)
+    assert response["statusCode"] == 400
+
+
+def test_lambda_handler_retries_rate_limited_prompt(esp, mocker):
+    from test_call_policy import _rate_limit_error
+
+    responses = [_rate_limit_error("0.01"), _completion('{"score": 0.2, "confidence": 0.7}')]
+    mocker.patch.object(esp.get_client().chat.completions, "create", side_effect=responses)
+    event = {"body": json.dumps({"message_text": "hello", "signals": ["shame_cues"]})}
+    response = esp.lambda_handler(event, None)
+
+    assert json.loads(response["body"]) == {"shame_cues.txt": {"score": 0.2, "confidence": 0.7}}
@@ -0,0 +1,82 @@
+import os
+
+import prompt_registry
+
+PROMPT = """# --- SYSTEM MESSAGE ---
+Score the post.
+
+# --- USER MESSAGE ---
+Classify this post:
+
+$$USER_MESSAGE$$
+(end)
+"""
+
+
+def test_render_matches_extract_prompt_parts_for_every_prompt_file(mocker):
+    mocker.patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"})
+    import emotional_signal_processing as esp
+
+    message = "I cried in front of my boss today. $$USER_MESSAGE$$"
+    templates = esp.prompt_registry.templates()
+    assert len(templates) == 10
+    for template in templates:
+        with open(os.path.join(esp.PROMPTS_DIR, template.filename)) as f:
+            expected = esp.extract_prompt_parts(f.read(), message)
+        assert template.render(message) == expected
+
+
+def test_prompt_template_split(tmp_path):
+    (tmp_path / "a.txt").write_text(PROMPT)
+    template = prompt_registry.PromptRegistry(str(tmp_path)).get("a.txt")
+
+    assert template.system_prompt == "Score the post."
+    assert template.render("hi") == ("Score the post.", "Classify this post:\n\nhi\n(end)")
+
+
+def test_registry_ignores_file_changes_without_reload(tmp_path):
+    (tmp_path / "a.txt").write_text(PROMPT)
+    registry = prompt_registry.PromptRegistry(str(tmp_path))
+    (tmp_path / "b.txt").write_text(PROMPT)
+
+    assert [t.filename for t in registry.templates()] == ["a.txt"]
+
+
+def test_registry_reload_picks_up_changes_by_mtime(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text(PROMPT)
+    registry = prompt_registry.PromptRegistry(str(tmp_path), reload=True)
+    first = registry.get("a.txt")
+
+    assert registry.get("a.txt") is first  # unchanged file is not re-parsed
+
+    path.write_text(PROMPT.replace("Score the post.", "Score it."))
+    os.utime(path, (first.mtime + 10, first.mtime + 10))
+    (tmp_path / "b.txt").write_text(PROMPT)
+
+    assert registry.get("a.txt").system_prompt == "Score it."
+    assert [t.filename for t in registry.templates()] == ["a.txt", "b.txt"]
+
+    path.unlink()
+    assert [t.filename for t in registry.templates()] == ["b.txt"]
+
+
+def test_every_prompt_file_has_a_schema(mocker):
+    mocker.patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"})
+    import emotional_signal_processing as esp
+
+    for template in esp.prompt_registry.templates():
+        assert template.schema["required"] == ["score", "confidence"], template.filename
+
+
+def test_validate():
+    schema = {
+        "type": "object",
+        "properties": {"score": {"type": "number", "minimum": 0, "maximum": 1}},
+        "required": ["score"],
+    }
+    assert prompt_registry.validate({"score": 0.3}, schema) == []
+    assert prompt_registry.validate({"score": 1.5}, schema) == ["$.score: above maximum 1"]
+    assert prompt_registry.validate({"score": True}, schema) == ["$.score: expected number"]
+    assert prompt_registry.validate({}, schema) == ["$.score: required"]
+    assert prompt_registry.validate([0.3], schema) == ["$: expected object"]
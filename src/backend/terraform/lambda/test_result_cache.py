@@ -0,0 +1,86 @@
+import json
+
+from result_cache import DynamoDbBackend, LocalBackend, ResultCache, cache_key, metrics_record
+from conftest import _completion
+
+RESULT = {"score": 0.4, "confidence": 0.9}
+
+
+def test_cache_key_depends_on_prompt_model_and_message():
+    key = cache_key("abc", "gpt-4o-mini", "hello")
+    assert key == cache_key("abc", "gpt-4o-mini", "hello")
+    assert len({key, cache_key("abd", "gpt-4o-mini", "hello"),
+                cache_key("abc", "gpt-4o", "hello"), cache_key("abc", "gpt-4o-mini", "hello!")}) == 4
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.store({"a": 1, "b": 2})
+    cache.lookup(["a"])
+    cache.store({"c": 3})
+
+    found, counts = cache.lookup(["a", "b", "c"])
+    assert found == {"a": 1, "c": 3}
+    assert counts == {"memory_hits": 2, "shared_hits": 0, "misses": 1, "shared_errors": 0}
+
+
+def test_shared_layer_fills_memory_and_expires(mocker):
+    shared = LocalBackend()
+    ResultCache(shared=shared).store({"k": RESULT})
+
+    warm = ResultCache(shared=shared)  # another container
+    assert warm.lookup(["k"]) == ({"k": RESULT}, {"memory_hits": 0, "shared_hits": 1, "misses": 0, "shared_errors": 0})
+    assert warm.lookup(["k"])[1]["memory_hits"] == 1
+
+    mocker.patch("result_cache.time.time", return_value=shared.items["k"][0] + 1)
+    assert ResultCache(shared=shared).lookup(["k"])[0] == {}
+
+
+def test_shared_layer_failure_is_a_miss():
+    shared = LocalBackend()
+    shared.get_many = lambda keys: 1 / 0
+    found, counts = ResultCache(shared=shared).lookup(["k"])
+    assert found == {}
+    assert counts["misses"] == 1 and counts["shared_errors"] == 1
+
+
+def test_dynamodb_backend_batches_and_skips_expired(mocker):
+    client = mocker.Mock()
+    client.batch_get_item.return_value = {"Responses": {"cache": [
+        {"CacheKey": {"S": "fresh"}, "Result": {"S": json.dumps(RESULT)}, "ExpiresAt": {"N": "4102444800"}},
+        {"CacheKey": {"S": "stale"}, "Result": {"S": json.dumps(RESULT)}, "ExpiresAt": {"N": "1"}},
+    ]}}
+    client.batch_write_item.return_value = {}
+    backend = DynamoDbBackend("cache", client=client)
+
+    assert backend.get_many(["fresh", "stale"]) == {"fresh": RESULT}
+    backend.put_many({f"k{i}": RESULT for i in range(30)}, expires_at=100)
+    assert [len(c.kwargs["RequestItems"]["cache"]) for c in client.batch_write_item.call_args_list] == [25, 5]
+
+
+def test_metrics_record_is_embedded_metric_format():
+    record = json.loads(metrics_record({"memory_hits": 2, "misses": 1}))
+    assert record["ResultCache.memory_hits"] == 2
+    assert record["_aws"]["CloudWatchMetrics"][0]["Metrics"][1]["Name"] == "ResultCache.misses"
+
+
+def test_lambda_handler_serves_repeat_messages_from_cache(esp, mocker):
+    create = mocker.patch.object(esp.get_client().chat.completions, "create", return_value=_completion(json.dumps(RESULT)))
+    event = {"body": json.dumps({"message_text": "hello"})}
+
+    first = esp.lambda_handler(event, None)
+    calls = create.call_count
+    second = esp.lambda_handler(event, None)
+
+    assert calls == len(json.loads(first["body"]))
+    assert create.call_count == calls
+    assert json.loads(second["body"]) == json.loads(first["body"])
+
+
+def test_lambda_handler_does_not_cache_invalid_results(esp, mocker):
+    create = mocker.patch.object(esp.get_client().chat.completions, "create", return_value=_completion('{"score": 7}'))
+    event = {"body": json.dumps({"message_text": "hello", "signals": ["authenticity"]})}
+
+    esp.lambda_handler(event, None)
+    esp.lambda_handler(event, None)
+    assert create.call_count == 2
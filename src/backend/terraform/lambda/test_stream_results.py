@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from conftest import FakeAsyncCompletions, _completion, _fake_async_client
+
+
+def _slow_sync_create(slow_marker, delay):
+    def create(messages, **kwargs):
+        if slow_marker in messages[0]["content"]:
+            time.sleep(delay)
+        return _completion('{"score": 0.5, "confidence": 0.9}')
+    return create
+
+
+def _templates(esp, *signals):
+    return esp.select_templates(list(signals))[0]
+
+
+@pytest.mark.parametrize("execution", ["threads", "async"])
+def test_stream_results_yields_fast_signals_before_slow_ones(esp, mocker, execution):
+    mocker.patch.object(esp.get_client().chat.completions, "create", side_effect=_slow_sync_create("AUTHENTICITY", 0.3))
+    mocker.patch.object(esp, "async_client", _fake_async_client(FakeAsyncCompletions(delays={"AUTHENTICITY": 0.3})))
+    mocker.patch.object(esp.prompt_registry, "errors", {})
+    templates = _templates(esp, "authenticity", "shame_cues", "meaning_making")
+
+    started = time.monotonic()
+    arrivals = []
+    for line in esp.stream_results(templates, "hello", execution):
+        arrivals.append((time.monotonic() - started, json.loads(line)))
+
+    first_elapsed, first = arrivals[0]
+    assert "authenticity.txt" not in first and first_elapsed < 0.2
+    assert "authenticity.txt" in arrivals[-2][1]
+    assert arrivals[-1][1]["done"] is True and arrivals[-1][1]["unfinished"] == []
+
+
+def test_iter_prompts_async_yields_unfinished_prompts_last(esp):
+    client = _fake_async_client(FakeAsyncCompletions(delays={"AUTHENTICITY": 5}))
+    prepared = [(t.filename, *t.render("hello")) for t in _templates(esp, "authenticity", "shame_cues")]
+
+    async def collect():
+        return [item async for item in esp.iter_prompts_async(prepared, client, deadline=0.1)]
+
+    started = time.monotonic()
+    lines = asyncio.run(collect())
+    assert time.monotonic() - started < 1
+    assert lines[0][0] == "shame_cues.txt"
+    assert lines[-1] == ("authenticity.txt", None)
+
+
+def test_stream_server_sends_each_signal_as_a_chunk(esp, mocker):
+    import stream_server
+
+    mocker.patch.object(esp.get_client().chat.completions, "create", side_effect=_slow_sync_create("AUTHENTICITY", 0.3))
+    mocker.patch.object(esp.prompt_registry, "errors", {})
+    server = stream_server.make_server("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        conn.request("POST", "/", body=json.dumps({
+            "message_text": "hello", "execution": "threads", "signals": ["authenticity", "shame_cues"],
+        }))
+        started = time.monotonic()
+        response = conn.getresponse()
+        lines = []
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            lines.append((time.monotonic() - started, json.loads(line)))
+
+        assert response.status == 200
+        assert "shame_cues.txt" in lines[0][1] and lines[0][0] < 0.2
+        assert "authenticity.txt" in lines[1][1]
+        assert lines[-1][1]["done"] is True
+
+        conn = HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        conn.request("POST", "/", body=json.dumps({"message_text": "hi", "signals": ["nope"]}))
+        assert conn.getresponse().status == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,3 +1,17 @@
+# Submissions that keep failing (bitcoind unreachable, a status write that never
+# succeeds) end up here after maxReceiveCount deliveries instead of cycling forever.
+resource "aws_sqs_queue" "submission_dlq" {
+  for_each = toset(var.networks)
+  name     = "${var.environment}-${var.submission_queue_name}-${each.value}-dlq"
+  message_retention_seconds = 345600 # 4 days
+
+  tags = {
+    Environment = var.environment
+    Network     = each.value
+    Project     = "BitcoinBrowserMiner"
+  }
+}
+
 resource "aws_sqs_queue" "submission_queue" {
   for_each = toset(var.networks)
   name     = "${var.environment}-${var.submission_queue_name}-${each.value}"
@@ -7,9 +21,14 @@ resource "aws_sqs_queue" "submission_queue" {
   receive_wait_time_seconds = 10 # Enable long polling
   visibility_timeout_seconds = 300 # 5 minutes
 
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.submission_dlq[each.value].arn
+    maxReceiveCount     = 5 # 25 minutes of retries; the block is stale long before that
+  })
+
   tags = {
     Environment = var.environment
     Network     = each.value
     Project     = "BitcoinBrowserMiner"
   }
-}
\ No newline at end of file
+}
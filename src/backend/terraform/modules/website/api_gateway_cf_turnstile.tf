@@ -30,6 +30,15 @@ resource "aws_apigatewayv2_route" "cf_turnstile_verify_route" {
   target    = "integrations/${aws_apigatewayv2_integration.cf_turnstile_lambda_integration.id}"
 }
 
+# Bulk verification for our backend services; callers sign requests with SigV4
+# and need execute-api:Invoke on this route.
+resource "aws_apigatewayv2_route" "cf_turnstile_verify_batch_route" {
+  api_id             = aws_apigatewayv2_api.cf_turnstile_api.id
+  route_key          = "POST /verify/batch"
+  authorization_type = "AWS_IAM"
+  target             = "integrations/${aws_apigatewayv2_integration.cf_turnstile_lambda_integration.id}"
+}
+
 resource "aws_apigatewayv2_route" "cf_turnstile_root_route" {
   api_id    = aws_apigatewayv2_api.cf_turnstile_api.id
   route_key = "POST /{proxy+}"  # greedy... catch everything
@@ -0,0 +1,43 @@
+resource "aws_dynamodb_table" "otp_rate_limit" {
+  name         = "${var.environment}-mine-bitcoin-online-otp-rate-limit"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "BucketKey" # "email:<address>" or "ip:<address>"
+
+  attribute {
+    name = "BucketKey"
+    type = "S"
+  }
+
+  # Set to when the bucket is full again, so idle buckets are cleaned up
+  ttl {
+    attribute_name = "ExpiresAt"
+    enabled        = true
+  }
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_dynamodb_table" "turnstile_verdicts" {
+  name         = "${var.environment}-mine-bitcoin-online-turnstile-verdicts"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "TokenHash" # SHA-256 of the token; tokens are never stored
+
+  attribute {
+    name = "TokenHash"
+    type = "S"
+  }
+
+  # Tokens are only valid for five minutes, and so are their verdicts
+  ttl {
+    attribute_name = "ExpiresAt"
+    enabled        = true
+  }
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import functools
 import json
 import logging
 import os
-import urllib.error
-import urllib.parse
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Any, Optional
 
+import structured_logging
+import turnstile_client
+import turnstile_verdicts
+from structured_logging import fields
+
 
 # ────────────────────────────  Configuration  ─────────────────────────────── #
 
@@ -16,9 +20,37 @@ LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
 TURNSTILE_SECRET_KEY: Optional[str] = os.getenv("TURNSTILE_SECRET_KEY")
 TURNSTILE_VERIFY_URL = "https://challenges.cloudflare.com/turnstile/v0/siteverify"
 
-logging.basicConfig(level=LOG_LEVEL, force=True)
+structured_logging.configure("cf-turnstile", LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+# POST /verify/batch (IAM-authorized, for backend services) verifies a list of
+# tokens in one invocation, at most BATCH_CONCURRENCY at a time. Tokens still
+# unverified after BATCH_DEADLINE_SECONDS (kept below the Lambda timeout) are
+# answered as verification-unavailable.
+BATCH_ROUTE = "POST /verify/batch"
+BATCH_CONCURRENCY = int(os.getenv("TURNSTILE_BATCH_CONCURRENCY", "8"))
+MAX_BATCH_TOKENS = int(os.getenv("TURNSTILE_MAX_BATCH_TOKENS", "16"))
+BATCH_DEADLINE_SECONDS = float(os.getenv("TURNSTILE_BATCH_DEADLINE", "20"))
+UNAVAILABLE: dict[str, Any] = {"success": False, "error_codes": ["verification-unavailable"]}
+
+# One keep-alive client per container; TURNSTILE_PREWARM=1 opens its first
+# connection during init so the first request skips the TLS handshake.
+TURNSTILE_CLIENT = turnstile_client.KeepAliveClient(
+    os.getenv("TURNSTILE_VERIFY_URL", TURNSTILE_VERIFY_URL),
+    pool_size=BATCH_CONCURRENCY,
+    connect_timeout=float(os.getenv("TURNSTILE_CONNECT_TIMEOUT", "2")),
+    read_timeout=float(os.getenv("TURNSTILE_READ_TIMEOUT", "4")),
+    max_retries=int(os.getenv("TURNSTILE_MAX_RETRIES", "2")),
+)
+if os.getenv("TURNSTILE_PREWARM") == "1":
+    TURNSTILE_CLIENT.prewarm()
+
+# Replayed tokens (client retries, double submits) are answered from here.
+VERDICT_TABLE = os.getenv("TURNSTILE_VERDICT_TABLE", "")
+VERDICT_CACHE = turnstile_verdicts.VerdictCache(
+    shared=turnstile_verdicts.DynamoDbVerdictBackend(VERDICT_TABLE) if VERDICT_TABLE else None
+)
+
 COMMON_HEADERS: dict[str, str] = {
     "Content-Type": "application/json",
     "Access-Control-Allow-Headers": "Content-Type",
@@ -47,16 +79,95 @@ def _verify_with_turnstile(token: str, remote_ip: Optional[str]) -> dict[str, An
     if remote_ip:
         payload["remoteip"] = remote_ip
 
-    encoded = urllib.parse.urlencode(payload).encode()
-    req = urllib.request.Request(
-        TURNSTILE_VERIFY_URL,
-        data=encoded,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        method="POST",
-    )
+    return TURNSTILE_CLIENT.post_form(payload)
+
+
+def _verify_token(token: str, remote_ip: Optional[str]) -> dict[str, Any]:
+    """Answer replays from the verdict cache; ask Cloudflare only for new tokens."""
+    replayed = VERDICT_CACHE.replay(token)
+    if replayed is not None:
+        logger.info("Answered replayed token locally", extra=fields(ip=remote_ip, error_codes=replayed["error-codes"]))
+        return replayed
+
+    result = _verify_with_turnstile(token, remote_ip)
+    VERDICT_CACHE.record(token, result)
+    return result
 
-    with urllib.request.urlopen(req) as resp:  # nosec B310 (urllib ok in Lambda)
-        return json.loads(resp.read().decode())
+
+# ────────────────────────────  Batch verification  ────────────────────────── #
+
+
+@functools.cache
+def get_batch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+
+def _batch_result(token: str, remote_ip: Optional[str]) -> dict[str, Any]:
+    try:
+        result = _verify_token(token, remote_ip)
+    except turnstile_client.TurnstileUnavailable as err:
+        logger.error("Turnstile verification call failed", extra=fields(error=str(err)))
+        return dict(UNAVAILABLE)
+    except Exception:
+        # One bad token (unexpected response, verdict cache error) must not fail the whole batch
+        logger.exception("Unexpected error verifying a batch token")
+        return dict(UNAVAILABLE)
+    return {"success": bool(result.get("success")), "error_codes": result.get("error-codes", [])}
+
+
+def verify_batch(items: list[Any]) -> list[dict[str, Any]]:
+    """
+    Verify [{"token": ..., "remote_ip": ...}, ...] concurrently; returns one
+    result per item, in order. A token repeated within the batch is verified
+    once and its repeats are answered like any other replay. Tokens not
+    verified within BATCH_DEADLINE_SECONDS are reported as unavailable.
+    """
+    results: list[Optional[dict[str, Any]]] = [None] * len(items)
+    first_seen: dict[str, int] = {}
+    repeats: list[tuple[int, str]] = []
+    for i, item in enumerate(items):
+        token = item.get("token") if isinstance(item, dict) else None
+        if not token or not isinstance(token, str):
+            results[i] = {"success": False, "error_codes": ["missing-input-response"]}
+        elif token in first_seen:
+            repeats.append((i, token))
+        else:
+            first_seen[token] = i
+
+    futures = {
+        i: get_batch_executor().submit(_batch_result, token, items[i].get("remote_ip"))
+        for token, i in first_seen.items()
+    }
+    done, not_done = wait(futures.values(), timeout=BATCH_DEADLINE_SECONDS)
+    if not_done:
+        logger.error("Token batch deadline reached", extra=fields(unverified=len(not_done)))
+    for i, future in futures.items():
+        if future in done:
+            results[i] = future.result()
+        else:
+            future.cancel()  # queued ones never start; running ones finish in the background
+            results[i] = dict(UNAVAILABLE)
+    for i, token in repeats:
+        replayed = VERDICT_CACHE.replay(token)
+        results[i] = (
+            {"success": False, "error_codes": replayed["error-codes"]} if replayed else results[first_seen[token]]
+        )
+    return results  # type: ignore[return-value]
+
+
+def _handle_batch(event: dict[str, Any]) -> dict[str, Any]:
+    items = _decode_body(event).get("tokens")
+    if not isinstance(items, list) or not items:
+        return _response(400, {"message": "tokens must be a non-empty list"})
+    if len(items) > MAX_BATCH_TOKENS:
+        return _response(400, {"message": f"At most {MAX_BATCH_TOKENS} tokens per batch"})
+
+    results = verify_batch(items)
+    logger.info(
+        "Verified token batch",
+        extra=fields(tokens=len(items), verified=sum(1 for r in results if r["success"])),
+    )
+    return _response(200, {"results": results})
 
 
 # ────────────────────────────  Lambda entry‑point  ────────────────────────── #
@@ -66,15 +177,20 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     Verify a Cloudflare Turnstile token.
 
-    Body must be JSON containing {"token": "<turnstile-response>"}.
+    Body must be JSON containing {"token": "<turnstile-response>"}. On the
+    batch route it is {"tokens": [{"token": ..., "remote_ip": ...}, ...]} and
+    the answer is {"results": [{"success": ..., "error_codes": [...]}, ...]}.
     """
-    logger.debug("Incoming event: %s", json.dumps(event))
+    logger.debug("Incoming event", extra=fields(event=event))
 
     if not TURNSTILE_SECRET_KEY:
         logger.error("TURNSTILE_SECRET_KEY is not set")
         return _response(500, {"message": "Internal server error"})
 
     try:
+        if event.get("routeKey") == BATCH_ROUTE:
+            return _handle_batch(event)
+
         body = _decode_body(event)
         token: str | None = body.get("token")
         if not token:
@@ -85,8 +201,8 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             event.get("requestContext", {}).get("http", {}).get("sourceIp")
         )
 
-        logger.info("Verifying token %s... ip=%s", token[:5], remote_ip)
-        result = _verify_with_turnstile(token, remote_ip)
+        logger.info("Verifying token", extra=fields(ip=remote_ip, token_length=len(token)))
+        result = _verify_token(token, remote_ip)
 
         if result.get("success"):
             return _response(200, {"success": True, "message": "Token verified"})
@@ -104,8 +220,8 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         logger.warning("Malformed JSON body")
         return _response(400, {"message": "Invalid JSON body"})
 
-    except urllib.error.URLError as err:
-        logger.error("Turnstile verification call failed: %s", err)
+    except turnstile_client.TurnstileUnavailable as err:
+        logger.error("Turnstile verification call failed", extra=fields(error=str(err)))
         return _response(502, {"message": "Verification service unreachable"})
 
     except Exception:
@@ -1,21 +1,25 @@
 from __future__ import annotations
 
+import cold_start  # first, so COLD_START_PROFILE=1 can time every import below
+import functools
+import json
 import logging
 import os
 import secrets
-from typing import Any
+from typing import Any, Optional
 
-import boto3
-from botocore.exceptions import ClientError
+import otp_email_queue
+import otp_email_templates
+import otp_rate_limiter
+import structured_logging
+from structured_logging import fields
 
 # ────────────────────────────  Configuration  ─────────────────────────────── #
 
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
-logging.basicConfig(level=LOG_LEVEL, force=True)
+structured_logging.configure("cognito-custom-auth")
 logger = logging.getLogger(__name__)
 
 REGION = os.getenv("AWS_REGION", "us-west-2")
-ses = boto3.client("ses", region_name=REGION)
 
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@bitcoinbrowserminer.com")
 # TODO make a static assests location
@@ -25,15 +29,78 @@ IMG_LINK = os.getenv("IMG_LINK", f"https://dev-env.bitcoinbrowserminer.com/image
 
 OTP_LENGTH = 6
 OTP_TTL_MIN = int(os.getenv("OTP_TTL_MIN", "3"))
+# "sync" sends the OTP email from CreateAuthChallenge; "queue" hands it to
+# otp_email_queue so the challenge returns without waiting on SES.
+OTP_DISPATCH = os.getenv("OTP_DISPATCH", "sync")
+
+# Name of the SES stored template built from templates/otp_email*; when unset
+# the email is rendered locally and sent with send_email.
+OTP_SES_TEMPLATE = os.getenv("OTP_SES_TEMPLATE", "")
+SES_BULK_LIMIT = 50  # destinations per send_bulk_templated_email call
+
+# Compiled once per container, with everything but the code filled in.
+with cold_start.phase("compile email templates"):
+    OTP_EMAIL = otp_email_templates.load("otp_email").bind(ttl_minutes=OTP_TTL_MIN, img_link=IMG_LINK)
+
+# Every CUSTOM_CHALLENGE DefineAuthChallenge issues means a new OTP email, so
+# it takes a token from the user's email and source IP buckets (shared across
+# containers via OTP_RATE_LIMIT_TABLE when set) and fails authentication when
+# either is empty, or once a session has used MAX_CHALLENGE_ATTEMPTS.
+MAX_CHALLENGE_ATTEMPTS = int(os.getenv("MAX_CHALLENGE_ATTEMPTS", "3"))
+OTP_RATE_LIMIT_TABLE = os.getenv("OTP_RATE_LIMIT_TABLE", "")
+OTP_RATE_LIMITER = otp_rate_limiter.RateLimiter(
+    {
+        "email": otp_rate_limiter.BucketPolicy(
+            capacity=int(os.getenv("OTP_EMAIL_BURST", "5")),
+            refill_per_second=1 / int(os.getenv("OTP_EMAIL_REFILL_SECONDS", "180")),
+        ),
+        "ip": otp_rate_limiter.BucketPolicy(
+            capacity=int(os.getenv("OTP_IP_BURST", "20")),
+            refill_per_second=1 / int(os.getenv("OTP_IP_REFILL_SECONDS", "30")),
+        ),
+    },
+    store=otp_rate_limiter.DynamoDbBucketStore(OTP_RATE_LIMIT_TABLE) if OTP_RATE_LIMIT_TABLE else None,
+)
+
+# ────────────────────────────  Clients  ───────────────────────────────────── #
+
+
+@functools.cache
+def get_ses_client() -> Any:
+    """
+    SES client, built on first use and reused by warm invocations. Only
+    CreateAuthChallenge sends email, so other triggers never pay for boto3.
+    """
+    with cold_start.phase("import boto3"):
+        import boto3
+    with cold_start.phase("client ses"):
+        return boto3.client("ses", region_name=REGION)
+
+
+def _aws_error(exc: Exception) -> Optional[dict[str, Any]]:
+    """The "Error" part of a botocore ClientError, matched without importing botocore."""
+    response = getattr(exc, "response", None)
+    return response.get("Error") if isinstance(response, dict) else None
+
+
+def _log_cold_start(timings: dict[str, float]) -> None:
+    logger.info("Cold start timings", extra=fields(cold_start_ms=timings))
+
 
 # ────────────────────────────  Lambda entry‑point  ────────────────────────── #
 
 
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
-    logger.info("Lambda triggered. Event: %s", event)
+    try:
+        return _dispatch(event, context)
+    finally:
+        cold_start.report(_log_cold_start)  # no-op unless COLD_START_PROFILE=1
+
 
+def _dispatch(event: dict[str, Any], context: Any) -> dict[str, Any]:
     trigger_source = event.get("triggerSource")
-    logger.info("Trigger source: %s", trigger_source)
+    logger.info("Lambda triggered", extra=fields(trigger=trigger_source))
+    logger.debug("Incoming event", extra=fields(event=event))
 
     trigger_handlers: dict[str, callable[[dict[str, Any], Any], dict[str, Any]]] = {
         "PreSignUp_SignUp": handle_pre_sign_up,
@@ -69,22 +136,38 @@ def handle_pre_sign_up(event: dict[str, Any], context: Any) -> dict[str, Any]:
 # ────────────────────────────  Define Auth Challenge  ──────────────────────── #
 
 
+def _source_ip(event: dict[str, Any]) -> str | None:
+    context_data = event.get("request", {}).get("userContextData") or {}
+    ip = context_data.get("sourceIp") or context_data.get("ipAddress")
+    return ip[0] if isinstance(ip, list) and ip else ip or None
+
+
+def _issue_challenge(event: dict[str, Any]) -> dict[str, Any]:
+    email = event.get("request", {}).get("userAttributes", {}).get("email")
+    if not OTP_RATE_LIMITER.allow(email=email, ip=_source_ip(event)):
+        logger.warning("OTP rate limit reached, failing authentication.")
+        event["response"].update({"issueTokens": False, "failAuthentication": True})
+        return event
+
+    event["response"].update(
+        {
+            "challengeName": "CUSTOM_CHALLENGE",
+            "issueTokens": False,
+            "failAuthentication": False,
+        }
+    )
+    return event
+
+
 def handle_define_auth_challenge(
     event: dict[str, Any], context: Any
 ) -> dict[str, Any]:
     session = event.get("request", {}).get("session", [])
-    logger.info("DefineAuthChallenge: session %s", session)
+    logger.info("DefineAuthChallenge", extra=fields(attempts=len(session)))
 
     if not session:
         logger.info("No session, issuing CUSTOM_CHALLENGE.")
-        event["response"].update(
-            {
-                "challengeName": "CUSTOM_CHALLENGE",
-                "issueTokens": False,
-                "failAuthentication": False,
-            }
-        )
-        return event
+        return _issue_challenge(event)
 
     last = session[-1]
     if (
@@ -93,15 +176,12 @@ def handle_define_auth_challenge(
     ):
         logger.info("Previous challenge succeeded, issuing tokens.")
         event["response"].update({"issueTokens": True, "failAuthentication": False})
+    elif len(session) >= MAX_CHALLENGE_ATTEMPTS:
+        logger.info("Previous challenge failed and no attempts left, failing authentication.")
+        event["response"].update({"issueTokens": False, "failAuthentication": True})
     else:
         logger.info("Previous challenge failed, issuing another CUSTOM_CHALLENGE.")
-        event["response"].update(
-            {
-                "challengeName": "CUSTOM_CHALLENGE",
-                "issueTokens": False,
-                "failAuthentication": False,
-            }
-        )
+        _issue_challenge(event)
     return event
 
 
@@ -131,19 +211,19 @@ def handle_create_auth_challenge(
         return event
 
     code = _one_time_code()
-    logger.info("Generated OTP %s-**** for %s", code[:2], email)
+    logger.info("Generated OTP", extra=fields(email=email))
 
     event["response"]["publicChallengeParameters"] = {"email": email}
     event["response"]["privateChallengeParameters"] = {"answer": code}
 
     try:
-        logger.info("Sending OTP code to %s", email)
-        send_otp_email(code, email)
-        logger.info("Email sent successfully.")
-    except ClientError as exc:
-        logger.error("SES error: %s", exc.response["Error"]["Message"])
+        dispatch_otp_email(code, email)
     except Exception as exc:
-        logger.exception("Unexpected error sending OTP: %s", exc)
+        error = _aws_error(exc)
+        if error is not None:
+            logger.error("SES error: %s", error.get("Message"))
+        else:
+            logger.exception("Unexpected error sending OTP: %s", exc)
 
     return event
 
@@ -151,35 +231,37 @@ def handle_create_auth_challenge(
 # ────────────────────────────  SES Email Sender  ──────────────────────────── #
 
 
-def send_otp_email(code: str, to_email: str) -> None:
-    subject = "Your Bitcoin Browser Miner Login Code"
-    ios_otp_line = f"{code} is your Bitcoin Browser Miner code."
+def dispatch_otp_email(code: str, to_email: str) -> None:
+    """Queue the OTP email in queue mode, falling back to sending it directly."""
+    if OTP_DISPATCH == "queue":
+        try:
+            otp_email_queue.enqueue_otp_email(code, to_email, OTP_TTL_MIN * 60)
+            logger.info("OTP email queued", extra=fields(email=to_email))
+            return
+        except Exception as exc:
+            logger.warning("Could not queue OTP email, sending directly: %s", exc)
 
-    body_text = (
-        f"{ios_otp_line}\n\n"
-        f"Use this code to log in. It is valid for {OTP_TTL_MIN} minutes.\n"
-        "If you did not request this code, please ignore this email."
-    )
+    send_otp_email(code, to_email)
+    logger.info("OTP email sent", extra=fields(email=to_email))
+
+
+def _template_data(code: str) -> dict[str, Any]:
+    return {"code": code, "ttl_minutes": OTP_TTL_MIN, "img_link": IMG_LINK}
+
+
+def send_otp_email(code: str, to_email: str) -> None:
+    if OTP_SES_TEMPLATE:
+        response = get_ses_client().send_templated_email(
+            Source=FROM_EMAIL,
+            Destination={"ToAddresses": [to_email]},
+            Template=OTP_SES_TEMPLATE,
+            TemplateData=json.dumps(_template_data(code)),
+        )
+        logger.debug("SES send_templated_email response", extra=fields(response=response))
+        return
 
-    body_html = f"""<html>
-  <head></head>
-  <body style="font-family: sans-serif; line-height: 1.6; color: #1a1a1a;">
-    <div style="text-align: center;">
-      <img src="{IMG_LINK}" alt="Bitcoin Browser Miner Logo" width="64"
-           style="margin-bottom: 16px;" />
-      <h2>Your Bitcoin Browser Miner Login Code</h2>
-    </div>
-    <p>
-      <code style="font-size: 1.5em; background: #f2f2f2; padding: 4px 8px;
-                   border-radius: 4px;">{code}</code>
-      <strong> is your verification code.</strong>
-    </p>
-    <p>Use this code to log in. It is valid for {OTP_TTL_MIN} minutes.</p>
-    <p style="color: gray;">If you did not request this code, you can safely
-       ignore this email.</p>
-  </body></html>"""
-
-    response = ses.send_email(
+    subject, body_text, body_html = OTP_EMAIL.render(code=code)
+    response = get_ses_client().send_email(
         Source=FROM_EMAIL,
         Destination={"ToAddresses": [to_email]},
         Message={
@@ -187,7 +269,43 @@ def send_otp_email(code: str, to_email: str) -> None:
             "Body": {"Text": {"Data": body_text}, "Html": {"Data": body_html}},
         },
     )
-    logger.debug("SES send_email response: %s", response)
+    logger.debug("SES send_email response", extra=fields(response=response))
+
+
+def send_otp_emails(messages: list[tuple[str, str]]) -> list[Optional[str]]:
+    """
+    Send (code, email) pairs; returns None per delivered email, else an SES
+    error code. With a stored template this is one send_bulk_templated_email
+    call per SES_BULK_LIMIT recipients.
+    """
+    if not OTP_SES_TEMPLATE:
+        return otp_email_queue.send_each(send_otp_email, messages)
+
+    statuses: list[Optional[str]] = []
+    for start in range(0, len(messages), SES_BULK_LIMIT):
+        chunk = messages[start:start + SES_BULK_LIMIT]
+        try:
+            response = get_ses_client().send_bulk_templated_email(
+                Source=FROM_EMAIL,
+                Template=OTP_SES_TEMPLATE,
+                DefaultTemplateData=json.dumps(_template_data("")),
+                Destinations=[
+                    {
+                        "Destination": {"ToAddresses": [email]},
+                        "ReplacementTemplateData": json.dumps({"code": code}),
+                    }
+                    for code, email in chunk
+                ],
+            )
+        except Exception as exc:
+            error = _aws_error(exc)
+            if error is None:
+                raise
+            statuses += [error.get("Code")] * len(chunk)
+            continue
+        for status in response["Status"]:
+            statuses.append(None if status["Status"] == "Success" else status["Status"])
+    return statuses
 
 
 # ────────────────────────────  Verify Auth Challenge  ─────────────────────── #
@@ -199,6 +317,6 @@ def handle_verify_auth_challenge(
     expected = event["request"]["privateChallengeParameters"].get("answer")
     supplied = event["request"].get("challengeAnswer")
 
-    logger.info("Verifying challenge: expected %s, got %s", expected, supplied)
-    event["response"]["answerCorrect"] = supplied == expected
+    event["response"]["answerCorrect"] = expected is not None and supplied == expected
+    logger.info("Verified challenge", extra=fields(correct=event["response"]["answerCorrect"]))
     return event
@@ -0,0 +1 @@
+../../../lambda/cold_start.py
\ No newline at end of file
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import structured_logging
+from structured_logging import fields
+
+# ────────────────────────────  Configuration  ─────────────────────────────── #
+# With OTP_DISPATCH=queue, CreateAuthChallenge enqueues the OTP email here
+# instead of calling SES itself. lambda_handler is the SQS consumer: it sends
+# each batch (one SES bulk call when a stored template is configured) with
+# retries, reports failed messages back to SQS (after maxReceiveCount they
+# land in the dead-letter queue) and logs enqueue-to-delivery latency as
+# CloudWatch embedded metrics.
+
+structured_logging.configure("otp-email-consumer")
+logger = logging.getLogger(__name__)
+
+REGION = os.getenv("AWS_REGION", "us-west-2")
+OTP_QUEUE_URL = os.getenv("OTP_QUEUE_URL", "")
+SEND_ATTEMPTS = int(os.getenv("OTP_SEND_ATTEMPTS", "3"))
+SEND_CONCURRENCY = int(os.getenv("OTP_SEND_CONCURRENCY", "5"))
+METRICS_NAMESPACE = "MineBitcoinOnline/OtpEmail"
+
+# SES answers "Throttling" when the account sending rate is exceeded; bulk sends
+# report throttling and transient errors per destination.
+RETRYABLE_CODES = {
+    "Throttling", "ThrottlingException", "TooManyRequestsException", "ServiceUnavailable",
+    "AccountThrottled", "TransientFailure",
+}
+
+# ────────────────────────────  Clients  ───────────────────────────────────── #
+
+
+@functools.cache
+def get_sqs_client() -> Any:
+    """SQS client, built on first use and reused by warm invocations."""
+    import boto3
+
+    return boto3.client("sqs", region_name=REGION)
+
+
+class LocalQueue:
+    """
+    In-process stand-in for SQS, for tests and offline runs. send_message()
+    matches the SQS client call; drain() feeds the consumer SQS-shaped batches
+    and redrives failed messages until max_receives, then dead-letters them.
+    """
+
+    def __init__(self, max_receives: int = 5, clock: Callable[[], float] = time.time) -> None:
+        self.max_receives = max_receives
+        self.clock = clock
+        self.messages: list[dict[str, Any]] = []
+        self.dead_letters: list[dict[str, Any]] = []
+        self._next_id = 0
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs: Any) -> dict[str, Any]:
+        self._next_id += 1
+        message_id = f"local-{self._next_id}"
+        self.messages.append(
+            {
+                "messageId": message_id,
+                "body": MessageBody,
+                "attributes": {
+                    "ApproximateReceiveCount": "0",
+                    "SentTimestamp": str(int(self.clock() * 1000)),
+                },
+            }
+        )
+        return {"MessageId": message_id}
+
+    def drain(self, handler: Callable[[dict[str, Any], Any], dict[str, Any]], batch_size: int = 10) -> None:
+        while self.messages:
+            batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+            for record in batch:
+                count = int(record["attributes"]["ApproximateReceiveCount"]) + 1
+                record["attributes"]["ApproximateReceiveCount"] = str(count)
+            response = handler({"Records": batch}, None)
+            failed = {item["itemIdentifier"] for item in response.get("batchItemFailures", [])}
+            for record in batch:
+                if record["messageId"] not in failed:
+                    continue
+                if int(record["attributes"]["ApproximateReceiveCount"]) >= self.max_receives:
+                    self.dead_letters.append(record)
+                else:
+                    self.messages.append(record)
+
+
+# ────────────────────────────  Producer  ──────────────────────────────────── #
+
+
+def enqueue_otp_email(code: str, to_email: str, ttl_seconds: float, queue: Any = None) -> None:
+    """Queue one OTP email; the consumer drops it once the code has expired."""
+    now = time.time()
+    body = {"email": to_email, "code": code, "enqueued_at": now, "expires_at": now + ttl_seconds}
+    (queue or get_sqs_client()).send_message(QueueUrl=OTP_QUEUE_URL, MessageBody=json.dumps(body))
+
+
+# ────────────────────────────  Consumer  ──────────────────────────────────── #
+
+
+def _error_code(exc: Exception) -> str:
+    return getattr(exc, "response", {}).get("Error", {}).get("Code") or type(exc).__name__
+
+
+def send_each(send: Callable[[str, str], None], messages: list[tuple[str, str]]) -> list[Optional[str]]:
+    """Send (code, email) pairs one call each, SEND_CONCURRENCY at a time; None per sent email, else an error code."""
+
+    def attempt(message: tuple[str, str]) -> Optional[str]:
+        try:
+            send(*message)
+            return None
+        except Exception as exc:
+            logger.warning("OTP email failed", extra=fields(email=message[1], error=str(exc)))
+            return _error_code(exc)
+
+    if not messages:
+        return []
+    with ThreadPoolExecutor(max_workers=min(SEND_CONCURRENCY, len(messages))) as pool:
+        return list(pool.map(attempt, messages))
+
+
+def _send_with_retries(
+    send_batch: Callable[[list[tuple[str, str]]], list[Optional[str]]], messages: list[tuple[str, str]]
+) -> list[Optional[str]]:
+    """Resend throttled messages with jittered backoff; returns the final status per message."""
+    statuses = send_batch(messages)
+    for attempt in range(1, SEND_ATTEMPTS):
+        retry = [i for i, status in enumerate(statuses) if status in RETRYABLE_CODES]
+        if not retry:
+            break
+        time.sleep(random.uniform(0, 0.1 * 2**attempt))
+        for i, status in zip(retry, send_batch([messages[i] for i in retry])):
+            statuses[i] = status
+    return statuses
+
+
+def _metrics_record(counts: dict[str, int], latencies_ms: list[float]) -> str:
+    """Counts and latencies as one CloudWatch Embedded Metric Format line."""
+    metrics = [{"Name": name, "Unit": "Count"} for name in counts]
+    values: dict[str, Any] = dict(counts)
+    if latencies_ms:
+        metrics.append({"Name": "EnqueueToDeliveryMs", "Unit": "Milliseconds"})
+        values["EnqueueToDeliveryMs"] = latencies_ms
+    return json.dumps(
+        {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {"Namespace": METRICS_NAMESPACE, "Dimensions": [[]], "Metrics": metrics}
+                ],
+            },
+            **values,
+        }
+    )
+
+
+def _decode_message(body: str) -> dict[str, Any]:
+    """Parse a queued OTP message; raises ValueError when it can never be sent."""
+    message = json.loads(body)
+    if not isinstance(message, dict):
+        raise ValueError("message is not a JSON object")
+    for key in ("code", "email"):
+        if not isinstance(message.get(key), str) or not message[key]:
+            raise ValueError(f"{key} is required")
+    for key in ("expires_at", "enqueued_at"):
+        value = message.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"{key} must be a timestamp")
+    return message
+
+
+def process_records(
+    records: list[dict[str, Any]], send_batch: Callable[[list[tuple[str, str]]], list[Optional[str]]]
+) -> tuple[list[str], dict[str, int], list[float]]:
+    """Send every record's email; returns (failed message ids, counts, latencies in ms)."""
+    counts = {"Sent": 0, "Failed": 0, "Expired": 0}
+    latencies_ms: list[float] = []
+    failed: list[str] = []
+    pending: list[tuple[dict[str, Any], dict[str, Any]]] = []
+
+    now = time.time()
+    for record in records:
+        try:
+            message = _decode_message(record["body"])
+        except ValueError as err:  # json.JSONDecodeError is a ValueError too
+            logger.error("Dropping malformed OTP message", extra=fields(message_id=record["messageId"], error=str(err)))
+            counts["Failed"] += 1
+            continue
+        if message.get("expires_at", now + 1) <= now:
+            counts["Expired"] += 1  # the code can no longer be used; do not email it
+            continue
+        pending.append((record, message))
+
+    statuses = _send_with_retries(send_batch, [(m["code"], m["email"]) for _, m in pending]) if pending else []
+    delivered_at = time.time()
+    for (record, message), status in zip(pending, statuses):
+        if status is not None:
+            logger.error("OTP email failed", extra=fields(message_id=record["messageId"], error=status))
+            counts["Failed"] += 1
+            failed.append(record["messageId"])
+            continue
+        counts["Sent"] += 1
+        enqueued_at = message.get("enqueued_at")
+        if enqueued_at is None:
+            enqueued_at = int(record.get("attributes", {}).get("SentTimestamp", 0)) / 1000
+        latencies_ms.append(round((delivered_at - enqueued_at) * 1000, 1))
+
+    return failed, counts, latencies_ms
+
+
+# ────────────────────────────  Lambda entry‑point  ────────────────────────── #
+
+
+def lambda_handler(
+    event: dict[str, Any],
+    context: Any,
+    send_batch: Optional[Callable[[list[tuple[str, str]]], list[Optional[str]]]] = None,
+) -> dict[str, Any]:
+    """
+    SQS consumer. Uses partial batch responses, so only the failed messages
+    return to the queue and successfully sent ones are never emailed twice.
+    """
+    if send_batch is None:
+        from cognito_custom_auth_lambda import send_otp_emails as send_batch
+
+    failed, counts, latencies_ms = process_records(event.get("Records", []), send_batch)
+    print(_metrics_record(counts, latencies_ms))
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import html
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+# ────────────────────────────  Templates  ─────────────────────────────────── #
+# Email templates live in templates/ as <name>_subject.txt, <name>.txt and
+# <name>.html with {{field}} placeholders, the Handlebars syntax SES stored
+# templates use. Terraform uploads the same files as the SES template, and
+# the local renderer below produces the same output offline.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+_FIELD = re.compile(r"{{\s*(\w+)\s*}}")
+
+
+def _plain(value: Any) -> str:
+    return str(value)
+
+
+def _escaped(value: Any) -> str:
+    return html.escape(str(value))
+
+
+class CompiledTemplate:
+    """
+    A template split once into literal text and field names, so rendering is a
+    single join. bind() folds values known at cold start into the literals.
+    """
+
+    def __init__(self, parts: list[str], escape: Callable[[Any], str] = _plain) -> None:
+        self.parts = parts  # literals at even indices, field names at odd ones
+        self.escape = escape
+
+    @classmethod
+    def compile(cls, source: str, escape: Callable[[Any], str] = _plain) -> CompiledTemplate:
+        return cls(_FIELD.split(source), escape)
+
+    @property
+    def fields(self) -> set[str]:
+        return set(self.parts[1::2])
+
+    def bind(self, **values: Any) -> CompiledTemplate:
+        parts = [self.parts[0]]
+        for name, literal in zip(self.parts[1::2], self.parts[2::2]):
+            if name in values:
+                parts[-1] += self.escape(values[name]) + literal
+            else:
+                parts += [name, literal]
+        return CompiledTemplate(parts, self.escape)
+
+    def render(self, **values: Any) -> str:
+        """Raises KeyError for a missing field rather than rendering it empty like SES."""
+        out = self.parts[:]
+        for i in range(1, len(out), 2):
+            out[i] = self.escape(values[out[i]])
+        return "".join(out)
+
+
+@dataclass(frozen=True)
+class EmailTemplate:
+    subject: CompiledTemplate
+    text: CompiledTemplate
+    html: CompiledTemplate
+
+    @property
+    def fields(self) -> set[str]:
+        return self.subject.fields | self.text.fields | self.html.fields
+
+    def bind(self, **values: Any) -> EmailTemplate:
+        return EmailTemplate(self.subject.bind(**values), self.text.bind(**values), self.html.bind(**values))
+
+    def render(self, **values: Any) -> tuple[str, str, str]:
+        """Returns (subject, text body, html body)."""
+        return self.subject.render(**values), self.text.render(**values), self.html.render(**values)
+
+
+def load(name: str, directory: str = TEMPLATE_DIR) -> EmailTemplate:
+    def read(filename: str) -> str:
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            return f.read()
+
+    return EmailTemplate(
+        subject=CompiledTemplate.compile(read(f"{name}_subject.txt").strip()),
+        text=CompiledTemplate.compile(read(f"{name}.txt")),
+        html=CompiledTemplate.compile(read(f"{name}.html"), escape=_escaped),
+    )
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from structured_logging import fields
+
+# ────────────────────────────  Token buckets  ─────────────────────────────── #
+# Each key ("email:<address>", "ip:<address>") has a bucket of `capacity`
+# tokens refilled continuously at `refill_per_second`; issuing an OTP takes
+# one token from every bucket it is keyed by. When one bucket denies, the
+# tokens already taken from the others are given back, so a client limited
+# by IP does not also drain the email bucket it shares with the real user.
+#
+# RateLimiter keeps an in-process copy of each bucket as a fast path. A
+# container only sees its own share of the traffic, so its local bucket can
+# never hold fewer tokens than the shared one: an empty local bucket denies
+# without a DynamoDB round trip, and a full one defers to the shared store.
+
+logger = logging.getLogger(__name__)
+
+MAX_CONDITIONAL_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    capacity: float
+    refill_per_second: float
+
+    def refill(self, tokens: float, updated_at: float, now: float) -> float:
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.refill_per_second)
+
+    def seconds_to_full(self, tokens: float) -> float:
+        return (self.capacity - tokens) / self.refill_per_second if self.refill_per_second else 0.0
+
+
+class LocalBucketStore:
+    """In-process buckets: the fast path, and a stand-in for the DynamoDB store in tests."""
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, policy: BucketPolicy, now: float) -> bool:
+        with self._lock:
+            tokens, updated_at = self.buckets.get(key, (policy.capacity, now))
+            tokens = policy.refill(tokens, updated_at, now)
+            allowed = tokens >= 1
+            self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+    def give_back(self, key: str, policy: BucketPolicy, now: float) -> None:
+        with self._lock:
+            tokens, updated_at = self.buckets.get(key, (policy.capacity, now))
+            self.buckets[key] = (min(policy.capacity, policy.refill(tokens, updated_at, now) + 1), now)
+
+    def empty(self, key: str, now: float) -> None:
+        with self._lock:
+            self.buckets[key] = (0.0, now)
+
+
+class DynamoDbBucketStore:
+    """
+    Shared buckets in a DynamoDB table with hash key BucketKey and a TTL
+    attribute ExpiresAt. Each take is a read followed by an update conditioned
+    on UpdatedAt being unchanged, retried when another container got there first.
+    """
+
+    def __init__(self, table_name: str, client: Any = None) -> None:
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:  # built on first use so other triggers never import boto3
+            import boto3
+
+            self._client = boto3.client("dynamodb")
+        return self._client
+
+    def take(self, key: str, policy: BucketPolicy, now: float) -> bool:
+        return self._update(key, policy, now, lambda tokens: tokens - 1 if tokens >= 1 else None)
+
+    def give_back(self, key: str, policy: BucketPolicy, now: float) -> None:
+        self._update(key, policy, now, lambda tokens: min(policy.capacity, tokens + 1))
+
+    def _update(
+        self, key: str, policy: BucketPolicy, now: float, change: Callable[[float], Optional[float]]
+    ) -> bool:
+        """Write change(refilled tokens) to the bucket; False when change returns None or contention persists."""
+        for _ in range(MAX_CONDITIONAL_ATTEMPTS):
+            item = self.client.get_item(
+                TableName=self.table_name, Key={"BucketKey": {"S": key}}, ConsistentRead=True
+            ).get("Item")
+            if item:
+                seen = item["UpdatedAt"]["N"]
+                tokens = policy.refill(float(item["Tokens"]["N"]), float(seen), now)
+            else:
+                seen, tokens = None, policy.capacity
+            tokens = change(tokens)
+            if tokens is None:
+                return False
+
+            values = {
+                ":tokens": {"N": str(round(tokens, 6))},
+                ":now": {"N": str(round(now, 6))},
+                ":expires": {"N": str(int(now + policy.seconds_to_full(tokens)) + 1)},
+            }
+            if seen is None:
+                condition = "attribute_not_exists(BucketKey)"
+            else:
+                condition = "UpdatedAt = :seen"
+                values[":seen"] = {"N": seen}
+            try:
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key={"BucketKey": {"S": key}},
+                    UpdateExpression="SET Tokens = :tokens, UpdatedAt = :now, ExpiresAt = :expires",
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values,
+                )
+                return True
+            except Exception as exc:
+                if getattr(exc, "response", {}).get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+        return False  # still contended after several attempts: treat as limited
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        policies: dict[str, BucketPolicy],
+        store: Optional[Any] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.policies = policies  # key kind ("email", "ip") -> policy
+        self.store = store
+        self.clock = clock
+        self.local = LocalBucketStore()
+
+    def allow(self, **keys: Optional[str]) -> bool:
+        """
+        Take a token for each given key (e.g. email=..., ip=...); None values
+        are skipped. False when any bucket is exhausted, in which case the
+        tokens taken from the other buckets are given back. Shared-store
+        errors are logged and the local decision stands, so the limiter never
+        locks everyone out.
+        """
+        now = self.clock()
+        buckets = [
+            (f"{kind}:{value.lower()}", self.policies[kind])
+            for kind, value in keys.items()
+            if value and kind in self.policies
+        ]
+        for taken, (key, policy) in enumerate(buckets):
+            if not self.local.take(key, policy, now):
+                logger.warning("Rate limit reached", extra=fields(bucket=key))
+                self._give_back(self.local, buckets[:taken], now)
+                return False
+
+        if self.store is None:
+            return True
+        shared = []
+        for key, policy in buckets:
+            try:
+                allowed = self.store.take(key, policy, now)
+            except Exception as exc:
+                logger.error("Rate limit store failed", extra=fields(bucket=key, error=str(exc)))
+                continue
+            if not allowed:
+                self.local.empty(key, now)  # the shared bucket is empty, so skip the store until it refills
+                logger.warning("Rate limit reached", extra=fields(bucket=key))
+                self._give_back(self.local, [b for b in buckets if b[0] != key], now)
+                self._give_back(self.store, shared, now)
+                return False
+            shared.append((key, policy))
+        return True
+
+    def _give_back(self, store: Any, buckets: list[tuple[str, BucketPolicy]], now: float) -> None:
+        for key, policy in buckets:
+            try:
+                store.give_back(key, policy, now)
+            except Exception as exc:
+                logger.error("Rate limit store failed", extra=fields(bucket=key, error=str(exc)))
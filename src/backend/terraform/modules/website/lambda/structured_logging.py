@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import re
+from typing import Any, Callable
+
+# ────────────────────────────  Structured logging  ────────────────────────── #
+# Shared by the website Lambdas. Every record becomes one JSON line with a
+# fixed set of keys plus the caller's `fields`:
+#
+#     logger.info("OTP email queued", extra=fields(email=email))
+#     logger.debug("Incoming event", extra=fields(event=event))
+#
+# Field values are only redacted and serialized when a record is actually
+# emitted, so passing a whole event to a disabled or sampled-out level costs
+# nothing. Secret-looking keys are replaced, email addresses are masked and
+# oversized values are truncated.
+#
+# LOG_SAMPLE_RATES ("DEBUG=0.01,INFO=0.1") keeps that fraction of records per
+# level; WARNING and above are always kept. Emitted records carry the rate.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+REDACTED = "[REDACTED]"
+SECRET_KEYS = re.compile(
+    r"(answer|challengeanswer|code|otp|privatechallengeparameters|encodeddata"
+    r"|.*secret.*|.*token|password|authorization|cookie)",
+    re.IGNORECASE,
+)
+EMAIL = re.compile(r"\b([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b")
+MAX_FIELDS = 20
+MAX_DEPTH = 6
+MAX_ITEMS = 50
+MAX_STRING = 512
+
+
+def fields(**values: Any) -> dict[str, Any]:
+    """The `extra` argument for structured fields on one record."""
+    return {"fields": values}
+
+
+def mask_emails(text: str) -> str:
+    return EMAIL.sub(r"\1***@\2", text)
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """A JSON-safe copy of value with secrets removed and size bounded."""
+    if depth >= MAX_DEPTH:
+        return "..."
+    if isinstance(value, dict):
+        out = {}
+        for i, (key, item) in enumerate(value.items()):
+            if i == MAX_ITEMS:
+                out["..."] = f"{len(value) - MAX_ITEMS} more"
+                break
+            key = str(key)
+            out[key] = REDACTED if SECRET_KEYS.fullmatch(key) else redact(item, depth + 1)
+        return out
+    if isinstance(value, (list, tuple, set)):
+        items = [redact(item, depth + 1) for item in list(value)[:MAX_ITEMS]]
+        if len(value) > MAX_ITEMS:
+            items.append(f"... {len(value) - MAX_ITEMS} more")
+        return items
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if callable(value):  # lazily computed field
+        return redact(value(), depth)
+    text = mask_emails(str(value))
+    return text if len(text) <= MAX_STRING else text[:MAX_STRING] + "..."
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str) -> None:
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": mask_emails(record.getMessage()),
+        }
+        if getattr(record, "sample_rate", 1.0) < 1.0:
+            entry["sample_rate"] = record.sample_rate
+        extra = getattr(record, "fields", None) or {}
+        for i, (name, value) in enumerate(extra.items()):
+            if i == MAX_FIELDS:
+                break
+            entry.setdefault(name, REDACTED if SECRET_KEYS.fullmatch(name) else redact(value))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_sample_rates(spec: str) -> dict[int, float]:
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        level, _, rate = part.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: dict[int, float], rng: Callable[[], float] = random.random) -> None:
+        super().__init__()
+        self.rates = rates
+        self.rng = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        record.sample_rate = rate
+        return rate >= 1.0 or self.rng() < rate
+
+
+def configure(service: str, level: str = LOG_LEVEL, sample_rates: str = LOG_SAMPLE_RATES) -> None:
+    """
+    Route all logging through one JSON handler on the root logger; safe to call
+    again. Inside Lambda the function name is the service, whichever module
+    configures logging first.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter(os.getenv("AWS_LAMBDA_FUNCTION_NAME", service)))
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample_rates)))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
@@ -1,5 +1,6 @@
 import pytest
 import json
+import time
 
 # Basic event structure for API Gateway proxy integration
 mock_api_gateway_event = {
@@ -92,3 +93,114 @@ def test_lambda_handler_malformed_json(set_turnstile_secret_key):
     body = json.loads(response["body"])
     assert body["message"] == "Invalid JSON body"
 
+
+
+# ────────────────────────────  Batch Tests  ──────────────────────────── #
+
+def _batch_event(*tokens):
+    return {
+        "routeKey": "POST /verify/batch",
+        "body": json.dumps({"tokens": [{"token": t, "remote_ip": "192.0.2.1"} for t in tokens]}),
+        "requestContext": {"http": {"sourceIp": "10.0.0.1"}},
+    }
+
+
+@pytest.fixture
+def batch_lambda(set_turnstile_secret_key, mocker):
+    from turnstile_client import KeepAliveClient
+    from turnstile_stand_in import TurnstileStandIn
+    from turnstile_verdicts import VerdictCache
+
+    cf_turnstile_lambda = set_turnstile_secret_key
+    mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_SECRET_KEY", "dummy_secret")
+    mocker.patch.object(cf_turnstile_lambda, "VERDICT_CACHE", VerdictCache())
+    with TurnstileStandIn(slow_seconds=0.2) as server:
+        client = KeepAliveClient(server.url, pool_size=8, max_retries=0)
+        mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_CLIENT", client)
+        yield cf_turnstile_lambda, server
+
+
+def test_batch_returns_results_in_order(batch_lambda):
+    cf_turnstile_lambda, server = batch_lambda
+    response = cf_turnstile_lambda.lambda_handler(_batch_event("ok-1", "fail-1", "error-1", "ok-2"), None)
+
+    assert response["statusCode"] == 200
+    results = json.loads(response["body"])["results"]
+    assert [r["success"] for r in results] == [True, False, False, True]
+    assert results[1]["error_codes"] == ["invalid-input-response"]
+    assert results[2]["error_codes"] == ["verification-unavailable"]  # one outage fails only its token
+
+
+def test_batch_verifies_concurrently_over_pooled_connections(batch_lambda):
+    cf_turnstile_lambda, server = batch_lambda
+    started = time.perf_counter()
+    response = cf_turnstile_lambda.lambda_handler(_batch_event(*(f"slow-{i}" for i in range(8))), None)
+    elapsed = time.perf_counter() - started
+
+    assert all(r["success"] for r in json.loads(response["body"])["results"])
+    assert elapsed < 8 * 0.2 / 2
+    assert server.connections <= cf_turnstile_lambda.BATCH_CONCURRENCY
+
+
+def test_batch_verifies_repeated_tokens_once(batch_lambda):
+    cf_turnstile_lambda, server = batch_lambda
+    response = cf_turnstile_lambda.lambda_handler(_batch_event("ok-1", "ok-1", "fail-1", "fail-1"), None)
+
+    results = json.loads(response["body"])["results"]
+    assert [r["error_codes"] for r in results] == [
+        [], ["timeout-or-duplicate"], ["invalid-input-response"], ["invalid-input-response"]
+    ]
+    assert server.requests == 2
+
+
+@pytest.mark.parametrize("body", ['{"tokens": []}', '{"tokens": "abc"}', '{}'])
+def test_batch_rejects_malformed_bodies(set_turnstile_secret_key, body):
+    event = {"routeKey": "POST /verify/batch", "body": body}
+    assert set_turnstile_secret_key.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_batch_rejects_oversized_batches(set_turnstile_secret_key, mocker):
+    cf_turnstile_lambda = set_turnstile_secret_key
+    mocker.patch.object(cf_turnstile_lambda, "MAX_BATCH_TOKENS", 2)
+    response = cf_turnstile_lambda.lambda_handler(_batch_event("a", "b", "c"), None)
+    assert response["statusCode"] == 400
+
+
+def test_batch_answers_unexpected_errors_per_token(set_turnstile_secret_key, mocker):
+    cf_turnstile_lambda = set_turnstile_secret_key
+
+    def verify(token, remote_ip):
+        if token == "bad":
+            raise ValueError("unexpected siteverify response")
+        return {"success": True}
+
+    mocker.patch.object(cf_turnstile_lambda, "_verify_token", side_effect=verify)
+    response = cf_turnstile_lambda.lambda_handler(_batch_event("ok", "bad"), None)
+
+    assert response["statusCode"] == 200
+    results = json.loads(response["body"])["results"]
+    assert results == [{"success": True, "error_codes": []},
+                       {"success": False, "error_codes": ["verification-unavailable"]}]
+
+
+def test_batch_stops_waiting_at_the_deadline(batch_lambda, mocker):
+    cf_turnstile_lambda, server = batch_lambda
+    mocker.patch.object(cf_turnstile_lambda, "BATCH_DEADLINE_SECONDS", 0.1)
+    started = time.perf_counter()
+    response = cf_turnstile_lambda.lambda_handler(_batch_event("ok-1", "slow-1"), None)
+
+    assert time.perf_counter() - started < 0.2
+    results = json.loads(response["body"])["results"]
+    assert results[0]["success"] is True
+    assert results[1] == {"success": False, "error_codes": ["verification-unavailable"]}
+
+
+def test_batch_reports_missing_tokens_per_item(set_turnstile_secret_key, mocker):
+    cf_turnstile_lambda = set_turnstile_secret_key
+    verify = mocker.patch.object(cf_turnstile_lambda, "_verify_token", return_value={"success": True})
+    event = {"routeKey": "POST /verify/batch", "body": json.dumps({"tokens": [{"token": "ok"}, {}, "x"]})}
+
+    results = json.loads(cf_turnstile_lambda.lambda_handler(event, None)["body"])["results"]
+    assert [r["success"] for r in results] == [True, False, False]
+    assert results[1]["error_codes"] == ["missing-input-response"]
+    verify.assert_called_once_with("ok", None)
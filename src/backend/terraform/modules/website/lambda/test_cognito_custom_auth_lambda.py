@@ -1,6 +1,13 @@
+import copy
+import json
+import os
+import subprocess
+import sys
+
 import pytest
 from unittest.mock import patch, MagicMock
 import cognito_custom_auth_lambda
+from otp_rate_limiter import LocalBucketStore
 
 # ────────────────────────────  Mock Event Structures  ──────────────────────────── #
 
@@ -129,7 +136,7 @@ mock_unhandled_trigger_event = {
 def mock_ses_client(mocker):
     """Fixture to mock the SES client."""
     mock_client = MagicMock()
-    mocker.patch.object(cognito_custom_auth_lambda, 'ses', mock_client)
+    mocker.patch.object(cognito_custom_auth_lambda, 'get_ses_client', return_value=mock_client)
     return mock_client
 
 
@@ -148,6 +155,12 @@ def cognito_lambda_module(mocker):
     yield ccal
 
 
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter(mocker):
+    """Start every test with full rate limit buckets."""
+    mocker.patch.object(cognito_custom_auth_lambda.OTP_RATE_LIMITER, 'local', LocalBucketStore())
+
+
 @pytest.fixture
 def mock_one_time_code(mocker):
     """Fixture to mock the _one_time_code function."""
@@ -280,8 +293,8 @@ def test_handle_create_auth_challenge_no_email_returns_error_params(mock_ses_cli
     assert event["response"]["privateChallengeParameters"] == {}
     assert event["response"]["challengeMetadata"] == "NO_EMAIL"
 
-@patch.object(cognito_custom_auth_lambda.ses, 'send_email')
-def test_send_otp_email_calls_ses_send_email(mock_send_email):
+def test_send_otp_email_calls_ses_send_email(mock_ses_client):
+    mock_send_email = mock_ses_client.send_email
     code = "112233"
     to_email = "recipient@example.com"
     cognito_custom_auth_lambda.send_otp_email(code, to_email)
@@ -305,3 +318,84 @@ def test_handle_verify_auth_challenge_incorrect():
     event = cognito_custom_auth_lambda.handle_verify_auth_challenge(mock_verify_auth_challenge_event_incorrect, None)
     assert event["response"]["answerCorrect"] is False
 
+
+
+# ────────────────────────────  Lazy Client / Cold Start Tests  ──────────────────────────── #
+
+def test_non_email_triggers_never_build_ses_client(mocker):
+    factory = mocker.patch.object(cognito_custom_auth_lambda, 'get_ses_client')
+    for event in (mock_pre_sign_up_event_success, mock_define_auth_challenge_empty_session,
+                  mock_verify_auth_challenge_event_correct):
+        cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(event), None)
+    factory.assert_not_called()
+
+
+def test_get_ses_client_is_memoized(mocker):
+    cognito_custom_auth_lambda.get_ses_client.cache_clear()
+    boto3_client = mocker.patch('boto3.client')
+    try:
+        assert cognito_custom_auth_lambda.get_ses_client() is cognito_custom_auth_lambda.get_ses_client()
+        boto3_client.assert_called_once_with("ses", region_name=cognito_custom_auth_lambda.REGION)
+    finally:
+        cognito_custom_auth_lambda.get_ses_client.cache_clear()
+
+
+def test_cold_start_profile_logs_new_timings_once(mocker, caplog):
+    cold_start = cognito_custom_auth_lambda.cold_start
+    mocker.patch.object(cold_start, 'ENABLED', True)
+    mocker.patch.object(cold_start, 'timings', {})
+    mocker.patch.object(cold_start, '_reported', set())
+    cognito_custom_auth_lambda.get_ses_client.cache_clear()
+    mocker.patch('boto3.client')
+    try:
+        with caplog.at_level("INFO"):
+            cognito_custom_auth_lambda.get_ses_client()
+            cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(mock_unhandled_trigger_event), None)
+            cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(mock_unhandled_trigger_event), None)
+    finally:
+        cognito_custom_auth_lambda.get_ses_client.cache_clear()
+
+    logged = [r.fields["cold_start_ms"] for r in caplog.records if r.getMessage() == "Cold start timings"]
+    assert len(logged) == 1
+    assert {"client ses", "import boto3"} <= set(logged[0])
+
+
+def test_module_import_does_not_load_botocore():
+    code = "import sys, cognito_custom_auth_lambda; print('botocore' in sys.modules)"
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout.strip()
+    assert loaded == "False"
+
+
+# ────────────────────────────  Email Template Tests  ──────────────────────────── #
+
+def test_send_otp_email_uses_ses_stored_template_when_configured(mocker, mock_ses_client):
+    mocker.patch.object(cognito_custom_auth_lambda, 'OTP_SES_TEMPLATE', 'dev-otp-email')
+    cognito_custom_auth_lambda.send_otp_email("112233", "recipient@example.com")
+
+    mock_ses_client.send_email.assert_not_called()
+    call_args = mock_ses_client.send_templated_email.call_args[1]
+    assert call_args['Template'] == 'dev-otp-email'
+    assert call_args['Destination'] == {'ToAddresses': ['recipient@example.com']}
+    assert json.loads(call_args['TemplateData'])['code'] == "112233"
+
+
+def test_send_otp_emails_batches_into_one_bulk_call(mocker, mock_ses_client):
+    mocker.patch.object(cognito_custom_auth_lambda, 'OTP_SES_TEMPLATE', 'dev-otp-email')
+    mock_ses_client.send_bulk_templated_email.return_value = {
+        "Status": [{"Status": "Success"}, {"Status": "MessageRejected"}]
+    }
+
+    statuses = cognito_custom_auth_lambda.send_otp_emails([("111111", "a@example.com"), ("222222", "b@example.com")])
+
+    assert statuses == [None, "MessageRejected"]
+    call_args = mock_ses_client.send_bulk_templated_email.call_args[1]
+    assert [d['Destination']['ToAddresses'] for d in call_args['Destinations']] == [['a@example.com'], ['b@example.com']]
+    assert json.loads(call_args['Destinations'][1]['ReplacementTemplateData']) == {"code": "222222"}
+    assert json.loads(call_args['DefaultTemplateData'])['ttl_minutes'] == cognito_custom_auth_lambda.OTP_TTL_MIN
+
+
+def test_send_otp_emails_without_template_sends_each_email(mock_ses_client):
+    statuses = cognito_custom_auth_lambda.send_otp_emails([("111111", "a@example.com"), ("222222", "b@example.com")])
+    assert statuses == [None, None]
+    assert mock_ses_client.send_email.call_count == 2
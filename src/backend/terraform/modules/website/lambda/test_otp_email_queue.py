@@ -0,0 +1,151 @@
+import copy
+import json
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock
+
+import cognito_custom_auth_lambda
+import otp_email_queue
+
+mock_create_auth_challenge_event_custom = {
+    "triggerSource": "CreateAuthChallenge_Authentication",
+    "request": {
+        "challengeName": "CUSTOM_CHALLENGE",
+        "userAttributes": {"email": "test@example.com"},
+    },
+    "response": {},
+}
+
+
+def _client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "SendEmail")
+
+
+def _each(send):
+    return lambda messages: otp_email_queue.send_each(send, messages)
+
+
+# ────────────────────────────  Fixtures  ──────────────────────────── #
+
+@pytest.fixture
+def local_queue(mocker):
+    queue = otp_email_queue.LocalQueue(max_receives=3)
+    mocker.patch.object(otp_email_queue, "get_sqs_client", return_value=queue)
+    return queue
+
+
+@pytest.fixture
+def queue_mode(mocker, local_queue):
+    mocker.patch.object(cognito_custom_auth_lambda, "OTP_DISPATCH", "queue")
+    mocker.patch.object(cognito_custom_auth_lambda, "_one_time_code", return_value="987654")
+    ses = MagicMock()
+    mocker.patch.object(cognito_custom_auth_lambda, "get_ses_client", return_value=ses)
+    mocker.patch.object(otp_email_queue.time, "sleep")
+    return ses
+
+
+# ────────────────────────────  Producer Tests  ──────────────────────────── #
+
+def test_create_auth_challenge_queues_email_instead_of_sending(queue_mode, local_queue):
+    event = cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(mock_create_auth_challenge_event_custom), None)
+
+    queue_mode.send_email.assert_not_called()
+    assert event["response"]["privateChallengeParameters"] == {"answer": "987654"}
+    body = json.loads(local_queue.messages[0]["body"])
+    assert body["email"] == "test@example.com"
+    assert body["code"] == "987654"
+    assert body["expires_at"] - body["enqueued_at"] == pytest.approx(180)
+
+
+def test_enqueue_failure_falls_back_to_sending_directly(queue_mode, mocker):
+    mocker.patch.object(otp_email_queue, "enqueue_otp_email", side_effect=_client_error("AccessDenied"))
+    cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(mock_create_auth_challenge_event_custom), None)
+    queue_mode.send_email.assert_called_once()
+
+
+# ────────────────────────────  Consumer Tests  ──────────────────────────── #
+
+def test_consumer_sends_queued_email_and_records_latency(queue_mode, local_queue, capsys):
+    cognito_custom_auth_lambda.lambda_handler(copy.deepcopy(mock_create_auth_challenge_event_custom), None)
+    capsys.readouterr()
+
+    local_queue.drain(otp_email_queue.lambda_handler)
+
+    queue_mode.send_email.assert_called_once()
+    assert "987654 is your Bitcoin Browser Miner code." in (
+        queue_mode.send_email.call_args[1]["Message"]["Body"]["Text"]["Data"]
+    )
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["Sent"] == 1 and metrics["Failed"] == 0
+    assert len(metrics["EnqueueToDeliveryMs"]) == 1
+    assert metrics["_aws"]["CloudWatchMetrics"][0]["Namespace"] == otp_email_queue.METRICS_NAMESPACE
+
+
+def test_consumer_retries_throttling_within_the_invocation(local_queue, mocker):
+    mocker.patch.object(otp_email_queue.time, "sleep")
+    send = MagicMock(side_effect=[_client_error("Throttling"), None])
+    otp_email_queue.enqueue_otp_email("111111", "a@example.com", 180)
+
+    local_queue.drain(lambda event, context: otp_email_queue.lambda_handler(event, context, _each(send)))
+
+    assert send.call_count == 2
+    assert local_queue.dead_letters == []
+
+
+def test_consumer_reports_only_failed_messages_and_dead_letters_them(local_queue, mocker):
+    mocker.patch.object(otp_email_queue.time, "sleep")
+
+    def send(code, email):
+        if email == "bad@example.com":
+            raise _client_error("MessageRejected")
+
+    otp_email_queue.enqueue_otp_email("111111", "good@example.com", 180)
+    otp_email_queue.enqueue_otp_email("222222", "bad@example.com", 180)
+
+    response = otp_email_queue.lambda_handler({"Records": list(local_queue.messages)}, None, _each(send))
+    assert response == {"batchItemFailures": [{"itemIdentifier": "local-2"}]}
+
+    local_queue.drain(lambda event, context: otp_email_queue.lambda_handler(event, context, _each(send)))
+    assert [json.loads(r["body"])["email"] for r in local_queue.dead_letters] == ["bad@example.com"]
+    assert local_queue.dead_letters[0]["attributes"]["ApproximateReceiveCount"] == "3"
+
+
+def test_consumer_drops_expired_codes(local_queue, capsys):
+    send = MagicMock()
+    otp_email_queue.enqueue_otp_email("111111", "a@example.com", -1)
+
+    response = otp_email_queue.lambda_handler({"Records": list(local_queue.messages)}, None, _each(send))
+
+    send.assert_not_called()
+    assert response == {"batchItemFailures": []}
+    assert json.loads(capsys.readouterr().out)["Expired"] == 1
+
+
+def test_consumer_drops_bad_messages_without_holding_back_the_batch(local_queue, capsys):
+    send = MagicMock()
+    otp_email_queue.enqueue_otp_email("111111", "good@example.com", 180)
+    bad_bodies = ["not json", '["a list"]', '{"email": "a@example.com"}', '{"code": "1", "email": 5}',
+                  '{"code": "1", "email": "a@example.com", "expires_at": "soon"}']
+    records = list(local_queue.messages) + [
+        {"messageId": f"bad-{i}", "body": body} for i, body in enumerate(bad_bodies)
+    ]
+
+    response = otp_email_queue.lambda_handler({"Records": records}, None, _each(send))
+
+    send.assert_called_once_with("111111", "good@example.com")
+    assert response == {"batchItemFailures": []}  # bad messages are dropped, not redelivered
+    metrics = json.loads(capsys.readouterr().out)
+    assert metrics["Sent"] == 1 and metrics["Failed"] == len(bad_bodies)
+
+
+def test_consumer_falls_back_to_sqs_sent_timestamp(capsys):
+    sent_ms = int((time.time() - 2) * 1000)
+    record = {
+        "messageId": "m-1",
+        "body": json.dumps({"email": "a@example.com", "code": "111111"}),
+        "attributes": {"SentTimestamp": str(sent_ms)},
+    }
+    otp_email_queue.lambda_handler({"Records": [record]}, None, _each(MagicMock()))
+    assert json.loads(capsys.readouterr().out)["EnqueueToDeliveryMs"][0] >= 2000
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+import otp_email_templates
+from otp_email_templates import CompiledTemplate, load
+
+
+def test_render_substitutes_fields():
+    template = CompiledTemplate.compile("{{code}} is valid for {{ ttl_minutes }} minutes")
+    assert template.fields == {"code", "ttl_minutes"}
+    assert template.render(code="123456", ttl_minutes=3) == "123456 is valid for 3 minutes"
+
+
+def test_bind_folds_static_fields_into_literals():
+    template = CompiledTemplate.compile("<img src=\"{{img_link}}\">{{code}}</p>{{ttl_minutes}}")
+    bound = template.bind(img_link="https://example.com/a.png", ttl_minutes=3)
+
+    assert bound.fields == {"code"}
+    assert bound.parts == ['<img src="https://example.com/a.png">', "code", "</p>3"]
+    assert bound.render(code="42") == template.render(code="42", img_link="https://example.com/a.png", ttl_minutes=3)
+
+
+def test_html_templates_escape_values_like_handlebars(tmp_path):
+    for filename, content in (("t_subject.txt", "Hi {{name}}"), ("t.txt", "{{name}}"), ("t.html", "<b>{{name}}</b>")):
+        (tmp_path / filename).write_text(content)
+    subject, text, html = load("t", str(tmp_path)).render(name="<Ann & co>")
+
+    assert subject == "Hi <Ann & co>"
+    assert text == "<Ann & co>"
+    assert html == "<b>&lt;Ann &amp; co&gt;</b>"
+
+
+def test_missing_field_raises():
+    with pytest.raises(KeyError):
+        CompiledTemplate.compile("{{code}}").render()
+
+
+def test_otp_email_template_renders_the_login_email():
+    template = load("otp_email").bind(ttl_minutes=3, img_link="https://example.com/image.png")
+    subject, text, html = template.render(code="987654")
+
+    assert template.fields == {"code"}
+    assert subject == "Your Bitcoin Browser Miner Login Code"
+    assert text.startswith("987654 is your Bitcoin Browser Miner code.\n\n")
+    assert "It is valid for 3 minutes." in text
+    assert 'src="https://example.com/image.png"' in html
+    assert ">987654</code>" in html
+    assert "{{" not in subject + text + html
+
+
+def test_otp_email_template_fields_match_the_data_ses_receives():
+    import cognito_custom_auth_lambda
+
+    data = json.loads(json.dumps(cognito_custom_auth_lambda._template_data("1")))
+    assert load("otp_email").fields == set(data)
+    assert os.path.isdir(otp_email_templates.TEMPLATE_DIR)
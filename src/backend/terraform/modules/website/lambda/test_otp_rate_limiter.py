@@ -0,0 +1,208 @@
+import copy
+
+import pytest
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock
+
+import cognito_custom_auth_lambda
+from otp_rate_limiter import BucketPolicy, DynamoDbBucketStore, LocalBucketStore, RateLimiter
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDynamoDb:
+    """Just enough of get_item/update_item for DynamoDbBucketStore, including the conditions."""
+
+    def __init__(self):
+        self.items = {}
+        self.calls = 0
+        self.before_update = None  # hook to simulate another container writing first
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        self.calls += 1
+        item = self.items.get(Key["BucketKey"]["S"])
+        return {"Item": copy.deepcopy(item)} if item else {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        self.calls += 1
+        if self.before_update:
+            self.before_update(self)
+        key = Key["BucketKey"]["S"]
+        current = self.items.get(key)
+        if ConditionExpression == "attribute_not_exists(BucketKey)":
+            ok = current is None
+        else:
+            ok = current is not None and current["UpdatedAt"] == ExpressionAttributeValues[":seen"]
+        if not ok:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, "UpdateItem")
+        self.items[key] = {
+            "BucketKey": {"S": key},
+            "Tokens": ExpressionAttributeValues[":tokens"],
+            "UpdatedAt": ExpressionAttributeValues[":now"],
+            "ExpiresAt": ExpressionAttributeValues[":expires"],
+        }
+
+
+POLICY = BucketPolicy(capacity=2, refill_per_second=0.1)
+
+
+# ────────────────────────────  Bucket Tests  ──────────────────────────── #
+
+@pytest.mark.parametrize("store_factory", [LocalBucketStore, lambda: DynamoDbBucketStore("buckets", FakeDynamoDb())])
+def test_bucket_allows_capacity_then_refills(store_factory):
+    store = store_factory()
+    assert store.take("email:a", POLICY, 100.0)
+    assert store.take("email:a", POLICY, 100.0)
+    assert not store.take("email:a", POLICY, 100.0)
+    assert not store.take("email:a", POLICY, 105.0)  # half a token
+    assert store.take("email:a", POLICY, 110.0)
+    assert store.take("email:b", POLICY, 110.0)  # buckets are per key
+
+
+def test_dynamodb_store_retries_when_another_writer_wins():
+    client = FakeDynamoDb()
+    store = DynamoDbBucketStore("buckets", client)
+    assert store.take("ip:1.2.3.4", POLICY, 100.0)
+
+    def competing_write(db):
+        db.before_update = None
+        DynamoDbBucketStore("buckets", db).take("ip:1.2.3.4", POLICY, 100.5)
+
+    client.before_update = competing_write
+    assert not store.take("ip:1.2.3.4", POLICY, 101.0)  # the competitor took the last token
+    assert float(client.items["ip:1.2.3.4"]["Tokens"]["N"]) < 1
+
+
+def test_dynamodb_store_sets_ttl_for_when_the_bucket_is_full_again():
+    client = FakeDynamoDb()
+    DynamoDbBucketStore("buckets", client).take("email:a", POLICY, 100.0)
+    assert client.items["email:a"]["ExpiresAt"]["N"] == "111"  # one token short, refilled in 10 s
+
+
+# ────────────────────────────  Limiter Tests  ──────────────────────────── #
+
+def test_limiter_denies_from_local_fast_path_without_store_call():
+    client = FakeDynamoDb()
+    limiter = RateLimiter({"email": POLICY}, DynamoDbBucketStore("buckets", client), Clock())
+    assert limiter.allow(email="A@example.com")
+    assert limiter.allow(email="a@example.com")  # keys are case-insensitive
+    calls = client.calls
+
+    assert not limiter.allow(email="a@example.com")
+    assert client.calls == calls
+
+
+def test_limiter_shares_buckets_across_containers():
+    client, clock = FakeDynamoDb(), Clock()
+    containers = [RateLimiter({"email": POLICY}, DynamoDbBucketStore("buckets", client), clock) for _ in range(2)]
+    assert containers[0].allow(email="a@example.com")
+    assert containers[1].allow(email="a@example.com")
+    assert not containers[0].allow(email="a@example.com")
+    assert not containers[1].allow(email="a@example.com")
+
+
+def test_limiter_checks_every_key_and_skips_missing_ones():
+    limiter = RateLimiter({"email": POLICY, "ip": BucketPolicy(capacity=1, refill_per_second=0)}, clock=Clock())
+    assert limiter.allow(email="a@example.com", ip="1.2.3.4")
+    assert not limiter.allow(email="b@example.com", ip="1.2.3.4")
+    assert limiter.allow(email="c@example.com", ip=None)
+
+
+def test_limiter_gives_back_email_tokens_when_the_ip_is_limited():
+    ip_policy = BucketPolicy(capacity=1, refill_per_second=0)
+    limiter = RateLimiter({"email": POLICY, "ip": ip_policy}, clock=Clock())
+    assert limiter.allow(email="x@example.com", ip="1.2.3.4")
+    for _ in range(5):
+        assert not limiter.allow(email="a@example.com", ip="1.2.3.4")
+    assert limiter.local.buckets["email:a@example.com"][0] == POLICY.capacity
+
+
+def test_limiter_gives_back_shared_tokens_when_a_later_bucket_denies():
+    client, clock = FakeDynamoDb(), Clock()
+    policies = {"email": POLICY, "ip": BucketPolicy(capacity=1, refill_per_second=0)}
+    other = RateLimiter(policies, DynamoDbBucketStore("buckets", client), clock)
+    assert other.allow(email="x@example.com", ip="1.2.3.4")  # another container spends the shared IP token
+
+    limiter = RateLimiter(policies, DynamoDbBucketStore("buckets", client), clock)
+    assert not limiter.allow(email="a@example.com", ip="1.2.3.4")
+    assert float(client.items["email:a@example.com"]["Tokens"]["N"]) == POLICY.capacity
+    assert limiter.local.buckets["email:a@example.com"][0] == POLICY.capacity
+
+
+def test_dynamodb_store_give_back_is_capped_at_capacity():
+    client = FakeDynamoDb()
+    store = DynamoDbBucketStore("buckets", client)
+    assert store.take("email:a", POLICY, 100.0)
+    store.give_back("email:a", POLICY, 101.0)
+    store.give_back("email:a", POLICY, 102.0)
+    assert float(client.items["email:a"]["Tokens"]["N"]) == POLICY.capacity
+
+
+def test_limiter_fails_open_when_the_store_errors():
+    store = MagicMock()
+    store.take.side_effect = ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "GetItem")
+    assert RateLimiter({"email": POLICY}, store, Clock()).allow(email="a@example.com")
+
+
+# ────────────────────────────  DefineAuthChallenge Tests  ──────────────────────────── #
+
+def _define_event(session, ip="203.0.113.9"):
+    return {
+        "triggerSource": "DefineAuthChallenge_Authentication",
+        "request": {
+            "userAttributes": {"email": "limited@example.com"},
+            "userContextData": {"sourceIp": [ip]},
+            "session": session,
+        },
+        "response": {},
+    }
+
+
+@pytest.fixture
+def limiter(mocker):
+    limiter = RateLimiter({"email": BucketPolicy(2, 0), "ip": BucketPolicy(3, 0)})
+    mocker.patch.object(cognito_custom_auth_lambda, "OTP_RATE_LIMITER", limiter)
+    return limiter
+
+
+def test_define_fails_authentication_once_the_email_bucket_is_empty(limiter):
+    for _ in range(2):
+        event = cognito_custom_auth_lambda.handle_define_auth_challenge(_define_event([]), None)
+        assert event["response"]["challengeName"] == "CUSTOM_CHALLENGE"
+
+    event = cognito_custom_auth_lambda.handle_define_auth_challenge(_define_event([]), None)
+    assert event["response"]["failAuthentication"] is True
+    assert event["response"]["issueTokens"] is False
+    assert "challengeName" not in event["response"]
+
+
+def test_define_limits_by_source_ip(limiter):
+    limiter.policies["email"] = BucketPolicy(100, 0)
+    for i in range(3):
+        event = _define_event([])
+        event["request"]["userAttributes"]["email"] = f"user{i}@example.com"
+        assert cognito_custom_auth_lambda.handle_define_auth_challenge(event, None)["response"]["failAuthentication"] is False
+
+    event = _define_event([])
+    event["request"]["userAttributes"]["email"] = "another@example.com"
+    assert cognito_custom_auth_lambda.handle_define_auth_challenge(event, None)["response"]["failAuthentication"] is True
+
+
+def test_define_caps_failed_attempts_per_session(limiter):
+    failed = {"challengeName": "CUSTOM_CHALLENGE", "challengeResult": False}
+    event = cognito_custom_auth_lambda.handle_define_auth_challenge(
+        _define_event([failed] * cognito_custom_auth_lambda.MAX_CHALLENGE_ATTEMPTS), None
+    )
+    assert event["response"] == {"issueTokens": False, "failAuthentication": True}
+
+
+def test_source_ip_accepts_string_or_list():
+    assert cognito_custom_auth_lambda._source_ip(_define_event([], ip="198.51.100.1")) == "198.51.100.1"
+    assert cognito_custom_auth_lambda._source_ip({"request": {"userContextData": {"ipAddress": "198.51.100.2"}}}) == "198.51.100.2"
+    assert cognito_custom_auth_lambda._source_ip({"request": {}}) is None
@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+
+import pytest
+
+import structured_logging
+from structured_logging import JsonFormatter, SamplingFilter, fields, parse_sample_rates, redact
+
+
+@pytest.fixture
+def emit():
+    """Logs through a JSON handler into a buffer; returns (logger, parsed lines)."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter("test-service"))
+    logger = logging.getLogger("structured_logging_test")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    def lines():
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield logger, handler, lines
+    logger.removeHandler(handler)
+
+
+def test_records_are_json_lines_with_fields(emit):
+    logger, _, lines = emit
+    logger.info("Verified challenge", extra=fields(correct=True))
+
+    (line,) = lines()
+    assert line["level"] == "INFO"
+    assert line["service"] == "test-service"
+    assert line["message"] == "Verified challenge"
+    assert line["correct"] is True
+
+
+def test_secrets_are_redacted_and_emails_masked(emit):
+    logger, _, lines = emit
+    event = {
+        "request": {
+            "userAttributes": {"email": "alice@example.com"},
+            "privateChallengeParameters": {"answer": "123456"},
+            "challengeAnswer": "123456",
+        },
+        "body": json.dumps({"token": "abc"}),
+        "headers": {"Authorization": "Bearer x"},
+        "statusCode": 200,
+    }
+    logger.info("Queued for bob@example.com", extra=fields(event=event, code="123456"))
+
+    (line,) = lines()
+    assert "123456" not in json.dumps(line)
+    assert line["message"] == "Queued for b***@example.com"
+    assert line["code"] == "[REDACTED]"
+    assert line["event"]["request"]["userAttributes"]["email"] == "a***@example.com"
+    assert line["event"]["request"]["privateChallengeParameters"] == "[REDACTED]"
+    assert line["event"]["headers"]["Authorization"] == "[REDACTED]"
+    assert line["event"]["statusCode"] == 200
+
+
+def test_values_are_bounded():
+    value = redact({"items": list(range(100)), "text": "x" * 2000, "deep": {"a": {"b": {"c": {"d": {"e": {"f": 1}}}}}}})
+    assert len(value["items"]) == structured_logging.MAX_ITEMS + 1
+    assert len(value["text"]) == structured_logging.MAX_STRING + 3
+    assert value["deep"]["a"]["b"]["c"]["d"] == {"e": "..."}
+
+
+def test_fields_are_not_serialized_for_disabled_levels(emit):
+    logger, _, lines = emit
+    calls = []
+    logger.debug("Incoming event", extra=fields(event=lambda: calls.append(1) or {}))
+    assert calls == [] and lines() == []
+
+    logger.info("Incoming event", extra=fields(event=lambda: calls.append(1) or {"a": 1}))
+    assert calls == [1] and lines()[0]["event"] == {"a": 1}
+
+
+def test_sampling_keeps_a_fraction_per_level_and_all_warnings(emit):
+    logger, handler, lines = emit
+    rolls = iter([0.05, 0.5, 0.05, 0.5])
+    handler.addFilter(SamplingFilter(parse_sample_rates("INFO=0.1"), rng=lambda: next(rolls)))
+
+    for i in range(4):
+        logger.info("info %d", i)
+    logger.warning("always kept")
+
+    assert [line["message"] for line in lines()] == ["info 0", "info 2", "always kept"]
+    assert lines()[0]["sample_rate"] == 0.1
+    assert "sample_rate" not in lines()[2]
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("DEBUG=0.01, info=0.5") == {logging.DEBUG: 0.01, logging.INFO: 0.5}
+    assert parse_sample_rates("") == {}
@@ -0,0 +1,134 @@
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from turnstile_client import KeepAliveClient, TurnstileUnavailable
+from turnstile_stand_in import TurnstileStandIn
+
+
+@pytest.fixture
+def server():
+    with TurnstileStandIn(slow_seconds=0.5) as server:
+        yield server
+
+
+def _client(server, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return KeepAliveClient(server.url, **kwargs)
+
+
+def _verify(client, token):
+    return client.post_form({"secret": "dummy_secret", "response": token})
+
+
+def test_requests_reuse_one_keep_alive_connection(server):
+    client = _client(server)
+    for i in range(5):
+        assert _verify(client, f"token-{i}") == {"success": True, "hostname": "localhost", "action": "", "cdata": ""}
+    assert server.connections == 1
+    assert client.stats["connections"] == 1
+
+
+def test_rejected_token_is_returned_not_raised(server):
+    result = _verify(_client(server), "fail-1")
+    assert result["success"] is False
+    assert result["error-codes"] == ["invalid-input-response"]
+
+
+def test_server_errors_are_retried_a_bounded_number_of_times(server):
+    client = _client(server, max_retries=2)
+    with pytest.raises(TurnstileUnavailable, match="503"):
+        _verify(client, "error-1")
+    assert server.requests == 3
+    assert client.stats["retries"] == 2
+
+
+def test_no_retries_means_a_single_attempt(server):
+    client = _client(server, max_retries=0)
+    with pytest.raises(TurnstileUnavailable, match="503"):
+        _verify(client, "error-1")
+    assert server.requests == 1
+    assert client.stats == {"connections": 1, "requests": 1, "retries": 0}
+
+
+def test_stats_add_up_across_threads(server):
+    client = _client(server, pool_size=8)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: _verify(client, f"token-{i}"), range(64)))
+    assert all(result["success"] for result in results)
+    assert client.stats["requests"] == 64
+    assert client.stats["connections"] == server.connections
+
+
+def test_refused_connections_are_retried_then_reported():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]  # nothing listens once the socket closes
+    client = KeepAliveClient(f"http://127.0.0.1:{port}/", max_retries=1, backoff=0)
+    with pytest.raises(TurnstileUnavailable):
+        _verify(client, "token")
+    assert client.stats["requests"] == 2
+
+
+def test_read_timeout_is_not_retried(server):
+    client = _client(server, read_timeout=0.1, max_retries=2)
+    with pytest.raises(TurnstileUnavailable, match="timed out"):
+        _verify(client, "slow-1")
+    assert client.stats["requests"] == 1
+
+
+def test_connection_closed_while_idle_is_replaced_transparently(server):
+    client = _client(server, max_retries=0)
+    _verify(client, "token-1")
+    conn, _ = client._idle.queue[0]
+    conn.sock.shutdown(socket.SHUT_RDWR)  # as if the server dropped it between invocations
+
+    assert _verify(client, "token-2")["success"] is True
+    assert client.stats["connections"] == 2
+    assert client.stats["retries"] == 0
+
+
+def test_idle_connections_past_idle_timeout_are_not_reused(server):
+    client = _client(server, idle_timeout=0)
+    _verify(client, "token-1")
+    _verify(client, "token-2")
+    assert client.stats["connections"] == 2
+
+
+def test_prewarm_opens_the_first_connection(server):
+    client = _client(server)
+    client.prewarm()
+    _verify(client, "token-1")
+    assert client.stats["connections"] == 1
+
+
+# ────────────────────────────  Lambda Tests  ──────────────────────────── #
+
+def _event(token):
+    return {"body": json.dumps({"token": token}), "requestContext": {"http": {"sourceIp": "192.0.2.1"}}}
+
+
+@pytest.fixture
+def cf_turnstile_lambda(mocker):
+    mocker.patch.dict("os.environ", {"TURNSTILE_SECRET_KEY": "dummy_secret"})
+    import cf_turnstile_lambda
+
+    mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_SECRET_KEY", "dummy_secret")
+    return cf_turnstile_lambda
+
+
+def test_lambda_handler_verifies_against_the_stand_in(cf_turnstile_lambda, server, mocker):
+    mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_CLIENT", _client(server))
+
+    assert cf_turnstile_lambda.lambda_handler(_event("token-1"), None)["statusCode"] == 200
+    response = cf_turnstile_lambda.lambda_handler(_event("fail-1"), None)
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["error_codes"] == ["invalid-input-response"]
+
+
+def test_lambda_handler_answers_502_when_turnstile_is_unavailable(cf_turnstile_lambda, server, mocker):
+    mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_CLIENT", _client(server, max_retries=0))
+
+    assert cf_turnstile_lambda.lambda_handler(_event("error-1"), None)["statusCode"] == 502
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from unittest.mock import MagicMock
+
+from turnstile_stand_in import TurnstileStandIn
+from turnstile_client import KeepAliveClient
+from turnstile_verdicts import DUPLICATE, LocalVerdictBackend, VerdictCache, is_definitive, token_key
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+SUCCESS = {"success": True, "hostname": "localhost"}
+REJECTED = {"success": False, "error-codes": ["invalid-input-response"]}
+
+
+def test_replayed_success_is_answered_as_duplicate():
+    cache = VerdictCache(clock=Clock())
+    assert cache.replay("token") is None
+    cache.record("token", SUCCESS)
+
+    assert cache.replay("token") == {"success": False, "error-codes": [DUPLICATE]}
+    assert cache.replay("token") == {"success": False, "error-codes": [DUPLICATE]}
+
+
+def test_replayed_rejection_keeps_its_error_codes():
+    cache = VerdictCache(clock=Clock())
+    cache.record("token", REJECTED)
+    assert cache.replay("token") == REJECTED
+
+
+@pytest.mark.parametrize("codes", [["internal-error"], ["invalid-input-secret"], ["bad-request"], []])
+def test_non_definitive_answers_are_not_cached(codes):
+    cache = VerdictCache(clock=Clock())
+    result = {"success": False, "error-codes": codes}
+    assert not is_definitive(result)
+    cache.record("token", result)
+    assert cache.replay("token") is None
+
+
+def test_verdicts_expire_with_the_token_validity_window():
+    clock = Clock()
+    cache = VerdictCache(clock=clock)
+    cache.record("token", SUCCESS)
+    clock.now += 299
+    assert cache.replay("token") is not None
+    clock.now += 2
+    assert cache.replay("token") is None
+
+
+def test_shared_layer_answers_replays_seen_by_other_containers():
+    clock, shared = Clock(), LocalVerdictBackend()
+    VerdictCache(shared=shared, clock=clock).record("token", SUCCESS)
+    other = VerdictCache(shared=shared, clock=clock)
+
+    assert other.replay("token")["error-codes"] == [DUPLICATE]
+    assert other.stats["shared_hits"] == 1
+    assert list(shared.items) == [token_key("token")]  # only the hash is stored
+    clock.now += 301
+    assert other.replay("token") is None  # keeps the shared expiry, not a fresh TTL
+
+
+def test_shared_layer_errors_are_misses():
+    shared = MagicMock()
+    shared.get.side_effect = RuntimeError("throttled")
+    shared.put.side_effect = RuntimeError("throttled")
+    cache = VerdictCache(shared=shared, clock=Clock())
+
+    assert cache.replay("token") is None
+    cache.record("token", SUCCESS)
+    assert cache.stats["shared_errors"] == 2
+    assert cache.replay("token")["error-codes"] == [DUPLICATE]  # the memory layer still has it
+
+
+# ────────────────────────────  Lambda Tests  ──────────────────────────── #
+
+@pytest.fixture
+def cf_turnstile_lambda(mocker):
+    mocker.patch.dict("os.environ", {"TURNSTILE_SECRET_KEY": "dummy_secret"})
+    import cf_turnstile_lambda
+
+    mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_SECRET_KEY", "dummy_secret")
+    mocker.patch.object(cf_turnstile_lambda, "VERDICT_CACHE", VerdictCache())
+    return cf_turnstile_lambda
+
+
+def _event(token):
+    return {"body": json.dumps({"token": token}), "requestContext": {"http": {"sourceIp": "192.0.2.1"}}}
+
+
+def test_handler_answers_double_submits_without_calling_cloudflare(cf_turnstile_lambda, mocker):
+    with TurnstileStandIn() as server:
+        mocker.patch.object(cf_turnstile_lambda, "TURNSTILE_CLIENT", KeepAliveClient(server.url))
+
+        first = cf_turnstile_lambda.lambda_handler(_event("token-1"), None)
+        second = cf_turnstile_lambda.lambda_handler(_event("token-1"), None)
+        rejected = [cf_turnstile_lambda.lambda_handler(_event("fail-1"), None) for _ in range(2)]
+
+    assert first["statusCode"] == 200
+    assert second["statusCode"] == 400
+    assert json.loads(second["body"])["error_codes"] == [DUPLICATE]
+    assert [json.loads(r["body"])["error_codes"] for r in rejected] == [["invalid-input-response"]] * 2
+    assert server.requests == 2
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import queue
+import random
+import ssl
+import threading
+import time
+import urllib.parse
+from typing import Any, Optional
+
+# ────────────────────────────  Keep-alive client  ─────────────────────────── #
+# Connections to the verify endpoint are kept open across warm invocations, so
+# only the first request in a container pays for the TCP and TLS handshakes.
+#
+# Every request has a connect timeout and a read timeout. Retries are bounded
+# and limited to failures where Cloudflare cannot have consumed the token:
+# refused or timed-out connects, 429/5xx answers, and a reused connection the
+# server had already closed. A read timeout is not retried, because the token
+# may have been spent and a second attempt would only get timeout-or-duplicate.
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class TurnstileUnavailable(Exception):
+    """Verification could not be completed; the caller should answer 502."""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class _ConnectFailed(Exception):
+    """Nothing was sent, so the request is safe to retry."""
+
+
+class KeepAliveClient:
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 4,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff: float = 0.05,
+        idle_timeout: float = 50.0,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        parts = urllib.parse.urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname or ""
+        self.port = parts.port
+        self.path = parts.path or "/"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context or (ssl.create_default_context() if self.scheme == "https" else None)
+        self._idle: queue.LifoQueue[tuple[http.client.HTTPConnection, float]] = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()  # batch verification sends requests from several threads
+        self.stats = {"connections": 0, "requests": 0, "retries": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    # ────────────────────────────  Connections  ──────────────────────────── #
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.connect_timeout, context=self.ssl_context
+            )
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        try:
+            conn.connect()
+        except OSError as exc:
+            conn.close()
+            raise _ConnectFailed(str(exc)) from exc
+        conn.sock.settimeout(self.read_timeout)
+        self._count("connections")
+        return conn
+
+    def _acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused)."""
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+            if time.monotonic() - last_used < self.idle_timeout:
+                return conn, True
+            conn.close()  # the server has likely dropped it already
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    def prewarm(self) -> None:
+        """Open one connection ahead of the first request; failures are only logged."""
+        try:
+            self._release(self._connect())
+        except _ConnectFailed as exc:
+            logger.warning("Could not pre-open Turnstile connection: %s", exc)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait()[0].close()
+            except queue.Empty:
+                return
+
+    # ────────────────────────────  Requests  ─────────────────────────────── #
+
+    def _request_once(self, body: bytes, headers: dict[str, str]) -> dict[str, Any]:
+        conn, reused = self._acquire()
+        try:
+            try:
+                conn.request("POST", self.path, body=body, headers=headers)
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                conn.close()  # closed while idle; the request never reached the server
+                conn, reused = self._connect(), False
+                conn.request("POST", self.path, body=body, headers=headers)
+                response = conn.getresponse()
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if response.status in RETRYABLE_STATUSES:
+            raise _RetryableStatus(response.status)
+        return json.loads(data.decode())
+
+    def post_form(self, payload: dict[str, str]) -> dict[str, Any]:
+        """POST a urlencoded form and return the JSON response."""
+        body = urllib.parse.urlencode(payload).encode()
+        headers = {"Content-Type": "application/x-www-form-urlencoded", "Connection": "keep-alive"}
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                return self._request_once(body, headers)
+            except (_ConnectFailed, _RetryableStatus) as exc:
+                if attempt == self.max_retries:
+                    raise TurnstileUnavailable(f"Turnstile request failed: {exc}") from exc
+            except (OSError, http.client.HTTPException, ValueError) as exc:
+                raise TurnstileUnavailable(f"Turnstile request failed: {exc}") from exc
+            self._count("retries")
+            time.sleep(random.uniform(0, self.backoff * 2**attempt))
+            attempt += 1
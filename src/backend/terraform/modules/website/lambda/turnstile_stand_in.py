@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+# ────────────────────────────  Local siteverify stand-in  ─────────────────── #
+# A keep-alive HTTP/1.1 server that answers like Cloudflare's siteverify, for
+# tests and benchmarks (not deployed). The token decides the answer:
+#
+#     "fail..."     {"success": false, "error-codes": ["invalid-input-response"]}
+#     "error..."    HTTP 503
+#     "slow..."     sleeps `slow_seconds` first
+#     anything else {"success": true}
+#
+# `latency` (a function returning seconds) delays every answer, to model the
+# round trip to Cloudflare.
+#
+# Each token is accepted once; repeats get "timeout-or-duplicate", as they do
+# from Cloudflare.
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    server: TurnstileStandIn
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        token = form.get("response", [""])[0]
+        with self.server.lock:
+            self.server.requests += 1
+            duplicate = token in self.server.seen
+            self.server.seen.add(token)
+
+        if self.server.latency is not None:
+            time.sleep(self.server.latency())
+        if token.startswith("slow"):
+            time.sleep(self.server.slow_seconds)
+        if token.startswith("error"):
+            self._send(503, {"success": False})
+        elif form.get("secret", [""])[0] != self.server.secret:
+            self._send(200, {"success": False, "error-codes": ["invalid-input-secret"]})
+        elif token.startswith("fail"):
+            self._send(200, {"success": False, "error-codes": ["invalid-input-response"]})
+        elif duplicate:
+            self._send(200, {"success": False, "error-codes": ["timeout-or-duplicate"]})
+        else:
+            self._send(200, {"success": True, "hostname": "localhost", "action": "", "cdata": ""})
+
+    def _send(self, status: int, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class TurnstileStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        secret: str = "dummy_secret",
+        slow_seconds: float = 1.0,
+        latency: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.secret = secret
+        self.slow_seconds = slow_seconds
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.seen: set[str] = set()
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients that timed out and hung up
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/turnstile/v0/siteverify"
+
+    def __enter__(self) -> TurnstileStandIn:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+# ────────────────────────────  Verdict cache  ─────────────────────────────── #
+# Turnstile tokens are single-use and valid for five minutes, so a token's
+# verdict never changes within that window. Verdicts are cached by the token's
+# SHA-256 (tokens themselves are never stored) and replays are answered
+# locally with what Cloudflare itself would say:
+#
+#   - a token that already verified is answered with timeout-or-duplicate,
+#     which keeps single-use semantics without another outbound call;
+#   - a rejected token gets its original error codes again.
+#
+# Only definitive verdicts are cached. Answers such as internal-error or
+# invalid-input-secret describe Cloudflare or our configuration, not the token.
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VALIDITY_SECONDS = 300
+DUPLICATE = "timeout-or-duplicate"
+DEFINITIVE_ERRORS = {"invalid-input-response", DUPLICATE}
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def is_definitive(result: dict[str, Any]) -> bool:
+    codes = result.get("error-codes") or []
+    return bool(result.get("success")) or (bool(codes) and set(codes) <= DEFINITIVE_ERRORS)
+
+
+class LocalVerdictBackend:
+    """In-process stand-in for the shared DynamoDB layer, for tests and offline runs."""
+
+    def __init__(self) -> None:
+        self.items: dict[str, tuple[float, dict[str, Any]]] = {}
+
+    def get(self, key: str, now: float) -> Optional[tuple[float, dict[str, Any]]]:
+        item = self.items.get(key)
+        return item if item and item[0] > now else None
+
+    def put(self, key: str, verdict: dict[str, Any], expires_at: float) -> None:
+        self.items[key] = (expires_at, verdict)
+
+
+class DynamoDbVerdictBackend:
+    """
+    Shared layer in a DynamoDB table with hash key TokenHash and a TTL attribute
+    ExpiresAt. Items past ExpiresAt are ignored on read, since DynamoDB deletes
+    expired items lazily.
+    """
+
+    def __init__(self, table_name: str, client: Any = None) -> None:
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("dynamodb")
+        return self._client
+
+    def get(self, key: str, now: float) -> Optional[tuple[float, dict[str, Any]]]:
+        """Returns (expires_at, verdict) or None."""
+        item = self.client.get_item(
+            TableName=self.table_name,
+            Key={"TokenHash": {"S": key}},
+            ProjectionExpression="Verdict, ExpiresAt",
+        ).get("Item")
+        if not item or float(item["ExpiresAt"]["N"]) <= now:
+            return None
+        return float(item["ExpiresAt"]["N"]), json.loads(item["Verdict"]["S"])
+
+    def put(self, key: str, verdict: dict[str, Any], expires_at: float) -> None:
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "TokenHash": {"S": key},
+                "Verdict": {"S": json.dumps(verdict)},
+                "ExpiresAt": {"N": str(round(expires_at, 3))},
+            },
+        )
+
+
+class VerdictCache:
+    """
+    An LRU dict in the warm container, backed by an optional shared layer.
+    Shared-layer failures are logged and treated as misses, so the cache can
+    never fail a verification.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_seconds: float = TOKEN_VALIDITY_SECONDS,
+        shared: Any = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.clock = clock
+        self._memory: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()  # batch verification uses the cache from several threads
+        self.stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+
+    def _remember(self, key: str, verdict: dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, verdict)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _verdict(self, key: str, now: float) -> Optional[dict[str, Any]]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item and item[0] > now:
+                self.stats["memory_hits"] += 1
+                return item[1]
+            self._memory.pop(key, None)
+        if self.shared is not None:
+            try:
+                shared = self.shared.get(key, now)
+            except Exception as exc:
+                logger.error("Verdict cache shared lookup failed: %s", exc)
+                self._count("shared_errors")
+                shared = None
+            if shared is not None:
+                self._count("shared_hits")
+                self._remember(key, shared[1], shared[0])
+                return shared[1]
+        self._count("misses")
+        return None
+
+    def replay(self, token: str) -> Optional[dict[str, Any]]:
+        """The answer for a token seen before, or None when Cloudflare must be asked."""
+        verdict = self._verdict(token_key(token), self.clock())
+        if verdict is None:
+            return None
+        if verdict.get("success"):
+            return {"success": False, "error-codes": [DUPLICATE]}
+        return {"success": False, "error-codes": verdict.get("error-codes", [])}
+
+    def record(self, token: str, result: dict[str, Any]) -> None:
+        """Remember Cloudflare's answer for a token, if it is definitive."""
+        if not is_definitive(result):
+            return
+        verdict = {"success": bool(result.get("success")), "error-codes": result.get("error-codes") or []}
+        key, expires_at = token_key(token), self.clock() + self.ttl_seconds
+        self._remember(key, verdict, expires_at)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, verdict, expires_at)
+            except Exception as exc:
+                logger.error("Verdict cache shared write failed: %s", exc)
+                self._count("shared_errors")
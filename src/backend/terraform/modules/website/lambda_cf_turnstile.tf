@@ -8,10 +8,45 @@ resource "aws_iam_role_policy_attachment" "cf_turnstile_lambda_attach" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+resource "aws_iam_role_policy" "cf_turnstile_verdicts" {
+  name = "cf-turnstile-verdicts"
+  role = aws_iam_role.cf_turnstile_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["dynamodb:GetItem", "dynamodb:PutItem"]
+        Resource = aws_dynamodb_table.turnstile_verdicts.arn
+      }
+    ]
+  })
+}
+
 data "archive_file" "cf_turnstile_lambda_zip" {
   type        = "zip"
-  source_file = "${path.module}/lambda/cf_turnstile_lambda.py"
   output_path = "${path.module}/lambda_cf_turnstile.zip"
+
+  source {
+    content  = file("${path.module}/lambda/cf_turnstile_lambda.py")
+    filename = "cf_turnstile_lambda.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/structured_logging.py")
+    filename = "structured_logging.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/turnstile_client.py")
+    filename = "turnstile_client.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/turnstile_verdicts.py")
+    filename = "turnstile_verdicts.py"
+  }
 }
 
 resource "aws_lambda_function" "cf_turnstile_lambda" {
@@ -27,11 +62,24 @@ resource "aws_lambda_function" "cf_turnstile_lambda" {
     variables = {
       ENVIRONMENT            = var.environment
       LOG_LEVEL              = var.environment == "prod" ? "ERROR" : "INFO"
+      LOG_SAMPLE_RATES       = "DEBUG=0.01"
       TURNSTILE_SECRET_KEY = var.turnstile_secret_key
+      # Worst case for one token: 3 connects of 2 s plus one 4 s read
+      TURNSTILE_CONNECT_TIMEOUT = "2"
+      TURNSTILE_READ_TIMEOUT    = "4"
+      TURNSTILE_MAX_RETRIES     = "2"
+      TURNSTILE_PREWARM         = "1" # open the keep-alive connection during init
+      TURNSTILE_VERDICT_TABLE   = aws_dynamodb_table.turnstile_verdicts.name
+      # Two rounds of worst-case verifications (2 x 10 s) fit in the 20 s batch deadline,
+      # which leaves headroom below the 29 s function timeout
+      TURNSTILE_BATCH_CONCURRENCY = "8"
+      TURNSTILE_MAX_BATCH_TOKENS  = "16"
+      TURNSTILE_BATCH_DEADLINE    = "20"
     }
   }
 
-  timeout = 10
+  # Batches run several rounds of verifications; API Gateway gives up at 30 s
+  timeout = 29
 
   tags = {
     Environment = var.environment
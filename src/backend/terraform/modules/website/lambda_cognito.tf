@@ -8,10 +8,56 @@ resource "aws_iam_role_policy_attachment" "cognito_custom_auth_lambda_attach" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# Also deployed as the OTP email queue consumer (lambda_otp_email_queue.tf)
 data "archive_file" "cognito_custom_auth_lambda_zip" {
   type        = "zip"
-  source_file = "${path.module}/lambda/cognito_custom_auth_lambda.py"
   output_path = "${path.module}/cognito_custom_auth_lambda.zip"
+
+  source {
+    content  = file("${path.module}/lambda/cognito_custom_auth_lambda.py")
+    filename = "cognito_custom_auth_lambda.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/cold_start.py") # symlink to the shared terraform/lambda/cold_start.py
+    filename = "cold_start.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/otp_email_queue.py")
+    filename = "otp_email_queue.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/otp_email_templates.py")
+    filename = "otp_email_templates.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/otp_rate_limiter.py")
+    filename = "otp_rate_limiter.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/structured_logging.py")
+    filename = "structured_logging.py"
+  }
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/lambda/templates", "*")
+    content {
+      content  = file("${path.module}/lambda/templates/${source.value}")
+      filename = "templates/${source.value}"
+    }
+  }
+}
+
+# Rendered by SES from the same files the Lambda renders locally
+resource "aws_ses_template" "otp_email" {
+  name    = "${var.environment}-mine-bitcoin-online-otp-email"
+  subject = trimspace(file("${path.module}/lambda/templates/otp_email_subject.txt"))
+  html    = file("${path.module}/lambda/templates/otp_email.html")
+  text    = file("${path.module}/lambda/templates/otp_email.txt")
 }
 
 resource "aws_lambda_function" "cognito_custom_auth_lambda" {
@@ -27,6 +73,17 @@ resource "aws_lambda_function" "cognito_custom_auth_lambda" {
     variables = {
       ENVIRONMENT = var.environment
       LOG_LEVEL = var.environment == "prod" ? "ERROR" : "INFO"
+      LOG_SAMPLE_RATES = "DEBUG=0.01" # fraction of records kept per level, WARNING and above always
+      COLD_START_PROFILE = "0" # "1" logs import and client construction timings
+      OTP_DISPATCH = var.otp_dispatch_mode
+      OTP_QUEUE_URL = aws_sqs_queue.otp_email.url
+      OTP_SES_TEMPLATE = aws_ses_template.otp_email.name
+      OTP_RATE_LIMIT_TABLE = aws_dynamodb_table.otp_rate_limit.name
+      OTP_EMAIL_BURST = "5"            # OTPs per email address...
+      OTP_EMAIL_REFILL_SECONDS = "180" # ...then one more every 3 minutes
+      OTP_IP_BURST = "20"
+      OTP_IP_REFILL_SECONDS = "30"
+      MAX_CHALLENGE_ATTEMPTS = "3"     # wrong codes per sign-in before it fails
     }
   }
 
@@ -47,7 +104,8 @@ resource "aws_iam_role_policy" "lambda_ses_send" {
         Effect   = "Allow"
         Action   = [
           "ses:SendEmail",
-          "ses:SendRawEmail"
+          "ses:SendRawEmail",
+          "ses:SendTemplatedEmail"
         ]
         Resource = "*"
       }
@@ -55,6 +113,25 @@ resource "aws_iam_role_policy" "lambda_ses_send" {
   })
 }
 
+resource "aws_iam_role_policy" "lambda_otp_rate_limit" {
+  name = "lambda-otp-rate-limit"
+  role = aws_iam_role.cognito_custom_auth_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = [
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem"
+        ]
+        Resource = aws_dynamodb_table.otp_rate_limit.arn
+      }
+    ]
+  })
+}
+
 resource "aws_lambda_permission" "cognito_custom_auth_lambda" {
   statement_id  = "AllowExecutionFromCognito"
   action        = "lambda:InvokeFunction"
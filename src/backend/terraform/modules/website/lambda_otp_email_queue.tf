@@ -0,0 +1,125 @@
+resource "aws_sqs_queue" "otp_email_dlq" {
+  name                      = "${var.environment}-mine-bitcoin-online-otp-email-dlq"
+  message_retention_seconds = 345600 # 4 days
+  sqs_managed_sse_enabled   = true
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_sqs_queue" "otp_email" {
+  name                       = "${var.environment}-mine-bitcoin-online-otp-email"
+  message_retention_seconds  = 900 # codes expire long before this
+  visibility_timeout_seconds = 60  # must cover the consumer timeout
+  sqs_managed_sse_enabled    = true # messages carry one-time codes
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.otp_email_dlq.arn
+    maxReceiveCount     = 5
+  })
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_iam_role_policy" "cognito_otp_email_enqueue" {
+  name = "otp-email-enqueue"
+  role = aws_iam_role.cognito_custom_auth_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["sqs:SendMessage"]
+        Resource = aws_sqs_queue.otp_email.arn
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role" "otp_email_consumer_lambda_role" {
+  name               = "${var.environment}-mine-bitcoin-online-otp-email-consumer-lambda-role"
+  assume_role_policy = data.aws_iam_policy_document.lambda_trust.json
+}
+
+resource "aws_iam_role_policy_attachment" "otp_email_consumer_lambda_attach" {
+  role       = aws_iam_role.otp_email_consumer_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_iam_role_policy" "otp_email_consumer" {
+  name = "otp-email-consumer"
+  role = aws_iam_role.otp_email_consumer_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.otp_email.arn
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["ses:SendEmail", "ses:SendRawEmail", "ses:SendTemplatedEmail", "ses:SendBulkTemplatedEmail"]
+        Resource = "*"
+      }
+    ]
+  })
+}
+
+# Same package as the Cognito trigger, so the consumer sends with send_otp_emails
+resource "aws_lambda_function" "otp_email_consumer_lambda" {
+  function_name = "${var.environment}-mine-bitcoin-online-otp-email-consumer-lambda"
+  role          = aws_iam_role.otp_email_consumer_lambda_role.arn
+  handler       = "otp_email_queue.lambda_handler"
+  runtime       = "python3.11"
+  timeout       = 30
+
+  filename         = data.archive_file.cognito_custom_auth_lambda_zip.output_path
+  source_code_hash = data.archive_file.cognito_custom_auth_lambda_zip.output_base64sha256
+
+  environment {
+    variables = {
+      ENVIRONMENT          = var.environment
+      LOG_LEVEL            = var.environment == "prod" ? "ERROR" : "INFO"
+      LOG_SAMPLE_RATES     = "DEBUG=0.01"
+      OTP_SEND_ATTEMPTS    = "3"
+      OTP_SEND_CONCURRENCY = "5"
+      OTP_SES_TEMPLATE     = aws_ses_template.otp_email.name
+    }
+  }
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "otp_email_consumer" {
+  event_source_arn                   = aws_sqs_queue.otp_email.arn
+  function_name                      = aws_lambda_function.otp_email_consumer_lambda.arn
+  batch_size                         = 10
+  maximum_batching_window_in_seconds = 0 # send immediately; a login is waiting
+  function_response_types            = ["ReportBatchItemFailures"]
+}
+
+resource "aws_cloudwatch_log_group" "otp_email_consumer_lambda_log_group" {
+  name              = "/aws/lambda/${aws_lambda_function.otp_email_consumer_lambda.function_name}"
+  retention_in_days = 7
+
+  lifecycle {
+    prevent_destroy = false
+  }
+
+  depends_on = [aws_lambda_function.otp_email_consumer_lambda]
+}
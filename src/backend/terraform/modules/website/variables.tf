@@ -43,3 +43,14 @@ variable "turnstile_api_rate_limit" {
   type        = number
   default     = 5
 }
+
+variable "otp_dispatch_mode" {
+  description = "How CreateAuthChallenge sends the OTP email: \"sync\" calls SES directly, \"queue\" enqueues it for the OTP email consumer"
+  type        = string
+  default     = "sync"
+
+  validation {
+    condition     = contains(["sync", "queue"], var.otp_dispatch_mode)
+    error_message = "otp_dispatch_mode must be \"sync\" or \"queue\"."
+  }
+}
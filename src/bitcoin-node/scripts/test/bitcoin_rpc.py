@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Minimal bitcoind JSON-RPC client that keeps one HTTP connection alive per node."""
+
+import base64
+import http.client
+import itertools
+import json
+import os
+import queue
+import threading
+
+# Network name -> RPC port of each bitcoind instance
+RPC_PORTS = {
+    "mainnet": 8332,
+    "testnet": 18332,
+    "regtest": 18443,
+}
+
+# rpcuser from each node's bitcoin.conf (see README.md)
+RPC_USERS = {
+    "mainnet": "piBtcNode01",
+    "testnet": "piBtcNode01-testnet",
+    "regtest": "piBtcNode01-regtest",
+}
+
+
+class RpcError(Exception):
+    """An error returned by bitcoind (or an HTTP level failure)."""
+
+    def __init__(self, code, message):
+        super().__init__(f"RPC error {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class RpcClient:
+    """
+    JSON-RPC over a single persistent HTTP/1.1 connection.
+
+    bitcoind keeps connections alive, so after the first call each request skips
+    the TCP handshake. Calls are serialized with a lock, which makes one client
+    safe to share between threads; use one client per node.
+    """
+
+    def __init__(self, host, port, user, password, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        token = base64.b64encode(f"{user}:{password}".encode()).decode()
+        self._headers = {"Authorization": f"Basic {token}", "Content-Type": "application/json"}
+        self._conn = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def _post(self, body):
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request("POST", "/", body, self._headers)
+                response = self._conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # bitcoind closed the idle connection (or restarted); reconnect once
+                self.close()
+                if attempt:
+                    raise
+
+    def call(self, method, *params):
+        """Calls method and returns its result, raising RpcError on failure."""
+        body = json.dumps({"jsonrpc": "1.0", "id": next(self._ids), "method": method, "params": list(params)})
+        with self._lock:
+            status, data = self._post(body)
+
+        if status == 401:
+            raise RpcError(status, "Unauthorized, check the RPC user and password")
+        try:
+            reply = json.loads(data)
+        except json.JSONDecodeError:
+            raise RpcError(status, data[:200].decode(errors="replace"))
+        if reply.get("error"):
+            raise RpcError(reply["error"].get("code"), reply["error"].get("message"))
+        return reply["result"]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RpcPool:
+    """
+    A fixed set of clients for one node, so independent calls (several
+    submitblock at once) run in parallel while every connection stays alive.
+    bitcoind works on rpcthreads (default 4) requests at a time; a bigger pool
+    only queues on the node instead of here.
+    """
+
+    def __init__(self, clients):
+        self._clients = list(clients)
+        self._idle = queue.Queue()
+        for client in self._clients:
+            self._idle.put(client)
+
+    def call(self, method, *params):
+        client = self._idle.get()
+        try:
+            return client.call(method, *params)
+        finally:
+            self._idle.put(client)
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+
+
+def client_for(network, host="127.0.0.1", timeout=30):
+    """
+    Builds the client for a network. Credentials come from
+    BITCOIN_RPC_USER_<NETWORK> / BITCOIN_RPC_PASSWORD_<NETWORK>.
+    """
+    suffix = network.upper()
+    return RpcClient(
+        host,
+        RPC_PORTS[network],
+        os.getenv(f"BITCOIN_RPC_USER_{suffix}", RPC_USERS[network]),
+        os.getenv(f"BITCOIN_RPC_PASSWORD_{suffix}", ""),
+        timeout=timeout,
+    )
+
+
+def pool_for(network, host="127.0.0.1", size=4, timeout=30):
+    """An RpcPool of `size` clients built like client_for()."""
+    return RpcPool([client_for(network, host, timeout) for _ in range(size)])
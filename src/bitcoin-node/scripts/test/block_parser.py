@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""
+Zero-copy decoding of serialized blocks and transactions.
+
+Everything here works on any buffer (bytes, bytearray, memoryview or a zmq.Frame
+received with copy=False) and only reads the bytes it needs, so a multi-MB
+rawblock body is never copied just to look at its header.
+"""
+
+import hashlib
+import struct
+from dataclasses import dataclass
+
+HEADER_SIZE = 80
+
+# version, prev block hash, merkle root, time, bits, nonce (all little-endian)
+_HEADER = struct.Struct("<i32s32sIII")
+
+
+@dataclass(frozen=True)
+class BlockHeader:
+    version: int
+    prev_hash: str    # big-endian hex, as shown by bitcoin-cli
+    merkle_root: str  # big-endian hex
+    time: int
+    bits: int
+    nonce: int
+    hash: str         # big-endian hex
+    tx_count: int | None = None
+
+    def to_dict(self):
+        return {
+            "hash": self.hash,
+            "version": self.version,
+            "prev_hash": self.prev_hash,
+            "merkle_root": self.merkle_root,
+            "time": self.time,
+            "bits": f"{self.bits:08x}",
+            "nonce": self.nonce,
+            "tx_count": self.tx_count,
+        }
+
+
+def as_view(data):
+    """Returns a read-only memoryview over data without copying it."""
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    return view.cast("B") if view.format != "B" or view.ndim != 1 else view
+
+
+def sha256d(data):
+    """Double SHA256 of a buffer."""
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def read_varint(buf, offset=0):
+    """Decodes the CompactSize integer at offset. Returns (value, next offset)."""
+    try:
+        first = buf[offset]
+        if first < 0xfd:
+            return first, offset + 1
+        if first == 0xfd:
+            return struct.unpack_from("<H", buf, offset + 1)[0], offset + 3
+        if first == 0xfe:
+            return struct.unpack_from("<I", buf, offset + 1)[0], offset + 5
+        return struct.unpack_from("<Q", buf, offset + 1)[0], offset + 9
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Truncated varint at offset {offset}") from e
+
+
+def parse_block_header(data, with_tx_count=True):
+    """
+    Decodes the 80 byte header at the start of a serialized block.
+
+    When with_tx_count is set and the buffer continues past the header, the
+    transaction count varint that follows it is decoded as well.
+    """
+    view = as_view(data)
+    if len(view) < HEADER_SIZE:
+        raise ValueError(f"Block data too short for a header: {len(view)} bytes")
+
+    version, prev_hash, merkle_root, timestamp, bits, nonce = _HEADER.unpack_from(view)
+    tx_count = None
+    if with_tx_count and len(view) > HEADER_SIZE:
+        tx_count, _ = read_varint(view, HEADER_SIZE)
+
+    return BlockHeader(
+        version=version,
+        prev_hash=prev_hash[::-1].hex(),
+        merkle_root=merkle_root[::-1].hex(),
+        time=timestamp,
+        bits=bits,
+        nonce=nonce,
+        hash=sha256d(view[:HEADER_SIZE])[::-1].hex(),
+        tx_count=tx_count,
+    )
+
+
+@dataclass(frozen=True)
+class Transaction:
+    txid: str   # big-endian hex
+    wtxid: str  # big-endian hex, equal to txid for legacy transactions
+    version: int
+    locktime: int
+    size: int
+    vsize: int
+    weight: int
+    input_count: int
+    output_count: int
+    value_out: int  # satoshis
+    segwit: bool
+
+    def to_dict(self):
+        return {
+            "txid": self.txid,
+            "wtxid": self.wtxid,
+            "version": self.version,
+            "locktime": self.locktime,
+            "size": self.size,
+            "vsize": self.vsize,
+            "weight": self.weight,
+            "inputs": self.input_count,
+            "outputs": self.output_count,
+            "value_out": self.value_out,
+            "segwit": self.segwit,
+        }
+
+
+def parse_transaction(data, offset=0):
+    """
+    Decodes the serialized transaction starting at offset. Returns (Transaction, next offset).
+
+    Scripts and witnesses are skipped over rather than copied, and the txid is
+    hashed straight from slices of the buffer, so this can walk the transactions
+    of a whole block by feeding the returned offset back in.
+    """
+    view = as_view(data)
+    start = offset
+    try:
+        version = struct.unpack_from("<i", view, offset)[0]
+        offset += 4
+        segwit = len(view) > offset + 1 and view[offset] == 0 and view[offset + 1] == 1
+        if segwit:
+            offset += 2  # marker and flag
+
+        body_start = offset
+        input_count, offset = read_varint(view, offset)
+        for _ in range(input_count):
+            offset += 36  # prevout hash and index
+            script_len, offset = read_varint(view, offset)
+            offset += script_len + 4  # scriptSig and sequence
+
+        output_count, offset = read_varint(view, offset)
+        value_out = 0
+        for _ in range(output_count):
+            value_out += struct.unpack_from("<q", view, offset)[0]
+            script_len, offset = read_varint(view, offset + 8)
+            offset += script_len
+        body_end = offset
+
+        if segwit:
+            for _ in range(input_count):
+                item_count, offset = read_varint(view, offset)
+                for _ in range(item_count):
+                    item_len, offset = read_varint(view, offset)
+                    offset += item_len
+
+        locktime = struct.unpack_from("<I", view, offset)[0]
+        offset += 4
+    except struct.error as e:
+        raise ValueError(f"Truncated transaction at offset {start}") from e
+    if offset > len(view):
+        raise ValueError(f"Truncated transaction at offset {start}")
+
+    wtxid = sha256d(view[start:offset])
+    if segwit:
+        # txid commits to the serialization without marker, flag and witnesses
+        legacy = hashlib.sha256(view[start:start + 4])
+        legacy.update(view[body_start:body_end])
+        legacy.update(view[offset - 4:offset])
+        txid = hashlib.sha256(legacy.digest()).digest()
+        base_size = 8 + body_end - body_start
+    else:
+        txid = wtxid
+        base_size = offset - start
+
+    size = offset - start
+    weight = base_size * 3 + size
+    return Transaction(
+        txid=txid[::-1].hex(),
+        wtxid=wtxid[::-1].hex(),
+        version=version,
+        locktime=locktime,
+        size=size,
+        vsize=(weight + 3) // 4,
+        weight=weight,
+        input_count=input_count,
+        output_count=output_count,
+        value_out=value_out,
+        segwit=segwit,
+    ), offset
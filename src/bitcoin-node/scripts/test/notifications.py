@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Decoding of bitcoind ZMQ notifications.
+
+bitcoind publishes every notification as three frames: topic, body and a 4 byte
+little-endian sequence number that is incremented per topic. A gap in those
+numbers means notifications were dropped (e.g. the high water mark was hit).
+"""
+
+import struct
+from dataclasses import dataclass
+
+from block_parser import HEADER_SIZE, as_view, parse_block_header, parse_transaction
+
+TOPICS = ("rawblock", "hashblock", "rawtx", "sequence")
+
+# Labels used in the body of 'sequence' notifications
+SEQUENCE_LABELS = {
+    "C": "block_connected",
+    "D": "block_disconnected",
+    "A": "tx_added",
+    "R": "tx_removed",
+}
+
+
+@dataclass(frozen=True)
+class Notification:
+    topic: str
+    payload: dict
+    sequence: int | None = None
+
+
+def decode_rawblock(body):
+    """Header fields of a full block; the body is left untouched in the frame."""
+    if len(body) < HEADER_SIZE:
+        raise ValueError("Received incomplete rawblock data.")
+    payload = parse_block_header(body).to_dict()
+    payload["size"] = len(body)
+    return payload
+
+
+def decode_hashblock(body):
+    """hashblock carries only the block hash, already in display byte order."""
+    if len(body) != 32:
+        raise ValueError(f"Unexpected hashblock length: {len(body)}")
+    return {"hash": body.hex()}
+
+
+def decode_rawtx(body):
+    tx, end = parse_transaction(body)
+    if end != len(body):
+        raise ValueError(f"{len(body) - end} trailing bytes after rawtx")
+    return tx.to_dict()
+
+
+def decode_sequence(body):
+    """<32 byte hash><label>[<8 byte mempool sequence> for A/R labels]"""
+    if len(body) not in (33, 41):
+        raise ValueError(f"Unexpected sequence length: {len(body)}")
+    label = chr(body[32])
+    payload = {"hash": body[:32].hex(), "event": SEQUENCE_LABELS.get(label, label)}
+    if len(body) == 41:
+        payload["mempool_sequence"] = struct.unpack_from("<Q", body, 33)[0]
+    return payload
+
+
+DECODERS = {
+    "rawblock": decode_rawblock,
+    "hashblock": decode_hashblock,
+    "rawtx": decode_rawtx,
+    "sequence": decode_sequence,
+}
+
+
+def decode_notification(frames):
+    """
+    Decodes a multipart message (bytes or zmq.Frames).
+
+    Returns None for topics without a decoder and raises ValueError for
+    malformed messages.
+    """
+    if len(frames) not in (2, 3):
+        raise ValueError(f"Unexpected ZMQ message format: {len(frames)} frames")
+
+    topic = as_view(frames[0]).tobytes().decode(errors="replace")
+    decoder = DECODERS.get(topic)
+    if decoder is None:
+        return None
+
+    sequence = None
+    if len(frames) == 3:
+        seq_frame = as_view(frames[2])
+        if len(seq_frame) != 4:
+            raise ValueError(f"Unexpected sequence frame length: {len(seq_frame)}")
+        sequence = struct.unpack_from("<I", seq_frame)[0]
+
+    return Notification(topic, decoder(as_view(frames[1])), sequence)
+
+
+class SequenceTracker:
+    """Remembers the last sequence number per topic to detect dropped notifications."""
+
+    def __init__(self):
+        self._last = {}
+
+    def update(self, topic, sequence):
+        """Records sequence and returns how many notifications were missed before it."""
+        if sequence is None:
+            return 0
+        last = self._last.get(topic)
+        self._last[topic] = sequence
+        if last is None or sequence == 0:
+            # first message, or bitcoind restarted and reset its counters
+            return 0
+        return (sequence - last - 1) % 2**32
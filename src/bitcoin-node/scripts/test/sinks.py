@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Pluggable destinations for events produced by the ZMQ listener."""
+
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass(frozen=True)
+class NodeEvent:
+    """A decoded notification from one bitcoind instance."""
+    network: str
+    topic: str
+    payload: dict
+    received_at: float = field(default_factory=time.time)
+
+    def to_json(self):
+        return json.dumps(asdict(self), separators=(",", ":"), sort_keys=True)
+
+
+class StdoutSink:
+    """Prints a short human readable line per event."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, event):
+        if event.topic in ("rawblock", "hashblock"):
+            line = f"[{event.network}] Received new block. Hash: {event.payload.get('hash')}"
+        else:
+            line = f"[{event.network}] {event.topic}: {json.dumps(event.payload, sort_keys=True)}"
+        print(line, file=self.stream, flush=True)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """Appends events as JSON lines to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, event):
+        self._file.write(event.to_json() + "\n")
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class MqttSink:
+    """
+    MQTT style publisher stub.
+
+    Events are published to `<prefix>/<network>/<topic>`. Pass a `publish(topic, payload)`
+    callable (e.g. an AWS IoT client's publish) to send for real; without one the
+    messages are only printed.
+    """
+
+    def __init__(self, topic_prefix="pi-miner", publish=None):
+        self.topic_prefix = topic_prefix.rstrip("/")
+        self.publish = publish or self._print_publish
+
+    @staticmethod
+    def _print_publish(topic, payload):
+        print(f"MQTT publish {topic}: {payload}", flush=True)
+
+    def emit(self, event):
+        self.publish(f"{self.topic_prefix}/{event.network}/{event.topic}", event.to_json())
+
+    def close(self):
+        pass
+
+
+def build_sink(spec):
+    """Build a sink from a CLI spec: 'stdout', 'file:<path>' or 'mqtt[:<topic prefix>]'."""
+    kind, _, arg = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file":
+        if not arg:
+            raise ValueError("file sink needs a path, e.g. file:/home/pi/blocks.jsonl")
+        return FileSink(arg)
+    if kind == "mqtt":
+        return MqttSink(arg or "pi-miner")
+    raise ValueError(f"Unknown sink: {spec}")
+
+
+def emit_all(sinks, event):
+    """Send an event to every sink; one failing sink must not stop the others."""
+    for sink in sinks:
+        try:
+            sink.emit(event)
+        except Exception as e:
+            print(f"[{event.network}] Sink {type(sink).__name__} failed: {e}", file=sys.stderr)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Batch verification of miner solutions (ADR-001 step 6).
+
+verify_batch() checks many (extra_nonce, main_nonce) submissions against one
+template per call. Merkle roots are computed once per distinct extranonce from
+the template's precomputed merkle branch, headers are built from preassembled
+fixed parts, and the 256-bit target comparison runs vectorized with numpy when
+it is installed (pure Python otherwise).
+
+Written to be shared between the Pi and the solution verification Lambda; it only
+depends on block_parser.py and template_prep.py.
+"""
+
+import struct
+
+from block_parser import sha256d
+from template_prep import PreparedTemplate, from_work_payload
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, e.g. in a slim Lambda package
+    np = None
+
+MAX_UINT32 = 0xffffffff
+
+
+def _hashes_meet_target(hashes, target):
+    """hash <= target for every internal byte order hash; returns a list of bools."""
+    if np is None or len(hashes) < 2:
+        limit = int.from_bytes(target, "big")
+        return [int.from_bytes(h, "little") <= limit for h in hashes]
+
+    # Each hash as four big-endian 64 bit words, most significant first
+    words = np.frombuffer(b"".join(h[::-1] for h in hashes), dtype=">u8").reshape(-1, 4)
+    limit = np.frombuffer(target, dtype=">u8")
+    below = np.zeros(len(hashes), dtype=bool)
+    equal = np.ones(len(hashes), dtype=bool)
+    for i in range(4):
+        below |= equal & (words[:, i] < limit[i])
+        equal &= words[:, i] == limit[i]
+    return (below | equal).tolist()
+
+
+def _uint32(submission, key):
+    value = submission.get(key)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_UINT32:
+        raise ValueError(f"{key} must be an unsigned 32-bit integer")
+    return value
+
+
+def _target_bytes(target):
+    """32 byte big-endian target from hex; raises ValueError for anything that is not a 256-bit number."""
+    try:
+        value = int(target, 16)
+    except (TypeError, ValueError):
+        raise ValueError("target must be a hex string")
+    if not 0 <= value < 2 ** 256:
+        raise ValueError("target must fit in 256 bits")
+    return value.to_bytes(32, "big")
+
+
+def verify_batch(template, submissions, target=None):
+    """
+    Verifies submissions against a template.
+
+    template is a PreparedTemplate or a JSON work payload. Each submission is a dict
+    with `extra_nonce` and `main_nonce` (and optionally `submission_id` and `curtime`).
+    target (big-endian hex) defaults to the block target; pass a share target to
+    accept easier shares. Returns one result dict per submission, in order:
+    {"submission_id", "valid", "hash", "error"}. Bad input (a malformed submission,
+    or an invalid target for all of them) is reported in "error", never raised.
+    """
+    if not isinstance(template, PreparedTemplate):
+        template = from_work_payload(template)
+    try:
+        target_bytes = _target_bytes(target or template.target)
+    except ValueError as e:
+        target_bytes, target_error = None, str(e)
+
+    header_head = struct.pack("<i", template.version) + bytes.fromhex(template.previousblockhash)[::-1]
+    bits = int(template.bits, 16)
+    merkle_roots = {}  # extra_nonce -> merkle root, shared by all nonces of that extranonce
+
+    results, hashes, hashed = [], [], []
+    for i, submission in enumerate(submissions):
+        if not isinstance(submission, dict):
+            results.append({"submission_id": None, "valid": False, "hash": None, "error": "submission must be an object"})
+            continue
+        result = {"submission_id": submission.get("submission_id"), "valid": False, "hash": None, "error": None}
+        results.append(result)
+        if target_bytes is None:
+            result["error"] = target_error
+            continue
+        try:
+            extra_nonce = _uint32(submission, "extra_nonce")
+            nonce = _uint32(submission, "main_nonce")
+            curtime = _uint32(submission, "curtime") if "curtime" in submission else template.curtime
+        except ValueError as e:
+            result["error"] = str(e)
+            continue
+
+        root = merkle_roots.get(extra_nonce)
+        if root is None:
+            root = merkle_roots[extra_nonce] = template.merkle_root(extra_nonce)
+        block_hash = sha256d(header_head + root + struct.pack("<III", curtime, bits, nonce))
+        result["hash"] = block_hash[::-1].hex()
+        hashes.append(block_hash)
+        hashed.append(i)
+
+    for i, ok in zip(hashed, _hashes_meet_target(hashes, target_bytes) if hashes else []):
+        results[i]["valid"] = ok
+        if not ok:
+            results[i]["error"] = "hash above target"
+    return results
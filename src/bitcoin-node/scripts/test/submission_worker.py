@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+"""
+Submits solved blocks from the submission queues (ADR-001 step 7).
+
+- Every network's queue is long-polled from its own thread, so an empty
+  regtest queue never delays a mainnet solution. Each ReceiveMessage takes
+  up to 10 messages.
+- The messages of a receive batch are assembled from the local template store
+  and submitted in parallel over a pool of keep-alive RPC connections to the
+  network's bitcoind.
+- Once the batch is done, its submission_status updates are written together
+  and its messages are removed with one DeleteMessageBatch call. A message
+  whose submitblock call or template lookup failed (bitcoind down, RPC
+  timeout) is not deleted, so SQS delivers it again after the visibility
+  timeout, and after a few deliveries it moves to the queue's dead-letter
+  queue. Any error is confined to its own message, never the whole batch.
+
+Messages are JSON with submission_id, template_identifier, extra_nonce and
+main_nonce (and optionally curtime), as queued by the solution verification
+Lambda.
+
+Usage:
+    export SUBMISSION_QUEUE_URLS='{"mainnet": "https://sqs...", "testnet": "https://sqs..."}'
+    export SUBMISSION_STATUS_TABLE_NAME=dev-submission-status
+    python3 submission_worker.py --store /home/pi/templates.db
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+import bitcoin_rpc
+from block_parser import sha256d
+from template_store import TemplateStore
+
+MAX_MESSAGES = 10  # SQS limit for ReceiveMessage and DeleteMessageBatch
+MAX_UINT32 = 0xffffffff
+RECEIVE_ERROR_BACKOFF = 5
+
+# NodeStatus values written to the submission_status table
+ACCEPTED = "Accepted"
+REJECTED = "Rejected"
+NOT_FOUND = "Node Data Not Found"
+INVALID = "Invalid Submission"
+
+# submitblock answers that mean the node has the block; anything else is a reject reason
+ACCEPTED_RESULTS = {None, "duplicate"}
+
+
+class Outcome:
+    """What happened to one message: whether to delete it, and the status update to write (if any)."""
+
+    def __init__(self, delete, submission_id=None, node_status=None, reject_reason=None, block_hash=None):
+        self.delete = delete
+        self.submission_id = submission_id
+        self.node_status = node_status
+        self.reject_reason = reject_reason
+        self.block_hash = block_hash
+
+
+def parse_submission(body):
+    """Decodes a queued submission; raises ValueError when it can never be submitted."""
+    try:
+        submission = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"message is not JSON: {e}")
+    if not isinstance(submission, dict):
+        raise ValueError("message is not a JSON object")
+    for key in ("submission_id", "template_identifier"):
+        if not isinstance(submission.get(key), str) or not submission[key]:
+            raise ValueError(f"{key} is required")
+    for key in ("extra_nonce", "main_nonce", "curtime"):
+        value = submission.get(key)
+        if key == "curtime" and value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_UINT32:
+            raise ValueError(f"{key} must be an unsigned 32-bit integer")
+    return submission
+
+
+def submit(body, store, rpc):
+    """Assembles and submits the block for one message."""
+    try:
+        submission = parse_submission(body)
+    except ValueError as e:
+        try:
+            submission_id = json.loads(body).get("submission_id")
+        except (json.JSONDecodeError, AttributeError):
+            submission_id = None
+        return Outcome(True, submission_id if isinstance(submission_id, str) else None, INVALID, str(e))
+
+    submission_id = submission["submission_id"]
+    try:
+        prepared = store.get(submission["template_identifier"])
+    except Exception as e:
+        # e.g. a locked or unreadable store; the message is delivered again later
+        print(f"Template lookup failed for {submission_id}, leaving it queued: {e}")
+        return Outcome(False)
+    if prepared is None:
+        return Outcome(True, submission_id, NOT_FOUND)
+
+    extra_nonce, nonce, curtime = submission["extra_nonce"], submission["main_nonce"], submission.get("curtime")
+    try:
+        block = prepared.block(extra_nonce, nonce, curtime)
+    except Exception as e:
+        # assembly is deterministic, so this message would fail the same way every time
+        print(f"[{prepared.network}] Could not assemble the block for {submission_id}: {e}")
+        return Outcome(True, submission_id, INVALID, f"block assembly failed: {e}")
+    block_hash = sha256d(block[:80])[::-1].hex()
+    try:
+        result = rpc.call("submitblock", block.hex())
+    except (bitcoin_rpc.RpcError, OSError) as e:
+        print(f"[{prepared.network}] submitblock failed for {submission_id}, leaving it queued: {e}")
+        return Outcome(False)
+
+    if result in ACCEPTED_RESULTS:
+        print(f"[{prepared.network}] Block {block_hash} submitted for {submission_id} ({result or 'accepted'})")
+        return Outcome(True, submission_id, ACCEPTED, block_hash=block_hash)
+    print(f"[{prepared.network}] Block {block_hash} rejected for {submission_id}: {result}")
+    return Outcome(True, submission_id, REJECTED, result)
+
+
+class StatusWriter:
+    """
+    Writes NodeStatus for a batch of submissions. DynamoDB's BatchWriteItem can
+    only replace whole items, which would drop what the verification Lambda
+    stored, so a batch is written as concurrent UpdateItem calls instead.
+    """
+
+    def __init__(self, table_name, dynamodb, max_workers=MAX_MESSAGES):
+        self.table_name = table_name
+        self.dynamodb = dynamodb
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def _update(self, outcome, processed_at):
+        assignments = ["NodeStatus = :status", "NodeProcessedAt = :processed"]
+        values = {":status": {"S": outcome.node_status}, ":processed": {"N": str(int(processed_at))}}
+        if outcome.reject_reason:
+            assignments.append("NodeRejectReason = :reason")
+            values[":reason"] = {"S": outcome.reject_reason}
+        if outcome.block_hash:
+            assignments.append("AcceptedBlockHash = :hash")
+            values[":hash"] = {"S": outcome.block_hash}
+        self.dynamodb.update_item(
+            TableName=self.table_name,
+            Key={"SubmissionID": {"S": outcome.submission_id}},
+            UpdateExpression="SET " + ", ".join(assignments),
+            ExpressionAttributeValues=values,
+        )
+
+    def write(self, outcomes):
+        """Writes every outcome that carries a status; returns the outcomes whose write failed."""
+        now = time.time()
+        futures = {
+            self._executor.submit(self._update, o, now): o for o in outcomes if o.submission_id and o.node_status
+        }
+        failed = []
+        for future, outcome in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Submission status update failed for {outcome.submission_id}: {e}")
+                failed.append(outcome)
+        return failed
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class QueueWorker:
+    """Long-polls one network's submission queue and submits its blocks."""
+
+    def __init__(self, network, queue_url, sqs, store, rpc, status_writer, concurrency=4, wait_seconds=20):
+        self.network = network
+        self.queue_url = queue_url
+        self.sqs = sqs
+        self.store = store
+        self.rpc = rpc
+        self.status_writer = status_writer
+        self.wait_seconds = wait_seconds
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.stats = {"received": 0, "deleted": 0, "accepted": 0, "retried": 0}
+
+    def poll_once(self):
+        """One long poll and the processing of whatever it returned; returns the number of messages."""
+        messages = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=MAX_MESSAGES,
+            WaitTimeSeconds=self.wait_seconds,
+        ).get("Messages", [])
+        if not messages:
+            return 0
+        self.stats["received"] += len(messages)
+
+        outcomes = list(self._executor.map(lambda m: submit(m["Body"], self.store, self.rpc), messages))
+        self.stats["accepted"] += sum(1 for o in outcomes if o.node_status == ACCEPTED)
+        self.stats["retried"] += sum(1 for o in outcomes if not o.delete)
+
+        # Statuses go first, and a message is only deleted once its status is stored. One that comes
+        # back is submitted again, which bitcoind answers with "duplicate".
+        unrecorded = self.status_writer.write(outcomes)
+        self._delete([m for m, o in zip(messages, outcomes) if o.delete and o not in unrecorded])
+        return len(messages)
+
+    def _delete(self, messages):
+        if not messages:
+            return
+        response = self.sqs.delete_message_batch(
+            QueueUrl=self.queue_url,
+            Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(messages)],
+        )
+        self.stats["deleted"] += len(response.get("Successful", []))
+        for failure in response.get("Failed", []):
+            print(f"[{self.network}] Could not delete message {failure.get('Id')}: {failure.get('Message')}")
+
+    def run(self, stop):
+        print(f"[{self.network}] Polling {self.queue_url}")
+        while not stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[{self.network}] Receive failed: {e}")
+                stop.wait(RECEIVE_ERROR_BACKOFF)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def run_workers(workers, stop):
+    """Runs every worker on its own thread until stop is set."""
+    threads = [
+        threading.Thread(target=worker.run, args=(stop,), name=f"submissions-{worker.network}", daemon=True)
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Submit solved blocks from the submission SQS queues.")
+    parser.add_argument("--mainnet", action="store_true", help="Poll the mainnet queue")
+    parser.add_argument("--testnet", action="store_true", help="Poll the testnet queue")
+    parser.add_argument("--regtest", action="store_true", help="Poll the regtest queue")
+    parser.add_argument("--host", default="127.0.0.1", help="Host bitcoind serves RPC on")
+    parser.add_argument("--store", required=True, metavar="PATH", help="Template store written by zmq_test.py --store")
+    parser.add_argument("--queue-urls", default=os.getenv("SUBMISSION_QUEUE_URLS", ""),
+                        help="JSON map of network to queue URL (default: $SUBMISSION_QUEUE_URLS)")
+    parser.add_argument("--status-table", default=os.getenv("SUBMISSION_STATUS_TABLE_NAME", ""),
+                        help="submission_status table name (default: $SUBMISSION_STATUS_TABLE_NAME)")
+    parser.add_argument("--rpc-connections", type=int, default=4, help="Keep-alive RPC connections per network")
+    parser.add_argument("--wait-seconds", type=int, default=20, help="SQS long poll duration (max 20)")
+
+    args = parser.parse_args(argv)
+    try:
+        queue_urls = json.loads(args.queue_urls or "{}")
+    except json.JSONDecodeError as e:
+        parser.error(f"--queue-urls is not valid JSON: {e}")
+    selected = [name for name in bitcoin_rpc.RPC_PORTS if getattr(args, name)] or list(bitcoin_rpc.RPC_PORTS)
+    args.queue_urls = {network: queue_urls[network] for network in selected if network in queue_urls}
+    if not args.queue_urls:
+        parser.error("no queue URL for the selected networks")
+    if not args.status_table:
+        parser.error("--status-table is required")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    import boto3  # only needed on the Pi; credentials come from the usual AWS chain
+
+    sqs = boto3.client("sqs")
+    store = TemplateStore(args.store)
+    status_writer = StatusWriter(args.status_table, boto3.client("dynamodb"))
+    pools = {network: bitcoin_rpc.pool_for(network, args.host, args.rpc_connections) for network in args.queue_urls}
+    workers = [
+        QueueWorker(network, url, sqs, store, pools[network], status_writer, args.rpc_connections, args.wait_seconds)
+        for network, url in args.queue_urls.items()
+    ]
+
+    stop = threading.Event()
+    threads = run_workers(workers, stop)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping after the current long polls...")
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        for worker in workers:
+            worker.close()
+            print(f"[{worker.network}] {json.dumps(worker.stats)}")
+        status_writer.close()
+        for pool in pools.values():
+            pool.close()
+        store.close()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+"""
+Refreshes block templates as soon as ZMQ reports a new block.
+
+Each network gets a TemplateRefresher. Notifications arriving within the debounce
+window (back-to-back blocks, a reorg's disconnect/connect pair) collapse into a
+single getblocktemplate call, and the time from the first notification to the
+template being available is recorded in a latency histogram.
+"""
+
+import asyncio
+import bisect
+import time
+
+from sinks import NodeEvent, emit_all
+
+TEMPLATE_REQUEST = {"rules": ["segwit"]}
+
+# Upper bounds of the latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed bucket histogram, cheap enough to update on every template."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # last bucket is overflow
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile (max_ms for overflow)."""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": dict(zip([*map(str, self.buckets_ms), "inf"], self.counts)),
+        }
+
+
+def is_block_trigger(notification):
+    """True for notifications that make the current template stale."""
+    if notification.topic in ("rawblock", "hashblock"):
+        return True
+    return notification.topic == "sequence" and notification.payload.get("event") in (
+        "block_connected", "block_disconnected"
+    )
+
+
+class TemplateRefresher:
+    """Debounced getblocktemplate fetcher for one network."""
+
+    def __init__(self, network, rpc, sinks, debounce=0.05, histogram=None, on_template=None):
+        self.network = network
+        self.rpc = rpc
+        self.sinks = sinks
+        self.debounce = debounce
+        self.histogram = histogram or LatencyHistogram()
+        self.on_template = on_template
+        self._pending_since = None
+        self._task = None
+
+    def trigger(self, received_at=None):
+        """Requests a refresh; received_at is the time.monotonic() the notification arrived."""
+        if self._pending_since is None:
+            self._pending_since = received_at if received_at is not None else time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        # Triggers during the sleep are absorbed by the fetch that follows it;
+        # triggers during a fetch set _pending_since again and cause another round.
+        while self._pending_since is not None:
+            await asyncio.sleep(self.debounce)
+            since, self._pending_since = self._pending_since, None
+            await self._fetch(since)
+
+    async def _fetch(self, since):
+        try:
+            template = await asyncio.to_thread(self.rpc.call, "getblocktemplate", TEMPLATE_REQUEST)
+        except Exception as e:
+            print(f"[{self.network}] getblocktemplate failed: {e}")
+            return
+
+        latency = time.monotonic() - since
+        self.histogram.observe(latency)
+        emit_all(self.sinks, NodeEvent(self.network, "template", {
+            "height": template.get("height"),
+            "previousblockhash": template.get("previousblockhash"),
+            "tx_count": len(template.get("transactions", [])),
+            "latency_ms": round(latency * 1000, 1),
+        }))
+        if self.on_template is not None:
+            try:
+                self.on_template(self.network, template)
+            except Exception as e:
+                print(f"[{self.network}] Template handler failed: {e}")
+
+    async def wait(self):
+        """Waits for an in-flight refresh to finish."""
+        if self._task is not None:
+            await self._task
+
+
+class TemplatePipeline:
+    """Routes block notifications from every network to that network's refresher."""
+
+    def __init__(self, refreshers):
+        self.refreshers = refreshers
+
+    def notify(self, network, notification, received_at):
+        refresher = self.refreshers.get(network)
+        if refresher is not None and is_block_trigger(notification):
+            refresher.trigger(received_at)
+
+    def notify_gap(self, network, topic, received_at):
+        # A dropped block notification may have been a new tip, so refresh to be safe
+        refresher = self.refreshers.get(network)
+        if refresher is not None and topic != "rawtx":
+            refresher.trigger(received_at)
+
+    def summary(self):
+        return {network: r.histogram.summary() for network, r in self.refreshers.items()}
+
+    def close(self):
+        for refresher in self.refreshers.values():
+            refresher.rpc.close()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+"""
+Turns a getblocktemplate result into a compact work payload for browser miners.
+
+The merkle branch (the log2(n) sibling hashes on the coinbase's path to the root)
+is computed once per template, and the coinbase is split into a prefix and suffix
+around the extranonce slot. Changing the extranonce then costs one coinbase hash
+plus len(merkle_branch) hashes instead of rebuilding the whole merkle tree:
+
+    coinbase    = prefix + extranonce (4 bytes, little-endian) + suffix
+    root        = sha256d(coinbase)
+    for sibling in merkle_branch:
+        root    = sha256d(root + sibling)
+
+Hashes in the JSON payload are big-endian hex (ADR-001); reverse them to get the
+internal byte order used above.
+
+Usage: bitcoin-cli getblocktemplate '{"rules":["segwit"]}' | \
+           python3 template_prep.py --network regtest --payout-script <hex>
+"""
+
+import argparse
+import json
+import struct
+import sys
+from dataclasses import dataclass
+
+from block_parser import sha256d
+
+EXTRANONCE_SIZE = 4
+WORK_FORMAT_VERSION = 1
+NETWORK_CODES = {"mainnet": 0, "testnet": 1, "regtest": 2}
+
+# Witness reserved value committed to by default_witness_commitment (BIP141)
+WITNESS_RESERVED_VALUE = b"\x00" * 32
+
+
+def varint(n):
+    """CompactSize encoding."""
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def script_push_int(n):
+    """Minimal script encoding of a non-negative number, as used for the BIP34 height."""
+    if n == 0:
+        return b"\x00"
+    if n <= 16:
+        return bytes([0x50 + n])  # OP_1 .. OP_16
+    data = n.to_bytes((n.bit_length() + 8) // 8, "little")  # room for the sign bit
+    return bytes([len(data)]) + data
+
+
+def merkle_branch(tx_hashes):
+    """
+    Sibling hashes on the path from the coinbase (index 0) to the merkle root.
+
+    tx_hashes are the internal byte order txids of every transaction except the coinbase.
+    """
+    branch = []
+    level = [None] + list(tx_hashes)  # None stands in for the not yet known coinbase side
+    while len(level) > 1:
+        branch.append(level[1])
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [None] + [sha256d(level[i] + level[i + 1]) for i in range(2, len(level), 2)]
+    return branch
+
+
+def merkle_root_from_branch(coinbase_hash, branch):
+    root = coinbase_hash
+    for sibling in branch:
+        root = sha256d(root + sibling)
+    return root
+
+
+def merkle_root(tx_hashes):
+    """Full merkle tree computation, the O(n) reference for merkle_branch."""
+    level = list(tx_hashes)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [sha256d(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def split_coinbase(height, value, payout_script, witness_commitment=None, tag=b""):
+    """
+    Builds the legacy (txid) serialization of the coinbase, split around the extranonce.
+
+    scriptSig = <height> <4 byte extranonce> [<tag>]
+    outputs   = value to payout_script [, witness commitment]
+    """
+    script_sig_head = script_push_int(height) + bytes([EXTRANONCE_SIZE])
+    script_sig_tail = (bytes([len(tag)]) + tag) if tag else b""
+    script_sig_len = len(script_sig_head) + EXTRANONCE_SIZE + len(script_sig_tail)
+    if not 2 <= script_sig_len <= 100:
+        raise ValueError(f"Coinbase scriptSig must be 2-100 bytes, got {script_sig_len}")
+
+    prefix = (
+        struct.pack("<i", 1)          # version
+        + varint(1)                   # one input
+        + b"\x00" * 32                # null prevout hash
+        + b"\xff\xff\xff\xff"         # prevout index
+        + varint(script_sig_len)
+        + script_sig_head
+    )
+
+    outputs = [struct.pack("<q", value) + varint(len(payout_script)) + payout_script]
+    if witness_commitment:
+        outputs.append(struct.pack("<q", 0) + varint(len(witness_commitment)) + witness_commitment)
+
+    suffix = (
+        script_sig_tail
+        + b"\xff\xff\xff\xff"         # sequence
+        + varint(len(outputs))
+        + b"".join(outputs)
+        + struct.pack("<I", 0)        # locktime
+    )
+    return prefix, suffix
+
+
+@dataclass(frozen=True)
+class PreparedTemplate:
+    template_identifier: str
+    network: str
+    height: int
+    version: int
+    previousblockhash: str  # big-endian hex
+    curtime: int
+    bits: str               # compact target, hex
+    target: str             # big-endian hex
+    coinbase_prefix: bytes
+    coinbase_suffix: bytes
+    merkle_branch: tuple    # internal byte order
+    segwit: bool
+    transactions: tuple     # raw hex of every non-coinbase transaction, in block order
+
+    def coinbase(self, extra_nonce):
+        """Legacy serialization of the coinbase for this extranonce (what the txid commits to)."""
+        return self.coinbase_prefix + struct.pack("<I", extra_nonce) + self.coinbase_suffix
+
+    def merkle_root(self, extra_nonce):
+        """Internal byte order merkle root, O(log n) hashes per extranonce."""
+        return merkle_root_from_branch(sha256d(self.coinbase(extra_nonce)), self.merkle_branch)
+
+    def header(self, extra_nonce, nonce, curtime=None):
+        """The 80 byte block header."""
+        return (
+            struct.pack("<i", self.version)
+            + bytes.fromhex(self.previousblockhash)[::-1]
+            + self.merkle_root(extra_nonce)
+            + struct.pack("<II", self.curtime if curtime is None else curtime, int(self.bits, 16))
+            + struct.pack("<I", nonce)
+        )
+
+    def block(self, extra_nonce, nonce, curtime=None):
+        """Full serialized block, ready for submitblock."""
+        coinbase = self.coinbase(extra_nonce)
+        if self.segwit:
+            # marker/flag after the version and the witness reserved value before the locktime
+            coinbase = (
+                coinbase[:4] + b"\x00\x01" + coinbase[4:-4]
+                + varint(1) + varint(len(WITNESS_RESERVED_VALUE)) + WITNESS_RESERVED_VALUE
+                + coinbase[-4:]
+            )
+        return (
+            self.header(extra_nonce, nonce, curtime)
+            + varint(1 + len(self.transactions))
+            + coinbase
+            + b"".join(bytes.fromhex(tx) for tx in self.transactions)
+        )
+
+    def to_work_payload(self):
+        """JSON friendly work description for miners (no transaction data)."""
+        return {
+            "format": WORK_FORMAT_VERSION,
+            "template_identifier": self.template_identifier,
+            "network": self.network,
+            "height": self.height,
+            "version": self.version,
+            "previousblockhash": self.previousblockhash,
+            "curtime": self.curtime,
+            "bits": self.bits,
+            "target": self.target,
+            "coinbase_prefix": self.coinbase_prefix.hex(),
+            "coinbase_suffix": self.coinbase_suffix.hex(),
+            "extranonce_size": EXTRANONCE_SIZE,
+            "merkle_branch": [h[::-1].hex() for h in self.merkle_branch],
+        }
+
+    def to_bytes(self):
+        """
+        Compact binary form of the work payload:
+
+        u8 format, u8 network, u32 height, i32 version, 32B prev hash, u32 curtime,
+        u32 bits, 32B target, u8 extranonce size, u16 len + coinbase prefix,
+        u16 len + coinbase suffix, u8 count + 32B merkle branch hashes, u8 len + identifier.
+        Integers are little-endian and hashes are in internal byte order.
+        """
+        identifier = self.template_identifier.encode()
+        return b"".join([
+            struct.pack("<BBIi", WORK_FORMAT_VERSION, NETWORK_CODES[self.network], self.height, self.version),
+            bytes.fromhex(self.previousblockhash)[::-1],
+            struct.pack("<II", self.curtime, int(self.bits, 16)),
+            bytes.fromhex(self.target)[::-1],
+            struct.pack("<BH", EXTRANONCE_SIZE, len(self.coinbase_prefix)),
+            self.coinbase_prefix,
+            struct.pack("<H", len(self.coinbase_suffix)),
+            self.coinbase_suffix,
+            struct.pack("<B", len(self.merkle_branch)),
+            *self.merkle_branch,
+            struct.pack("<B", len(identifier)),
+            identifier,
+        ])
+
+
+def from_work_payload(payload):
+    """
+    Rebuilds a PreparedTemplate from a JSON work payload, e.g. on the verification side.
+
+    The payload carries no transaction data, so block() is not usable on the result.
+    """
+    if payload.get("format") != WORK_FORMAT_VERSION:
+        raise ValueError(f"Unsupported work payload format: {payload.get('format')}")
+    return PreparedTemplate(
+        template_identifier=payload["template_identifier"],
+        network=payload["network"],
+        height=payload["height"],
+        version=payload["version"],
+        previousblockhash=payload["previousblockhash"],
+        curtime=payload["curtime"],
+        bits=payload["bits"],
+        target=payload["target"],
+        coinbase_prefix=bytes.fromhex(payload["coinbase_prefix"]),
+        coinbase_suffix=bytes.fromhex(payload["coinbase_suffix"]),
+        merkle_branch=tuple(bytes.fromhex(h)[::-1] for h in payload["merkle_branch"]),
+        segwit=False,
+        transactions=(),
+    )
+
+
+def template_identifier(template, network, coinbase_prefix, coinbase_suffix, txids):
+    """
+    previousblockhash-curtime-network (ADR-001) plus a digest of the block contents.
+
+    bitcoind hands out several templates per second on the same tip whenever the
+    mempool changes, so the readable part alone is not unique. The coinbase parts
+    commit to the height, reward, payout and witness commitment; the txids are
+    hashed as a list because a merkle branch alone cannot tell [a, b, c] from
+    [a, b, c, c].
+    """
+    digest = sha256d(b"".join([
+        struct.pack("<iI", template["version"], template["curtime"]),
+        bytes.fromhex(template["previousblockhash"]),
+        bytes.fromhex(template["bits"]),
+        network.encode(),
+        struct.pack("<H", len(coinbase_prefix)), coinbase_prefix,
+        struct.pack("<H", len(coinbase_suffix)), coinbase_suffix,
+        struct.pack("<I", len(txids)),
+        *txids,
+    ]))
+    return f"{template['previousblockhash']}-{template['curtime']}-{network}-{digest[:8].hex()}"
+
+
+def prepare_template(template, network, payout_script, tag=b""):
+    """Builds a PreparedTemplate from a getblocktemplate result."""
+    transactions = template.get("transactions", [])
+    commitment = template.get("default_witness_commitment")
+    prefix, suffix = split_coinbase(
+        template["height"],
+        template["coinbasevalue"],
+        payout_script,
+        bytes.fromhex(commitment) if commitment else None,
+        tag,
+    )
+    txids = [bytes.fromhex(tx["txid"])[::-1] for tx in transactions]
+    return PreparedTemplate(
+        template_identifier=template_identifier(template, network, prefix, suffix, txids),
+        network=network,
+        height=template["height"],
+        version=template["version"],
+        previousblockhash=template["previousblockhash"],
+        curtime=template["curtime"],
+        bits=template["bits"],
+        target=template["target"],
+        coinbase_prefix=prefix,
+        coinbase_suffix=suffix,
+        merkle_branch=tuple(merkle_branch(txids)),
+        segwit=bool(commitment),
+        transactions=tuple(tx["data"] for tx in transactions),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare a miner work payload from getblocktemplate JSON on stdin.")
+    parser.add_argument("--network", choices=NETWORK_CODES, default="regtest")
+    parser.add_argument("--payout-script", required=True, help="Pool payout scriptPubKey, hex")
+    parser.add_argument("--binary", action="store_true", help="Write the compact binary payload instead of JSON")
+    args = parser.parse_args()
+
+    prepared = prepare_template(json.load(sys.stdin), args.network, bytes.fromhex(args.payout_script))
+    if args.binary:
+        sys.stdout.buffer.write(prepared.to_bytes())
+    else:
+        print(json.dumps(prepared.to_work_payload(), indent=2))
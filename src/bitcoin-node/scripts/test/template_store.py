@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""
+Local SQLite store for prepared templates (ADR-001 step 1 and 7).
+
+- One writer thread owns the only write connection. put() just queues the
+  template; the writer commits queued templates in batches, so a burst of
+  templates costs one transaction instead of one commit each.
+- The database runs in WAL mode, so lookups (on per-thread read connections)
+  never wait for a write in progress. Templates that are queued but not yet
+  committed are served from memory.
+- Transaction data is stored as one zlib-compressed BLOB of the raw transactions.
+  Their lengths go in the header, so a lookup slices the BLOB instead of parsing
+  (and hashing) every transaction again.
+- Templates older than the TTL (120 minutes by default) are deleted by the writer
+  in small chunks between insert batches, so compaction never holds up inserts.
+- A stored template is never replaced: a miner may be working on it, and a block
+  built from different transactions would be invalid. A failed write is retried
+  a few times before the template is dropped.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+from block_parser import parse_transaction
+from template_prep import PreparedTemplate
+
+DEFAULT_TTL_SECONDS = 120 * 60
+MAX_WRITE_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    template_identifier  TEXT PRIMARY KEY,
+    network              TEXT NOT NULL,
+    generation_timestamp REAL NOT NULL,
+    height               INTEGER NOT NULL,
+    header               TEXT NOT NULL,
+    transactions         BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS templates_network_generated
+    ON templates (network, generation_timestamp);
+CREATE INDEX IF NOT EXISTS templates_generated
+    ON templates (generation_timestamp);
+"""
+
+_STOP = object()
+
+
+def _encode(prepared):
+    header = {
+        "version": prepared.version,
+        "previousblockhash": prepared.previousblockhash,
+        "curtime": prepared.curtime,
+        "bits": prepared.bits,
+        "target": prepared.target,
+        "coinbase_prefix": prepared.coinbase_prefix.hex(),
+        "coinbase_suffix": prepared.coinbase_suffix.hex(),
+        "merkle_branch": [h.hex() for h in prepared.merkle_branch],
+        "segwit": prepared.segwit,
+        "tx_lengths": [len(tx) // 2 for tx in prepared.transactions],
+    }
+    blob = zlib.compress(b"".join(bytes.fromhex(tx) for tx in prepared.transactions), 6)
+    return json.dumps(header, separators=(",", ":")), blob
+
+
+def _decode(identifier, network, height, header_json, blob):
+    header = json.loads(header_json)
+    raw = zlib.decompress(blob)
+    transactions, offset = [], 0
+    lengths = header.get("tx_lengths")
+    if lengths is not None:
+        for length in lengths:
+            transactions.append(raw[offset:offset + length].hex())
+            offset += length
+    while offset < len(raw):  # rows written before tx_lengths was stored
+        _, end = parse_transaction(raw, offset)
+        transactions.append(raw[offset:end].hex())
+        offset = end
+    return PreparedTemplate(
+        template_identifier=identifier,
+        network=network,
+        height=height,
+        version=header["version"],
+        previousblockhash=header["previousblockhash"],
+        curtime=header["curtime"],
+        bits=header["bits"],
+        target=header["target"],
+        coinbase_prefix=bytes.fromhex(header["coinbase_prefix"]),
+        coinbase_suffix=bytes.fromhex(header["coinbase_suffix"]),
+        merkle_branch=tuple(bytes.fromhex(h) for h in header["merkle_branch"]),
+        segwit=header["segwit"],
+        transactions=tuple(transactions),
+    )
+
+
+class TemplateStore:
+    """Templates keyed by template_identifier, written in batches and expired after ttl seconds."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL_SECONDS, batch_size=32, flush_interval=0.05,
+                 compact_interval=60, compact_chunk=500):
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.compact_chunk = compact_chunk
+
+        self._queue = queue.Queue()
+        self._pending = {}  # template_identifier -> (generation_timestamp, PreparedTemplate), until committed
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = []
+
+        self._writer_conn = self._connect()
+        self._writer_conn.execute("PRAGMA journal_mode=WAL")
+        self._writer_conn.executescript(SCHEMA)
+        self._next_compaction = 0.0
+        self._writer = threading.Thread(target=self._write_loop, name="template-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")  # durable enough with WAL, far fewer fsyncs
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.append(conn)
+        return conn
+
+    # ────────────────────────────  Public API  ──────────────────────────────── #
+
+    def put(self, prepared, generation_timestamp=None):
+        """Queues a template for writing; it is readable through get() immediately."""
+        generated = time.time() if generation_timestamp is None else generation_timestamp
+        with self._pending_lock:
+            self._pending.setdefault(prepared.template_identifier, (generated, prepared))
+        self._queue.put((generated, prepared, 1))
+
+    def get(self, template_identifier):
+        """Returns the PreparedTemplate for an identifier, or None if unknown or expired."""
+        with self._pending_lock:
+            pending = self._pending.get(template_identifier)
+        if pending is not None:
+            return pending[1] if pending[0] >= time.time() - self.ttl else None
+
+        row = self._reader().execute(
+            "SELECT template_identifier, network, height, header, transactions FROM templates "
+            "WHERE template_identifier = ? AND generation_timestamp >= ?",
+            (template_identifier, time.time() - self.ttl),
+        ).fetchone()
+        return _decode(*row) if row else None
+
+    def latest(self, network):
+        """Most recently generated template of a network."""
+        cutoff = time.time() - self.ttl
+        with self._pending_lock:
+            pending = [p for p in self._pending.values() if p[1].network == network and p[0] >= cutoff]
+        if pending:
+            return max(pending, key=lambda p: p[0])[1]
+
+        row = self._reader().execute(
+            "SELECT template_identifier, network, height, header, transactions FROM templates "
+            "WHERE network = ? AND generation_timestamp >= ? ORDER BY generation_timestamp DESC LIMIT 1",
+            (network, cutoff),
+        ).fetchone()
+        return _decode(*row) if row else None
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def compact(self, now=None):
+        """
+        Deletes expired templates in chunks. Runs on the writer thread by itself;
+        calling it directly is meant for maintenance scripts and tests.
+        """
+        cutoff = (time.time() if now is None else now) - self.ttl
+        deleted = 0
+        while True:
+            cursor = self._writer_conn.execute(
+                "DELETE FROM templates WHERE rowid IN ("
+                "SELECT rowid FROM templates WHERE generation_timestamp < ? LIMIT ?)",
+                (cutoff, self.compact_chunk),
+            )
+            deleted += cursor.rowcount
+            # stop after a partial chunk, or yield to inserts waiting in the queue
+            if cursor.rowcount < self.compact_chunk or not self._queue.empty():
+                return deleted
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+        for conn in [self._writer_conn, *self._readers]:
+            conn.close()
+
+    # ────────────────────────────  Writer thread  ───────────────────────────── #
+
+    def _write_loop(self):
+        while True:
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            templates = [i for i in items if isinstance(i, tuple)]
+            if templates:
+                self._write_batch(templates)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if _STOP in items:
+                return
+
+            if time.monotonic() >= self._next_compaction and self._queue.empty():
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    print(f"Template store compaction failed: {e}")
+                self._next_compaction = time.monotonic() + self.compact_interval
+
+    def _forget(self, templates):
+        with self._pending_lock:
+            for _, prepared, _ in templates:
+                # the entry belongs to the first put() of an identifier
+                if self._pending.get(prepared.template_identifier, (None, None))[1] is prepared:
+                    del self._pending[prepared.template_identifier]
+
+    def _write_batch(self, templates):
+        rows = []
+        for generated, prepared, _ in templates:
+            header, blob = _encode(prepared)
+            rows.append((prepared.template_identifier, prepared.network, generated, prepared.height, header, blob))
+        try:
+            self._writer_conn.execute("BEGIN")
+            cursor = self._writer_conn.executemany(
+                "INSERT OR IGNORE INTO templates (template_identifier, network, generation_timestamp, "
+                "height, header, transactions) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._writer_conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self._writer_conn.in_transaction:
+                self._writer_conn.execute("ROLLBACK")
+            retry = [(g, p, attempt + 1) for g, p, attempt in templates if attempt < MAX_WRITE_ATTEMPTS]
+            self._forget([t for t in templates if t[2] >= MAX_WRITE_ATTEMPTS])
+            for item in retry:
+                self._queue.put(item)
+            print(f"Template store write failed, retrying {len(retry)} and dropping "
+                  f"{len(templates) - len(retry)} template(s): {e}")
+            return
+
+        if cursor.rowcount < len(rows):
+            print(f"Template store kept {len(rows) - cursor.rowcount} already stored template(s) "
+                  f"instead of replacing them")
+        self._forget(templates)
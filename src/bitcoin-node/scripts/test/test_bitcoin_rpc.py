@@ -0,0 +1,99 @@
+import concurrent.futures
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import bitcoin_rpc
+
+
+class _StubBitcoind(BaseHTTPRequestHandler):
+    """Answers JSON-RPC like bitcoind and counts TCP connections."""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    drop_after_reply = False
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if request["method"] == "getblockcount":
+            status, reply = 200, {"result": 42, "error": None, "id": request["id"]}
+        else:
+            status, reply = 500, {"result": None, "error": {"code": -32601, "message": "Method not found"}, "id": request["id"]}
+        body = json.dumps(reply).encode()
+        # close without a Connection: close header, like an idle timeout on bitcoind
+        self.close_connection = type(self).drop_after_reply
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_bitcoind():
+    _StubBitcoind.connections = 0
+    _StubBitcoind.drop_after_reply = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubBitcoind)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_call_reuses_one_connection(stub_bitcoind):
+    client = bitcoin_rpc.RpcClient("127.0.0.1", stub_bitcoind.server_port, "user", "pass")
+    try:
+        assert [client.call("getblockcount") for _ in range(5)] == [42] * 5
+    finally:
+        client.close()
+    assert _StubBitcoind.connections == 1
+
+
+def test_call_raises_rpc_error(stub_bitcoind):
+    client = bitcoin_rpc.RpcClient("127.0.0.1", stub_bitcoind.server_port, "user", "pass")
+    try:
+        with pytest.raises(bitcoin_rpc.RpcError) as excinfo:
+            client.call("nosuchmethod")
+    finally:
+        client.close()
+    assert excinfo.value.code == -32601
+
+
+def test_call_reconnects_after_server_closed_connection(stub_bitcoind):
+    client = bitcoin_rpc.RpcClient("127.0.0.1", stub_bitcoind.server_port, "user", "pass")
+    try:
+        _StubBitcoind.drop_after_reply = True
+        assert client.call("getblockcount") == 42
+        _StubBitcoind.drop_after_reply = False
+        assert client.call("getblockcount") == 42
+    finally:
+        client.close()
+    assert _StubBitcoind.connections == 2
+
+
+def test_client_for_reads_credentials_from_env(monkeypatch):
+    monkeypatch.setenv("BITCOIN_RPC_PASSWORD_REGTEST", "secret")
+    client = bitcoin_rpc.client_for("regtest")
+    assert client.port == 18443
+
+
+def test_pool_spreads_calls_over_its_connections(stub_bitcoind):
+    pool = bitcoin_rpc.RpcPool(
+        bitcoin_rpc.RpcClient("127.0.0.1", stub_bitcoind.server_port, "user", "pass") for _ in range(3)
+    )
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda _: pool.call("getblockcount"), range(30)))
+    finally:
+        pool.close()
+    assert results == [42] * 30
+    assert 1 <= _StubBitcoind.connections <= 3
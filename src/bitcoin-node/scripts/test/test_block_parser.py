@@ -0,0 +1,112 @@
+import pytest
+
+import block_parser
+
+# Mainnet genesis block header followed by its transaction count
+GENESIS_HEADER = bytes.fromhex(
+    "01000000"
+    "0000000000000000000000000000000000000000000000000000000000000000"
+    "3ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4a"
+    "29ab5f49"
+    "ffff001d"
+    "1dac2b7c"
+)
+GENESIS_HASH = "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f"
+
+
+def test_parse_block_header_genesis():
+    header = block_parser.parse_block_header(GENESIS_HEADER + b"\x01" + b"\x00" * 200)
+
+    assert header.hash == GENESIS_HASH
+    assert header.version == 1
+    assert header.prev_hash == "00" * 32
+    assert header.merkle_root == "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+    assert header.time == 1231006505
+    assert header.bits == 0x1d00ffff
+    assert header.nonce == 2083236893
+    assert header.tx_count == 1
+
+
+def test_parse_block_header_accepts_memoryview_without_tx_count():
+    buf = bytearray(GENESIS_HEADER)
+    header = block_parser.parse_block_header(memoryview(buf))
+
+    assert header.hash == GENESIS_HASH
+    assert header.tx_count is None
+
+
+def test_parse_block_header_too_short():
+    with pytest.raises(ValueError):
+        block_parser.parse_block_header(GENESIS_HEADER[:79])
+
+
+@pytest.mark.parametrize("encoded, value, size", [
+    (b"\xfc", 0xfc, 1),
+    (b"\xfd\xfd\x00", 0xfd, 3),
+    (b"\xfe\x00\x00\x01\x00", 0x10000, 5),
+    (b"\xff\x00\x00\x00\x00\x01\x00\x00\x00", 0x100000000, 9),
+])
+def test_read_varint(encoded, value, size):
+    assert block_parser.read_varint(b"\x00" + encoded, 1) == (value, 1 + size)
+
+
+def test_read_varint_truncated():
+    with pytest.raises(ValueError):
+        block_parser.read_varint(b"\xfd\x01")
+
+
+# Coinbase transaction of the genesis block (its txid is the genesis merkle root)
+GENESIS_COINBASE = bytes.fromhex(
+    "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff"
+    "4d04ffff001d0104455468652054696d65732030332f4a616e2f32303039204368616e63656c6c6f72"
+    "206f6e206272696e6b206f66207365636f6e64206261696c6f757420666f722062616e6b73ffffffff"
+    "0100f2052a01000000434104678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f"
+    "61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5fac00000000"
+)
+
+
+def _with_witness(legacy_tx, witness_items):
+    """Re-serialize a single input legacy tx with a segwit marker, flag and witness."""
+    body, locktime = legacy_tx[4:-4], legacy_tx[-4:]
+    witness = bytes([len(witness_items)]) + b"".join(bytes([len(i)]) + i for i in witness_items)
+    return legacy_tx[:4] + b"\x00\x01" + body + witness + locktime
+
+
+def test_parse_transaction_genesis_coinbase():
+    tx, end = block_parser.parse_transaction(GENESIS_COINBASE)
+
+    assert end == len(GENESIS_COINBASE)
+    assert tx.txid == "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+    assert tx.wtxid == tx.txid
+    assert tx.input_count == 1
+    assert tx.output_count == 1
+    assert tx.value_out == 50 * 100_000_000
+    assert tx.segwit is False
+    assert tx.vsize == tx.size == len(GENESIS_COINBASE)
+
+
+def test_parse_transaction_segwit_txid_ignores_witness():
+    segwit_tx = _with_witness(GENESIS_COINBASE, [b"\x00" * 32])
+    tx, end = block_parser.parse_transaction(segwit_tx)
+
+    assert end == len(segwit_tx)
+    assert tx.segwit is True
+    assert tx.txid == "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+    assert tx.wtxid != tx.txid
+    assert tx.weight == len(GENESIS_COINBASE) * 4 + 2 + 34
+    assert tx.vsize == (tx.weight + 3) // 4
+
+
+def test_parse_transaction_walks_consecutive_transactions():
+    data = GENESIS_COINBASE + _with_witness(GENESIS_COINBASE, [b"\x01"])
+    first, offset = block_parser.parse_transaction(data)
+    second, end = block_parser.parse_transaction(data, offset)
+
+    assert offset == len(GENESIS_COINBASE)
+    assert end == len(data)
+    assert first.txid == second.txid
+
+
+def test_parse_transaction_truncated():
+    with pytest.raises(ValueError):
+        block_parser.parse_transaction(GENESIS_COINBASE[:-10])
@@ -0,0 +1,70 @@
+import struct
+
+import pytest
+
+import notifications
+from test_block_parser import GENESIS_COINBASE, GENESIS_HASH, GENESIS_HEADER
+
+
+def _seq(n):
+    return struct.pack("<I", n)
+
+
+def test_decode_rawblock_three_frames():
+    frames = [b"rawblock", GENESIS_HEADER + b"\x01" + GENESIS_COINBASE, _seq(7)]
+    notification = notifications.decode_notification(frames)
+
+    assert notification.topic == "rawblock"
+    assert notification.sequence == 7
+    assert notification.payload["hash"] == GENESIS_HASH
+    assert notification.payload["tx_count"] == 1
+
+
+def test_decode_hashblock():
+    notification = notifications.decode_notification([b"hashblock", bytes.fromhex(GENESIS_HASH), _seq(0)])
+    assert notification.payload == {"hash": GENESIS_HASH}
+
+
+def test_decode_rawtx():
+    notification = notifications.decode_notification([b"rawtx", GENESIS_COINBASE, _seq(1)])
+    assert notification.payload["txid"] == "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+
+
+def test_decode_sequence_mempool_event():
+    body = bytes.fromhex(GENESIS_HASH) + b"A" + struct.pack("<Q", 42)
+    notification = notifications.decode_notification([b"sequence", body, _seq(3)])
+
+    assert notification.payload == {"hash": GENESIS_HASH, "event": "tx_added", "mempool_sequence": 42}
+
+
+def test_decode_unknown_topic_is_ignored():
+    assert notifications.decode_notification([b"pubhashtx", b"\x00" * 32, _seq(0)]) is None
+
+
+@pytest.mark.parametrize("frames", [
+    [b"rawblock"],
+    [b"rawblock", GENESIS_HEADER[:40], _seq(0)],
+    [b"hashblock", b"\x00" * 31, _seq(0)],
+    [b"hashblock", b"\x00" * 32, b"\x00"],
+])
+def test_decode_malformed_messages(frames):
+    with pytest.raises(ValueError):
+        notifications.decode_notification(frames)
+
+
+def test_sequence_tracker_detects_gaps_per_topic():
+    tracker = notifications.SequenceTracker()
+
+    assert tracker.update("rawblock", 5) == 0
+    assert tracker.update("rawtx", 100) == 0
+    assert tracker.update("rawblock", 6) == 0
+    assert tracker.update("rawblock", 9) == 2
+    assert tracker.update("rawtx", 101) == 0
+    assert tracker.update("rawtx", 0) == 0  # bitcoind restarted
+    assert tracker.update("rawtx", None) == 0
+
+
+def test_sequence_tracker_wraps_around():
+    tracker = notifications.SequenceTracker()
+    tracker.update("hashblock", 2**32 - 1)
+    assert tracker.update("hashblock", 1) == 1
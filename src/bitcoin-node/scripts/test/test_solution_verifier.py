@@ -0,0 +1,86 @@
+import pytest
+
+import solution_verifier
+import template_prep
+from block_parser import sha256d
+from test_template_prep import PAYOUT_SCRIPT, _template
+
+
+@pytest.fixture
+def prepared():
+    return template_prep.prepare_template(_template(4), "regtest", PAYOUT_SCRIPT)
+
+
+def _find_nonce(prepared, extra_nonce, target):
+    limit = int(target, 16)
+    for nonce in range(10_000):
+        if int.from_bytes(sha256d(prepared.header(extra_nonce, nonce)), "little") <= limit:
+            return nonce
+    raise AssertionError("no nonce found")
+
+
+def test_verify_batch_matches_single_header_hashing(prepared):
+    submissions = [{"submission_id": str(i), "extra_nonce": i % 3, "main_nonce": i} for i in range(20)]
+    results = solution_verifier.verify_batch(prepared, submissions)
+
+    for submission, result in zip(submissions, results):
+        header = prepared.header(submission["extra_nonce"], submission["main_nonce"])
+        expected = sha256d(header)
+        assert result["submission_id"] == submission["submission_id"]
+        assert result["hash"] == expected[::-1].hex()
+        assert result["valid"] == (int.from_bytes(expected, "little") <= int(prepared.target, 16))
+
+
+def test_verify_batch_share_target(prepared):
+    share_target = "00ff" + "ff" * 30
+    nonce = _find_nonce(prepared, 5, share_target)
+    results = solution_verifier.verify_batch(
+        prepared.to_work_payload(),  # verification side only has the payload
+        [{"extra_nonce": 5, "main_nonce": nonce}, {"extra_nonce": 5, "main_nonce": nonce, "curtime": 1}],
+        target=share_target,
+    )
+
+    assert results[0]["valid"] is True
+    assert results[0]["error"] is None
+    assert results[1]["hash"] != results[0]["hash"]
+
+
+def test_verify_batch_rejects_malformed_submissions(prepared):
+    results = solution_verifier.verify_batch(prepared, [
+        {"extra_nonce": -1, "main_nonce": 0},
+        {"extra_nonce": 0, "main_nonce": 2**32},
+        {"extra_nonce": 0},
+        {"extra_nonce": "1", "main_nonce": 1},
+        "not an object",
+        None,
+    ])
+    assert [r["valid"] for r in results] == [False] * 6
+    assert all(r["hash"] is None and r["error"] for r in results)
+
+
+@pytest.mark.parametrize("target", ["ff" * 33, "zz", "-1"])
+def test_verify_batch_rejects_invalid_targets(prepared, target):
+    results = solution_verifier.verify_batch(prepared, [{"extra_nonce": 0, "main_nonce": 0}], target=target)
+    assert results[0]["valid"] is False and results[0]["hash"] is None and results[0]["error"].startswith("target")
+
+
+def test_verify_batch_accepts_zero_padded_long_targets(prepared):
+    submission = [{"extra_nonce": 0, "main_nonce": 0}]
+    padded = solution_verifier.verify_batch(prepared, submission, target="00" * 2 + "ff" * 32)
+    assert padded == solution_verifier.verify_batch(prepared, submission, target="ff" * 32)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_hashes_meet_target_boundaries(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(solution_verifier, "np", None)
+
+    target = bytes.fromhex("00000000ffff" + "00" * 26)
+    as_hash = lambda n: n.to_bytes(32, "little")
+    value = int.from_bytes(target, "big")
+
+    assert solution_verifier._hashes_meet_target(
+        [as_hash(value), as_hash(value - 1), as_hash(value + 1), as_hash(0), as_hash(2**256 - 1)], target
+    ) == [True, True, False, True, False]
@@ -0,0 +1,298 @@
+import dataclasses
+import json
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import bitcoin_rpc
+import submission_worker
+import template_prep
+import template_store
+from test_template_prep import PAYOUT_SCRIPT, _template
+
+
+class LocalSqs:
+    """In-memory queues with long polling, receipt handles and batch deletes, like the SQS client calls."""
+
+    def __init__(self):
+        self.queues = {}
+        self.in_flight = {}
+        self.receive_calls = []
+        self.delete_calls = []
+        self._handles = 0
+        self._changed = threading.Condition()
+
+    def send(self, queue_url, body):
+        with self._changed:
+            self.queues.setdefault(queue_url, []).append(body if isinstance(body, str) else json.dumps(body))
+            self._changed.notify_all()
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0):
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._changed:
+            self.receive_calls.append((QueueUrl, MaxNumberOfMessages))
+            while not self.queues.get(QueueUrl) and self._changed.wait(max(0, deadline - time.monotonic())):
+                pass
+            pending = self.queues.get(QueueUrl, [])
+            bodies, self.queues[QueueUrl] = pending[:MaxNumberOfMessages], pending[MaxNumberOfMessages:]
+            messages = []
+            for body in bodies:
+                self._handles += 1
+                handle = f"handle-{self._handles}"
+                self.in_flight[handle] = (QueueUrl, body)
+                messages.append({"MessageId": handle, "ReceiptHandle": handle, "Body": body})
+        return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self._changed:
+            self.delete_calls.append(len(Entries))
+            for entry in Entries:
+                del self.in_flight[entry["ReceiptHandle"]]
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+
+class LocalDynamoDb:
+    """Applies simple `SET A = :a, B = :b` updates to items keyed by SubmissionID."""
+
+    def __init__(self, fail_for=()):
+        self.items = {}
+        self.fail_for = set(fail_for)
+        self._lock = threading.Lock()
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues):
+        submission_id = Key["SubmissionID"]["S"]
+        if submission_id in self.fail_for:
+            raise RuntimeError("ProvisionedThroughputExceededException")
+        assignments = re.findall(r"(\w+) = (:\w+)", UpdateExpression)
+        with self._lock:
+            item = self.items.setdefault(submission_id, {})
+            for name, placeholder in assignments:
+                item[name] = next(iter(ExpressionAttributeValues[placeholder].values()))
+
+
+class _StubBitcoind(BaseHTTPRequestHandler):
+    """Answers submitblock like bitcoind, after `delay` seconds."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.submitted.append(request["params"][0])
+        time.sleep(self.server.delay)
+        result = self.server.result
+        body = json.dumps({"result": result, "error": None, "id": request["id"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def bitcoind():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubBitcoind)
+    server.daemon_threads = True
+    server.submitted, server.delay, server.result = [], 0.0, None
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = template_store.TemplateStore(str(tmp_path / "templates.db"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def _pool(server, size=4):
+    return bitcoin_rpc.RpcPool(
+        bitcoin_rpc.RpcClient("127.0.0.1", server.server_port, "user", "pass", timeout=5) for _ in range(size)
+    )
+
+
+def _prepared(store, height=300, network="regtest"):
+    template = _template(3, height=height)
+    template["previousblockhash"] = f"{height:064x}"
+    prepared = template_prep.prepare_template(template, network, PAYOUT_SCRIPT)
+    store.put(prepared)
+    return prepared
+
+
+def _submission(prepared, i, **overrides):
+    return {"submission_id": f"sub-{i}", "template_identifier": prepared.template_identifier,
+            "extra_nonce": i, "main_nonce": 1000 + i, **overrides}
+
+
+def _worker(network, sqs, store, rpc, dynamodb, concurrency=4):
+    writer = submission_worker.StatusWriter("submission-status", dynamodb)
+    return submission_worker.QueueWorker(network, f"queue/{network}", sqs, store, rpc, writer, concurrency,
+                                         wait_seconds=1)
+
+
+def test_batch_is_assembled_submitted_recorded_and_deleted(bitcoind, store):
+    sqs, dynamodb, rpc = LocalSqs(), LocalDynamoDb(), _pool(bitcoind)
+    prepared = _prepared(store)
+    for i in range(10):
+        sqs.send("queue/regtest", _submission(prepared, i))
+    worker = _worker("regtest", sqs, store, rpc, dynamodb)
+
+    assert worker.poll_once() == 10
+    worker.close()
+    rpc.close()
+
+    assert sqs.receive_calls == [("queue/regtest", 10)]
+    assert sqs.delete_calls == [10] and sqs.in_flight == {}
+    assert sorted(bitcoind.submitted) == sorted(prepared.block(i, 1000 + i).hex() for i in range(10))
+    item = dynamodb.items["sub-3"]
+    assert item["NodeStatus"] == submission_worker.ACCEPTED
+    header = prepared.header(3, 1003)
+    assert item["AcceptedBlockHash"] == submission_worker.sha256d(header)[::-1].hex()
+    assert worker.stats == {"received": 10, "deleted": 10, "accepted": 10, "retried": 0}
+
+
+def test_batch_is_submitted_in_parallel(bitcoind, store):
+    bitcoind.delay = 0.2
+    sqs, dynamodb, rpc = LocalSqs(), LocalDynamoDb(), _pool(bitcoind, size=5)
+    prepared = _prepared(store)
+    for i in range(10):
+        sqs.send("queue/regtest", _submission(prepared, i))
+    worker = _worker("regtest", sqs, store, rpc, dynamodb, concurrency=5)
+
+    started = time.monotonic()
+    worker.poll_once()
+    elapsed = time.monotonic() - started
+    worker.close()
+    rpc.close()
+
+    assert len(bitcoind.submitted) == 10
+    assert elapsed < 10 * 0.2 / 2
+
+
+def test_rejections_missing_templates_and_bad_messages(bitcoind, store):
+    bitcoind.result = "high-hash"
+    sqs, dynamodb, rpc = LocalSqs(), LocalDynamoDb(), _pool(bitcoind)
+    prepared = _prepared(store)
+    sqs.send("queue/regtest", _submission(prepared, 1))
+    sqs.send("queue/regtest", _submission(prepared, 2, template_identifier="cleaned-up"))
+    sqs.send("queue/regtest", _submission(prepared, 3, main_nonce=-1))
+    sqs.send("queue/regtest", "not json")
+    worker = _worker("regtest", sqs, store, rpc, dynamodb)
+
+    worker.poll_once()
+    worker.close()
+    rpc.close()
+
+    assert dynamodb.items["sub-1"]["NodeStatus"] == submission_worker.REJECTED
+    assert dynamodb.items["sub-1"]["NodeRejectReason"] == "high-hash"
+    assert dynamodb.items["sub-2"]["NodeStatus"] == submission_worker.NOT_FOUND
+    assert dynamodb.items["sub-3"]["NodeStatus"] == submission_worker.INVALID
+    assert len(bitcoind.submitted) == 1
+    assert sqs.delete_calls == [4]  # none of them can ever succeed
+
+
+def test_failed_submits_and_status_writes_stay_queued(bitcoind, store):
+    sqs, dynamodb = LocalSqs(), LocalDynamoDb(fail_for={"sub-2"})
+    prepared = _prepared(store)
+    for i in range(3):
+        sqs.send("queue/regtest", _submission(prepared, i))
+    unreachable = bitcoin_rpc.RpcPool([bitcoin_rpc.RpcClient("127.0.0.1", 1, "user", "pass", timeout=1)])
+    worker = _worker("regtest", sqs, store, unreachable, dynamodb)
+    worker.poll_once()
+    worker.close()
+    assert sqs.delete_calls == [] and len(sqs.in_flight) == 3 and worker.stats["retried"] == 3
+
+    rpc = _pool(bitcoind)
+    for i in range(3):
+        sqs.send("queue/regtest", _submission(prepared, i))
+    worker = _worker("regtest", sqs, store, rpc, dynamodb)
+    worker.poll_once()
+    worker.close()
+    rpc.close()
+    assert sqs.delete_calls == [2]  # sub-2's status was not stored, so it comes back
+    assert set(dynamodb.items) == {"sub-0", "sub-1"}
+
+
+class _DamagedStore:
+    """Serves extra templates, and fails lookups for one identifier like a locked store."""
+
+    def __init__(self, store, extra, locked):
+        self.store = store
+        self.extra = extra
+        self.locked = locked
+
+    def get(self, template_identifier):
+        if template_identifier == self.locked:
+            raise sqlite3.OperationalError("database is locked")
+        return self.extra.get(template_identifier) or self.store.get(template_identifier)
+
+
+def test_one_bad_message_does_not_lose_the_batch(bitcoind, store):
+    sqs, dynamodb, rpc = LocalSqs(), LocalDynamoDb(), _pool(bitcoind)
+    prepared = _prepared(store)
+    corrupt = dataclasses.replace(prepared, template_identifier="corrupt", transactions=("not hex",))
+    sqs.send("queue/regtest", _submission(prepared, 1))
+    sqs.send("queue/regtest", _submission(prepared, 2, template_identifier="locked"))
+    sqs.send("queue/regtest", _submission(corrupt, 3))
+    worker = _worker("regtest", sqs, _DamagedStore(store, {"corrupt": corrupt}, "locked"), rpc, dynamodb)
+
+    worker.poll_once()
+    worker.close()
+    rpc.close()
+
+    assert dynamodb.items["sub-1"]["NodeStatus"] == submission_worker.ACCEPTED
+    assert "sub-2" not in dynamodb.items  # left queued for another try
+    assert dynamodb.items["sub-3"]["NodeStatus"] == submission_worker.INVALID
+    assert dynamodb.items["sub-3"]["NodeRejectReason"].startswith("block assembly failed")
+    assert sqs.delete_calls == [2] and len(sqs.in_flight) == 1
+
+
+def test_networks_are_polled_concurrently(bitcoind, store):
+    sqs, dynamodb, rpc = LocalSqs(), LocalDynamoDb(), _pool(bitcoind)
+    prepared = _prepared(store, network="testnet")
+    workers = [_worker(network, sqs, store, rpc, dynamodb) for network in ("mainnet", "testnet")]
+    stop = threading.Event()
+    threads = submission_worker.run_workers(workers, stop)
+
+    time.sleep(0.1)  # both are now in a long poll on empty queues
+    started = time.monotonic()
+    sqs.send("queue/testnet", _submission(prepared, 7))
+    while "sub-7" not in dynamodb.items and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for worker in workers:
+        worker.close()
+    rpc.close()
+    assert dynamodb.items["sub-7"]["NodeStatus"] == submission_worker.ACCEPTED
+    assert elapsed < 0.5  # picked up by the waiting long poll, not after mainnet's poll ended
+
+
+def test_parse_submission():
+    body = json.dumps({"submission_id": "s", "template_identifier": "t", "extra_nonce": 1, "main_nonce": 2})
+    assert submission_worker.parse_submission(body)["main_nonce"] == 2
+    for bad in ('[]', '{"submission_id": "s"}', body.replace('"main_nonce": 2', '"main_nonce": true')):
+        with pytest.raises(ValueError):
+            submission_worker.parse_submission(bad)
+
+
+def test_parse_arguments_selects_networks_with_queues(monkeypatch):
+    monkeypatch.setenv("SUBMISSION_QUEUE_URLS", json.dumps({"mainnet": "q/main", "regtest": "q/reg"}))
+    monkeypatch.setenv("SUBMISSION_STATUS_TABLE_NAME", "table")
+    assert submission_worker.parse_arguments(["--store", "x.db"]).queue_urls == {"mainnet": "q/main", "regtest": "q/reg"}
+    assert submission_worker.parse_arguments(["--store", "x.db", "--regtest"]).queue_urls == {"regtest": "q/reg"}
+    with pytest.raises(SystemExit):
+        submission_worker.parse_arguments(["--store", "x.db", "--testnet"])
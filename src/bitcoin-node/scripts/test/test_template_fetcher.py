@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import template_fetcher
+from notifications import Notification
+
+
+class _FakeRpc:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+
+    def call(self, method, *params):
+        assert method == "getblocktemplate"
+        self.calls += 1
+        self.release.wait(1)
+        return {"height": 100 + self.calls, "previousblockhash": "00" * 32, "transactions": [{}, {}]}
+
+    def close(self):
+        pass
+
+
+class _ListSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def test_burst_of_triggers_is_debounced_into_one_fetch():
+    rpc, sink = _FakeRpc(), _ListSink()
+    templates = []
+
+    async def scenario():
+        refresher = template_fetcher.TemplateRefresher(
+            "regtest", rpc, [sink], debounce=0.02, on_template=lambda n, t: templates.append(t)
+        )
+        for _ in range(5):
+            refresher.trigger()
+        await refresher.wait()
+        return refresher
+
+    refresher = asyncio.run(scenario())
+
+    assert rpc.calls == 1
+    assert [e.topic for e in sink.events] == ["template"]
+    assert sink.events[0].payload["tx_count"] == 2
+    assert templates[0]["height"] == 101
+    assert refresher.histogram.count == 1
+
+
+def test_trigger_during_fetch_causes_another_fetch():
+    rpc = _FakeRpc()
+    rpc.release.clear()
+
+    async def scenario():
+        refresher = template_fetcher.TemplateRefresher("regtest", rpc, [], debounce=0.01)
+        refresher.trigger()
+        await asyncio.sleep(0.05)  # first fetch is now blocked inside the RPC call
+        refresher.trigger()
+        rpc.release.set()
+        await refresher.wait()
+
+    asyncio.run(scenario())
+    assert rpc.calls == 2
+
+
+def test_is_block_trigger():
+    assert template_fetcher.is_block_trigger(Notification("hashblock", {}))
+    assert template_fetcher.is_block_trigger(Notification("sequence", {"event": "block_disconnected"}))
+    assert not template_fetcher.is_block_trigger(Notification("sequence", {"event": "tx_added"}))
+    assert not template_fetcher.is_block_trigger(Notification("rawtx", {}))
+
+
+def test_latency_histogram_percentiles():
+    histogram = template_fetcher.LatencyHistogram(buckets_ms=(10, 100))
+    for seconds in (0.001, 0.002, 0.05, 0.5):
+        histogram.observe(seconds)
+
+    summary = histogram.summary()
+    assert summary["count"] == 4
+    assert summary["p50_ms"] == 10
+    assert summary["p95_ms"] == 500
+    assert summary["buckets"] == {"10": 2, "100": 1, "inf": 1}
@@ -0,0 +1,144 @@
+import struct
+
+import pytest
+
+import template_prep
+from block_parser import parse_block_header, parse_transaction, sha256d
+from test_block_parser import GENESIS_COINBASE
+
+# Block 100000: txids (big-endian hex) and merkle root
+BLOCK_100000_TXIDS = [
+    "8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87",
+    "fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4",
+    "6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4",
+    "e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d",
+]
+BLOCK_100000_MERKLE_ROOT = "f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766"
+
+PAYOUT_SCRIPT = bytes.fromhex("0014" + "11" * 20)  # P2WPKH
+WITNESS_COMMITMENT = "6a24aa21a9ed" + "22" * 32
+GENESIS_COINBASE_TXID = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+
+
+def _internal(txid):
+    return bytes.fromhex(txid)[::-1]
+
+
+def _template(tx_count, commitment=WITNESS_COMMITMENT, height=300):
+    transactions = [{"txid": GENESIS_COINBASE_TXID, "data": GENESIS_COINBASE.hex()}] * tx_count
+    template = {
+        "version": 0x20000000,
+        "previousblockhash": "00" * 31 + "ab",
+        "curtime": 1700000000,
+        "bits": "207fffff",
+        "target": "7fffff" + "00" * 29,
+        "height": height,
+        "coinbasevalue": 5_000_000_000,
+        "transactions": transactions,
+    }
+    if commitment:
+        template["default_witness_commitment"] = commitment
+    return template
+
+
+def test_merkle_branch_vector_block_100000():
+    coinbase, *rest = [_internal(t) for t in BLOCK_100000_TXIDS]
+    branch = template_prep.merkle_branch(rest)
+
+    assert len(branch) == 2
+    assert template_prep.merkle_root_from_branch(coinbase, branch)[::-1].hex() == BLOCK_100000_MERKLE_ROOT
+    assert template_prep.merkle_root([coinbase, *rest])[::-1].hex() == BLOCK_100000_MERKLE_ROOT
+
+
+@pytest.mark.parametrize("tx_count", range(0, 10))
+def test_merkle_branch_matches_full_tree(tx_count):
+    hashes = [sha256d(bytes([i])) for i in range(tx_count + 1)]
+    branch = template_prep.merkle_branch(hashes[1:])
+
+    assert len(branch) == (tx_count).bit_length()
+    assert template_prep.merkle_root_from_branch(hashes[0], branch) == template_prep.merkle_root(hashes)
+
+
+@pytest.mark.parametrize("height, encoded", [
+    (0, b"\x00"),
+    (16, b"\x60"),
+    (17, b"\x01\x11"),
+    (128, b"\x02\x80\x00"),
+    (840000, b"\x03\x40\xd1\x0c"),
+])
+def test_script_push_int(height, encoded):
+    assert template_prep.script_push_int(height) == encoded
+
+
+def test_coinbase_extranonce_slot():
+    prepared = template_prep.prepare_template(_template(3), "regtest", PAYOUT_SCRIPT)
+    coinbase = prepared.coinbase(0x01020304)
+
+    slot = len(prepared.coinbase_prefix)
+    assert coinbase[slot:slot + 4] == bytes([4, 3, 2, 1])
+    assert prepared.coinbase_prefix.endswith(b"\x02\x2c\x01\x04")  # height 300, then push 4 bytes
+    tx, end = parse_transaction(coinbase)
+    assert end == len(coinbase)
+    assert tx.value_out == 5_000_000_000
+    assert tx.output_count == 2
+
+
+def test_merkle_root_matches_assembled_block():
+    prepared = template_prep.prepare_template(_template(5), "regtest", PAYOUT_SCRIPT)
+    block = prepared.block(extra_nonce=7, nonce=99)
+
+    header = parse_block_header(block)
+    assert header.tx_count == 6
+    assert header.nonce == 99
+    assert header.prev_hash == "00" * 31 + "ab"
+    assert header.hash == sha256d(prepared.header(7, 99))[::-1].hex()
+
+    # Walk every transaction of the block and rebuild the root the O(n) way
+    offset, txids = 81, []
+    for _ in range(header.tx_count):
+        tx, offset = parse_transaction(block, offset)
+        txids.append(_internal(tx.txid))
+    assert offset == len(block)
+    assert template_prep.merkle_root(txids)[::-1].hex() == header.merkle_root
+    assert txids[0] == sha256d(prepared.coinbase(7))
+
+
+def test_coinbase_without_witness_commitment_is_legacy():
+    prepared = template_prep.prepare_template(_template(0, commitment=None), "regtest", PAYOUT_SCRIPT)
+    block = prepared.block(extra_nonce=0, nonce=0)
+    coinbase, _ = parse_transaction(block, 81)
+
+    assert prepared.merkle_branch == ()
+    assert coinbase.segwit is False
+    assert parse_block_header(block).merkle_root == coinbase.txid
+
+
+def test_work_payload_and_binary_format():
+    prepared = template_prep.prepare_template(_template(2), "testnet", PAYOUT_SCRIPT)
+    payload = prepared.to_work_payload()
+
+    assert payload["template_identifier"].startswith(f"{'00' * 31}ab-1700000000-testnet-")
+    assert payload["merkle_branch"][0] == GENESIS_COINBASE_TXID
+    assert "transactions" not in payload
+
+    packed = prepared.to_bytes()
+    assert struct.unpack_from("<BBIi", packed) == (1, 1, 300, 0x20000000)
+    assert packed.endswith(payload["template_identifier"].encode())
+    assert len(packed) < len(str(payload))
+
+
+def test_template_identifier_is_unique_per_template():
+    first = template_prep.prepare_template(_template(2), "testnet", PAYOUT_SCRIPT)
+    again = template_prep.prepare_template(_template(2), "testnet", PAYOUT_SCRIPT)
+    more_transactions = template_prep.prepare_template(_template(3), "testnet", PAYOUT_SCRIPT)  # same tip and second
+    other_network = template_prep.prepare_template(_template(2), "regtest", PAYOUT_SCRIPT)
+
+    assert first.template_identifier == again.template_identifier
+    assert len({first.template_identifier, more_transactions.template_identifier,
+                other_network.template_identifier}) == 3
+    assert len(first.template_identifier.encode()) < 256  # fits the u8 length in to_bytes()
+
+
+def test_coinbase_script_sig_too_long():
+    with pytest.raises(ValueError):
+        template_prep.split_coinbase(300, 1, PAYOUT_SCRIPT, tag=b"x" * 95)
@@ -0,0 +1,166 @@
+import dataclasses
+import json
+import sqlite3
+import time
+
+import pytest
+
+import template_prep
+import template_store
+from test_template_prep import PAYOUT_SCRIPT, _template
+
+
+def _prepared(height, tx_count=3, network="regtest"):
+    template = _template(tx_count, height=height)
+    template["previousblockhash"] = f"{height:064x}"
+    return template_prep.prepare_template(template, network, PAYOUT_SCRIPT)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = template_store.TemplateStore(str(tmp_path / "templates.db"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_get_returns_pending_and_committed_templates(store):
+    prepared = _prepared(300)
+    store.put(prepared)
+    assert store.get(prepared.template_identifier) is prepared  # served from memory
+
+    assert store.flush(timeout=5)
+    assert store._pending == {}
+    loaded = store.get(prepared.template_identifier)
+    assert loaded == prepared
+    assert loaded.block(1, 2) == prepared.block(1, 2)
+
+
+def test_get_unknown_template(store):
+    assert store.get("nope") is None
+
+
+def test_batch_of_templates_is_committed(store):
+    templates = [_prepared(h, network=("regtest", "testnet")[h % 2]) for h in range(200, 260)]
+    for prepared in templates:
+        store.put(prepared)
+    assert store.flush(timeout=5)
+
+    count = store._reader().execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+    assert count == len(templates)
+    assert store.latest("testnet").height == 259
+    assert store.latest("regtest").height == 258
+
+
+def test_transactions_are_stored_compressed(store):
+    prepared = _prepared(300, tx_count=50)
+    store.put(prepared)
+    store.flush(timeout=5)
+
+    blob = store._reader().execute("SELECT transactions FROM templates").fetchone()[0]
+    assert len(blob) < sum(len(tx) // 2 for tx in prepared.transactions)
+
+
+def test_compaction_removes_expired_templates(tmp_path):
+    store = template_store.TemplateStore(str(tmp_path / "t.db"), ttl=60, compact_chunk=2, flush_interval=0.01,
+                                         compact_interval=3600)
+    try:
+        store.flush(timeout=5)  # the writer's own first compaction is done, so only ours deletes anything
+        now = time.time()
+        old = [_prepared(h) for h in range(100, 105)]
+        for prepared in old:
+            store.put(prepared, generation_timestamp=now - 120)
+        fresh = _prepared(200)
+        store.put(fresh, generation_timestamp=now)
+        store.flush(timeout=5)
+
+        assert store.get(old[0].template_identifier) is None  # expired even before compaction
+        assert store.compact(now) == 5
+        assert store.get(fresh.template_identifier) == fresh
+        count = store._reader().execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+        assert count == 1
+    finally:
+        store.close()
+
+
+def test_lookups_slice_transactions_without_parsing(store, monkeypatch):
+    prepared = _prepared(300, tx_count=20)
+    store.put(prepared)
+    store.flush(timeout=5)
+
+    def parse_transaction(*args):
+        raise AssertionError("transactions were parsed again")
+
+    monkeypatch.setattr(template_store, "parse_transaction", parse_transaction)
+    assert store.get(prepared.template_identifier) == prepared
+    assert store.latest("regtest") == prepared
+
+
+def test_rows_without_tx_lengths_are_still_read(store):
+    prepared = _prepared(300, tx_count=5)
+    header, blob = template_store._encode(prepared)
+    header = json.dumps({k: v for k, v in json.loads(header).items() if k != "tx_lengths"})
+    assert template_store._decode(prepared.template_identifier, "regtest", 300, header, blob) == prepared
+
+
+def test_latest_skips_expired_rows_before_compaction(tmp_path):
+    store = template_store.TemplateStore(str(tmp_path / "t.db"), ttl=60, flush_interval=0.01, compact_interval=3600)
+    try:
+        store.flush(timeout=5)
+        store.put(_prepared(100), generation_timestamp=time.time() - 120)
+        store.flush(timeout=5)
+        assert store._reader().execute("SELECT COUNT(*) FROM templates").fetchone()[0] == 1
+        assert store.latest("regtest") is None
+    finally:
+        store.close()
+
+
+def test_database_uses_wal(store):
+    assert store._reader().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_pending_templates_expire_too(store):
+    prepared = _prepared(300)
+    store.put(prepared, generation_timestamp=time.time() - store.ttl - 1)
+    assert store.get(prepared.template_identifier) is None
+    assert store.latest("regtest") is None
+
+
+def test_stored_template_is_never_replaced(store, capsys):
+    prepared = _prepared(300)
+    store.put(prepared)
+    store.flush(timeout=5)
+    changed = dataclasses.replace(prepared, transactions=prepared.transactions[:1])
+    store.put(changed)
+    store.flush(timeout=5)
+
+    assert store.get(prepared.template_identifier) == prepared
+    assert store._pending == {}
+    assert "kept 1 already stored template(s)" in capsys.readouterr().out
+
+
+class _FailingWrites:
+    """Wraps the writer connection so inserts fail."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_failed_writes_are_retried_then_dropped(store, capsys):
+    conn = store._writer_conn
+    store._writer_conn = _FailingWrites(conn)
+    prepared = _prepared(300)
+    store.put(prepared)
+    deadline = time.time() + 5
+    while store._pending and time.time() < deadline:
+        time.sleep(0.01)
+    store._writer_conn = conn
+
+    assert store._pending == {}
+    assert store.get(prepared.template_identifier) is None
+    assert capsys.readouterr().out.count("Template store write failed") == template_store.MAX_WRITE_ATTEMPTS
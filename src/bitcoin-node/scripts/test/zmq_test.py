@@ -2,112 +2,210 @@
 # python3 -m venv ~/zmqtest
 # source ~/zmqtest/bin/activate
 # pip3 install pyzmq python-bitcoinlib
+# pip3 install numpy  # optional, speeds up solution_verifier.py batches
+# pip3 install boto3  # for submission_worker.py
 
 #!/usr/bin/env python3
 
-import zmq
 import argparse
+import asyncio
+import json
+import os
 import sys
-import hashlib
+import time
+
+import zmq
+import zmq.asyncio
+
+import bitcoin_rpc
+from notifications import TOPICS, SequenceTracker, decode_notification
+from sinks import NodeEvent, build_sink, emit_all
+from template_fetcher import TemplatePipeline, TemplateRefresher
+from template_prep import prepare_template
+from template_store import TemplateStore
 
-def parse_arguments():
+# Network name -> ZMQ port per topic (zmqpub<topic> in each node's bitcoin.conf)
+NETWORKS = {
+    "mainnet": {"rawblock": 28334, "rawtx": 28335, "hashblock": 28336, "sequence": 28337},
+    "testnet": {"rawblock": 28333, "rawtx": 28332, "hashblock": 28331, "sequence": 28330},
+    "regtest": {"rawblock": 18333, "rawtx": 18332, "hashblock": 18334, "sequence": 18335},
+}
+
+MAX_ERRORS = 3
+
+def parse_arguments(argv=None):
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
-        description="Listen to Bitcoin Core ZMQ for block notifications on different networks."
+        description="Listen to Bitcoin Core ZMQ for block notifications on one or more networks."
+    )
+    parser.add_argument("--mainnet", action="store_true", help="Listen to Mainnet ZMQ")
+    parser.add_argument("--testnet", action="store_true", help="Listen to Testnet ZMQ")
+    parser.add_argument("--regtest", action="store_true", help="Listen to Regtest ZMQ")
+    parser.add_argument("--host", default="127.0.0.1", help="Host bitcoind publishes ZMQ on")
+    parser.add_argument(
+        "--topic",
+        action="append",
+        choices=TOPICS,
+        help="Notification topic to subscribe to. Can be repeated (default: rawblock)",
     )
-    group = parser.add_mutually_exclusive_group()
-    group.add_argument(
-        "--mainnet", action="store_true", help="Listen to Mainnet ZMQ (default)"
+    parser.add_argument(
+        "--hashblock-only",
+        action="store_true",
+        help="Fast mode: only subscribe to hashblock, so work can start before the full block arrives",
+    )
+    parser.add_argument(
+        "--templates",
+        action="store_true",
+        help="Call getblocktemplate over RPC whenever a new block is announced",
+    )
+    parser.add_argument(
+        "--debounce-ms",
+        type=int,
+        default=50,
+        help="Collapse block notifications arriving within this window into one template fetch",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="PATH",
+        help="SQLite file to keep prepared templates in for submission processing (with --templates)",
+    )
+    parser.add_argument(
+        "--sink",
+        action="append",
+        metavar="SPEC",
+        help="Where to send events: 'stdout', 'file:<path>' or 'mqtt[:<topic prefix>]'. "
+             "Can be repeated (default: stdout)",
     )
-    group.add_argument("--testnet", action="store_true", help="Listen to Testnet ZMQ")
-    group.add_argument("--regtest", action="store_true", help="Listen to Regtest ZMQ")
 
-    # Set default to mainnet if no flag is given
-    args = parser.parse_args()
-    if not any([args.mainnet, args.testnet, args.regtest]):
-        args.mainnet = True
+    # Listen to every network if no flag is given
+    args = parser.parse_args(argv)
+    args.networks = [name for name in NETWORKS if getattr(args, name)] or list(NETWORKS)
+    args.sink = args.sink or ["stdout"]
+    args.topic = ["hashblock"] if args.hashblock_only else list(dict.fromkeys(args.topic or ["rawblock"]))
 
     return args
 
-def get_zmq_port(args):
-    """Determines the ZMQ port based on selected network."""
-    if args.mainnet:
-        return 28334, "Mainnet" # Mainnet rawblock port
-    elif args.testnet:
-        return 28333, "Testnet" # Testnet rawblock port
-    elif args.regtest:
-        return 18333, "Regtest" # Regtest rawblock port
-    return None, None
+async def listen(context, network, host, topics, sinks, pipeline=None):
+    """Receives notifications for a single network and fans them out to the sinks."""
+    socket = context.socket(zmq.SUB)
+    try:
+        # bitcoind can publish each topic on its own port; one SUB socket connects to all of them.
+        # ZMQ topics are prefixes, so subscribing to "rawtx" does not match "rawblock".
+        ports = NETWORKS[network]
+        for address in sorted({f"tcp://{host}:{ports[topic]}" for topic in topics}):
+            socket.connect(address)
+        for topic in topics:
+            socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        print(f"[{network}] Subscribed to {', '.join(topics)}. Waiting for notifications...")
+
+        tracker = SequenceTracker()
+        error_count = 0
+        while error_count < MAX_ERRORS:
+            # copy=False hands back zmq.Frames so block and tx bodies are never copied
+            message = await socket.recv_multipart(copy=False)
+            received_at = time.monotonic()
+            try:
+                notification = decode_notification(message)
+            except ValueError as e:
+                print(f"[{network}] {e}")
+                error_count += 1
+                continue
+            if notification is None:
+                continue
+
+            missed = tracker.update(notification.topic, notification.sequence)
+            if missed:
+                print(f"[{network}] Missed {missed} '{notification.topic}' notification(s)")
+                emit_all(sinks, NodeEvent(network, "gap", {
+                    "topic": notification.topic,
+                    "missed": missed,
+                    "sequence": notification.sequence,
+                }))
+                if pipeline is not None:
+                    pipeline.notify_gap(network, notification.topic, received_at)
+
+            if pipeline is not None:
+                pipeline.notify(network, notification, received_at)
+            emit_all(sinks, NodeEvent(network, notification.topic, notification.payload))
+            error_count = 0 #reset counter
+
+        print(f"[{network}] Too many errors: {error_count}. Stopped listening.")
+    finally:
+        socket.close(linger=0)
+
+def work_publisher(sinks, store=None):
+    """
+    Turns fresh templates into miner work payloads for networks with a pool payout
+    script configured in POOL_PAYOUT_SCRIPT_<NETWORK> (scriptPubKey hex), and keeps
+    them in the template store if one is given.
+    """
+    payout_scripts = {
+        network: bytes.fromhex(os.environ[f"POOL_PAYOUT_SCRIPT_{network.upper()}"])
+        for network in NETWORKS
+        if os.getenv(f"POOL_PAYOUT_SCRIPT_{network.upper()}")
+    }
+
+    def on_template(network, template):
+        if network not in payout_scripts:
+            return
+        prepared = prepare_template(template, network, payout_scripts[network])
+        if store is not None:
+            store.put(prepared)
+        emit_all(sinks, NodeEvent(network, "work", prepared.to_work_payload()))
+
+    return on_template
+
+def build_pipeline(args, sinks, store=None):
+    """One refresher, and so one keep-alive RPC connection, per network."""
+    on_template = work_publisher(sinks, store)
+    return TemplatePipeline({
+        network: TemplateRefresher(
+            network,
+            bitcoin_rpc.client_for(network, args.host),
+            sinks,
+            debounce=args.debounce_ms / 1000,
+            on_template=on_template,
+        )
+        for network in args.networks
+    })
+
+async def run(args, sinks):
+    """Listens to every selected network concurrently from a single process."""
+    context = zmq.asyncio.Context()
+    store = TemplateStore(args.store) if args.store else None
+    pipeline = build_pipeline(args, sinks, store) if args.templates else None
+    try:
+        await asyncio.gather(*(
+            listen(context, network, args.host, args.topic, sinks, pipeline)
+            for network in args.networks
+        ))
+    finally:
+        context.term()
+        if pipeline is not None:
+            pipeline.close()
+            print(f"ZMQ to template latency: {json.dumps(pipeline.summary())}")
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     args = parse_arguments()
-    zmq_port, network_name = get_zmq_port(args)
 
-    if zmq_port is None:
-        print("Error: Could not determine ZMQ port for the selected network.")
+    try:
+        sinks = [build_sink(spec) for spec in args.sink]
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
-    zmq_address = f"tcp://127.0.0.1:{zmq_port}"
-    context = zmq.Context()
-    socket = context.socket(zmq.SUB)
-
     try:
-        print(f"Attempting to connect to {network_name} ZMQ at {zmq_address}...")
-        socket.connect(zmq_address)
-
-        # Subscribe to 'rawblock' topic.
-        # ZMQ topics are prefixes. This subscribes to messages starting with "rawblock".
-        # bitcoind sends messages in multipart format: topic, data
-        socket.setsockopt_string(zmq.SUBSCRIBE, "rawblock")
-
-        print(f"Successfully connected and subscribed to 'rawblock' for {network_name}. Waiting for notifications...")
-
-        error_count, MAX_ERRORS = 0, 3
-
-        while True:
-            if error_count >= MAX_ERRORS:
-                print(f"Too many errors: {error_count}. Aborting.")
-                break
-            # Receive multipart message: topic and data
-            message = socket.recv_multipart()
-            if len(message) != 2:
-                print(f"[{network_name}] Received unexpected ZMQ message format: {message}")
-                error_count += 1
-                continue
-            topic, block_data = message
-            # print(f"Received topic: {topic.decode()}")
-
-            if topic == b"rawblock":
-                # The 'rawblock' message contains the full block bytes.
-                # The block header is the first 80 bytes.
-                # The block hash is the double SHA256 of the header, displayed little-endian.
-                if len(block_data) >= 80:
-                    header = block_data[:80]
-                    # Calculate the block hash (double SHA256 of the header)
-                    hash1 = hashlib.sha256(header).digest()
-                    block_hash_bytes = hashlib.sha256(hash1).digest()
-                    # Reverse bytes for standard big-endian hexadecimal display
-                    block_hash_display = block_hash_bytes[::-1].hex()
-
-                    print(f"[{network_name}] Received new block. Hash: {block_hash_display}")
-                    error_count = 0 #reset counter
-                else:
-                    print(f"[{network_name}] Received incomplete rawblock data.")
-                    error_count += 1
-            # add elif topic == b"rawtx": ... for transactions
-
-
-    except zmq.core.error.ZMQError as e:
+        asyncio.run(run(args, sinks))
+    except zmq.ZMQError as e:
         print(f"\nZMQ Error connecting or receiving: {e}")
-        print(f"Please ensure the {network_name} bitcoind instance is running and its ZMQ interface (zmqpubrawblock) is enabled on port {zmq_port} and accessible.")
+        print("Please ensure the bitcoind instances are running and their ZMQ interfaces "
+              f"(zmqpub<topic>) are enabled and accessible: {NETWORKS}")
         sys.exit(1)
     except KeyboardInterrupt:
         print("\nListening stopped by user.")
     finally:
-        if 'socket' in locals() and not socket.closed:
-             socket.close()
-        if 'context' in locals() and not context.closed:
-             context.term()
-        print("ZMQ socket closed and context terminated.")
-
-
+        for sink in sinks:
+            sink.close()
+        print("ZMQ sockets closed and context terminated.")